@@ -0,0 +1,255 @@
+'''
+Batch analysis of Gomoku positions.
+Reads positions one at a time from a file and writes one line of JSON for
+each: the open, semi-open and closed sequence counts of each colour and
+length (as "detect_rows2"), the "score" of the board and the move
+"search_max" would play. Positions are never all in memory, so files of
+any size can be labelled, and chunks of positions can be analysed by a
+process pool.
+
+Text files hold one board per line, in the compact form of
+"board_to_string" ("b", "w" and "." with "/" between rows) or as the
+size x size cells of a square board with no separators (" ", "." or "-"
+for empty squares). Binary files hold fixed-size records (see
+"encode_board"). Run "python analyze.py positions.txt -o labels.jsonl",
+and "python analyze.py positions.txt --pack positions.bin" to convert a
+text file to binary.
+'''
+
+import argparse
+import json
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from evaluator import MAX_LENGTH, board_totals, score_totals
+from gomoku import board_to_string, search_max
+from patterns import CODES
+
+CELLS = {" ": " ", ".": " ", "-": " ", "b": "b", "w": "w"}
+COLOURS = (" ", "b", "w")
+#Positions sent to a worker at a time
+CHUNK = 256
+
+
+def parse_board(text):
+    '''
+    Return board from line <text> in either text format, or raise
+    ValueError.
+    '''
+    text = text.rstrip("\r\n")
+    if "/" in text:
+        rows = text.split("/")
+    else:
+        size = math.isqrt(len(text))
+        if size * size != len(text) or size == 0:
+            raise ValueError("%d cells is not a square board" % len(text))
+        rows = [text[y * size:(y + 1) * size] for y in range(size)]
+    if len(set(len(row) for row in rows)) != 1:
+        raise ValueError("rows of different lengths")
+    try:
+        return [[CELLS[cell] for cell in row] for row in rows]
+    except KeyError as e:
+        raise ValueError("unknown cell %r" % e.args[0])
+
+
+def encode_board(board):
+    '''
+    Return square board <board> as a binary record: one byte for the size,
+    then two bits per cell (see patterns.CODES) in row-major order, four
+    cells per byte starting from the low bits.
+    '''
+    size = len(board)
+    record = bytearray(1 + (size * size + 3) // 4)
+    record[0] = size
+    for i in range(size * size):
+        code = CODES[board[i // size][i % size]]
+        record[1 + i // 4] |= code << (2 * (i % 4))
+    return bytes(record)
+
+
+def decode_board(record):
+    '''
+    Inverse of "encode_board". Raise ValueError if <record> is not a valid
+    record.
+    '''
+    if not record or record[0] == 0:
+        raise ValueError("board size must be positive")
+    size = record[0]
+    if len(record) != 1 + (size * size + 3) // 4:
+        raise ValueError("%d bytes is not a record of size %d"
+                         % (len(record), size))
+    board = [[" "] * size for y in range(size)]
+    for i in range(size * size):
+        code = (record[1 + i // 4] >> (2 * (i % 4))) & 3
+        if code >= len(COLOURS):
+            raise ValueError("unknown cell code %d" % code)
+        board[i // size][i % size] = COLOURS[code]
+    return board
+
+
+def read_text(f):
+    '''
+    Yield (index, line) for the positions of text file object <f>, skipping
+    empty lines.
+    '''
+    for index, line in enumerate(f):
+        if line.strip():
+            yield index, line
+
+
+def read_binary(f):
+    '''
+    Yield (index, record) for the positions of binary file object <f>.
+    '''
+    index = 0
+    while True:
+        head = f.read(1)
+        if not head:
+            return
+        size = head[0]
+        body = f.read((size * size + 3) // 4)
+        if len(body) != (size * size + 3) // 4:
+            raise ValueError("binary file ends inside record %d" % index)
+        yield index, head + body
+        index += 1
+
+
+def analyze_board(board, best_move=True):
+    '''
+    Return dictionary of the analysis of board <board>: "counts" maps each
+    colour to the [open, semi-open, closed] counts of each length from 2,
+    as "detect_rows2", then "score" and, if <best_move>, the "best_move" of
+    "search_max" (None on a full board).
+    '''
+    totals = board_totals(board)
+    counts = {}
+    for col in ("b", "w"):
+        counts[col] = dict((str(length), totals[col][length])
+                           for length in range(2, MAX_LENGTH + 1))
+    result = {"counts": counts, "score": score_totals(totals)}
+    if best_move:
+        move = search_max(board)
+        result["best_move"] = list(move) if move != 0 else None
+    return result
+
+
+def analyze_item(item, binary, best_move):
+    '''
+    Return the output dictionary of position (index, data) <item>.
+    '''
+    index, data = item
+    try:
+        board = decode_board(data) if binary else parse_board(data)
+    except ValueError as e:
+        return {"index": index, "error": str(e)}
+    result = {"index": index, "board": board_to_string(board)}
+    result.update(analyze_board(board, best_move))
+    return result
+
+
+def _analyze_chunk(items, binary, best_move):
+    '''
+    Worker: return list of the outputs of the positions <items>.
+    '''
+    return [analyze_item(item, binary, best_move) for item in items]
+
+
+def analyze_stream(items, binary=False, best_move=True, workers=1):
+    '''
+    Yield the outputs of the positions <items> (an iterator of (index,
+    data)) in order. With <workers> > 1 chunks of CHUNK positions are
+    analysed by a process pool, with at most two chunks per worker read
+    ahead.
+    '''
+    if workers <= 1:
+        for item in items:
+            yield analyze_item(item, binary, best_move)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(items, CHUNK))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_analyze_chunk, chunk, binary,
+                                           best_move))
+            if not pending:
+                return
+            for result in pending.popleft().result():
+                yield result
+
+
+def pack(source, path):
+    '''
+    Write the positions of text file object <source> to binary file <path>
+    and return their number.
+    '''
+    count = 0
+    with open(path, "wb") as out:
+        for index, line in read_text(source):
+            try:
+                board = parse_board(line)
+            except ValueError as e:
+                raise ValueError("line %d: %s" % (index + 1, e))
+            if len(board) != len(board[0]):
+                raise ValueError("line %d: only square boards can be packed"
+                                 % (index + 1))
+            out.write(encode_board(board))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help='position file, "-" for stdin')
+    parser.add_argument("-o", "--output", help="output file (default stdout)")
+    parser.add_argument("--binary", action="store_true",
+                        help="read the binary format")
+    parser.add_argument("--pack", metavar="FILE",
+                        help="convert the text input to binary FILE instead")
+    parser.add_argument("--no-move", action="store_true",
+                        help="skip the search_max best move")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes (0 for all CPUs)")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count()
+
+    if args.input == "-":
+        source = sys.stdin.buffer if args.binary else sys.stdin
+    else:
+        source = open(args.input, "rb" if args.binary else "r")
+    try:
+        if args.pack:
+            if args.binary:
+                parser.error("--pack reads a text file")
+            try:
+                count = pack(source, args.pack)
+            except ValueError as e:
+                parser.error(str(e))
+            print("%d positions written to %s" % (count, args.pack))
+            return
+        out = open(args.output, "w") if args.output else sys.stdout
+        try:
+            items = read_binary(source) if args.binary else read_text(source)
+            for result in analyze_stream(items, args.binary,
+                                         not args.no_move, workers):
+                out.write(json.dumps(result) + "\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    finally:
+        if source not in (sys.stdin, sys.stdin.buffer):
+            source.close()
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,369 @@
+'''
+Benchmarks for the Gomoku engine.
+Run "python benchmark.py scaling" to time score and search_max on boards of
+increasing size, "python benchmark.py parallel" to time the process pool
+search against the number of workers, and "python benchmark.py suite" to
+measure the evaluation and search functions over a fixed set of positions
+(use --json to save the results, --profile to count and time the calls
+inside the engine, and "compare" to check two saved runs for regressions).
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from gomoku import make_empty_board, score, search_max, detect_row2, \
+    detect_rows2, is_bounded, is_win, put_seq_on_board
+import instrument
+import parallel
+import search
+from vectorized import search_max_batch
+
+
+def make_position(board_size, stones, seed=0):
+    '''
+    Return a reproducible position of size (board_size x board_size) with
+    <stones> stones of alternating colour placed around the centre.
+    '''
+    rand = random.Random("%d-%d-%d" % (board_size, stones, seed))
+    board = make_empty_board(board_size)
+    centre = board_size // 2
+    radius = 2
+    col = "b"
+    placed = 0
+    while placed < stones:
+        y = centre + rand.randint(-radius, radius)
+        x = centre + rand.randint(-radius, radius)
+        if 0 <= y < board_size and 0 <= x < board_size and board[y][x] == " ":
+            board[y][x] = col
+            col = "w" if col == "b" else "b"
+            placed += 1
+        elif rand.random() < 0.2:
+            radius = min(radius + 1, board_size)
+    return board
+
+
+def time_call(func, args, min_time=0.2):
+    '''
+    Return mean wall-clock seconds per call of func(*args), calling it
+    repeatedly for at least <min_time> seconds.
+    '''
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time or calls < 3:
+        func(*args)
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls
+
+
+def bench_scaling(sizes=(8, 11, 15, 19), stones=12, min_time=0.2):
+    '''
+    Return list of dicts with the time per call of score and search_max for
+    each board size in <sizes>, on a position with <stones> stones.
+    '''
+    results = []
+    for board_size in sizes:
+        board = make_position(board_size, stones)
+        results.append({"board_size": board_size,
+                        "stones": stones,
+                        "score_s": time_call(score, (board,), min_time),
+                        "search_max_s": time_call(search_max, (board,),
+                                                  min_time)})
+    return results
+
+
+def print_scaling(results):
+    '''
+    Prints results of bench_scaling as a table, with times relative to the
+    first (smallest) board.
+    '''
+    base = results[0]
+    print("%5s %12s %8s %16s %8s" % ("size", "score (ms)", "x", "search_max (ms)",
+                                     "x"))
+    for res in results:
+        print("%5d %12.3f %8.1f %16.3f %8.1f" % (
+            res["board_size"],
+            res["score_s"] * 1000, res["score_s"] / base["score_s"],
+            res["search_max_s"] * 1000,
+            res["search_max_s"] / base["search_max_s"]))
+
+
+def bench_parallel(sizes=(8, 15, 19), workers=None, stones=12, depth=2,
+                   min_time=0.2):
+    '''
+    Return list of dicts with the time per call of search_max and of a
+    fixed-depth alpha-beta search for each board size in <sizes> and each
+    worker count in <workers>, with the speedup over workers=1.
+    '''
+    if workers is None:
+        workers = sorted(set([1, 2, 4, os.cpu_count()]))
+    results = []
+    for board_size in sizes:
+        board = make_position(board_size, stones)
+        base = None
+        for count in workers:
+            #Start the pool before timing
+            search_max(board, workers=count)
+            greedy = time_call(search_max, (board, 2, count), min_time)
+            if count == 1:
+                deep = time_call(search.search, (board, "b", None, depth),
+                                 min_time)
+            else:
+                deep = time_call(parallel.search_parallel,
+                                 (board, "b", None, depth, count), min_time)
+            if base is None:
+                base = (greedy, deep)
+            results.append({"board_size": board_size,
+                            "workers": count,
+                            "search_max_s": greedy,
+                            "search_max_speedup": base[0] / greedy,
+                            "search_depth": depth,
+                            "search_s": deep,
+                            "search_speedup": base[1] / deep})
+    parallel.shutdown_pools()
+    return results
+
+
+def print_parallel(results):
+    '''
+    Prints results of bench_parallel as a table.
+    '''
+    print("%5s %8s %16s %8s %12s %8s" % ("size", "workers", "search_max (ms)",
+                                         "speedup", "search (ms)", "speedup"))
+    for res in results:
+        print("%5d %8d %16.3f %8.2f %12.3f %8.2f" % (
+            res["board_size"], res["workers"],
+            res["search_max_s"] * 1000, res["search_max_speedup"],
+            res["search_s"] * 1000, res["search_speedup"]))
+
+
+def make_draw(board_size):
+    '''
+    Return full board of size (board_size x board_size) with no five in a
+    row: blocks of four cells along each row, alternating colour by row.
+    '''
+    board = make_empty_board(board_size)
+    for y in range(board_size):
+        for x in range(board_size):
+            board[y][x] = "b" if (x // 4 + y) % 2 == 0 else "w"
+    return board
+
+
+def make_corpus(board_size):
+    '''
+    Return dictionary of the benchmark positions of size
+    (board_size x board_size) by name.
+    '''
+    near_win = make_position(board_size, 10)
+    for x in range(6):
+        near_win[1][x] = " "
+    put_seq_on_board(near_win, 1, 1, 0, 1, 4, "b")
+    return {"empty": make_empty_board(board_size),
+            "opening": make_position(board_size, 6),
+            "midgame": make_position(board_size, 24),
+            "near_win": near_win,
+            "draw": make_draw(board_size)}
+
+
+def suite_calls(board):
+    '''
+    Return list of (name, function, args) of the calls measured on board
+    <board>.
+    '''
+    centre = len(board) // 2
+    return [("detect_row2", detect_row2, (board, "b", centre, 0, 3, 0, 1)),
+            ("detect_rows2", detect_rows2, (board, "b", 3)),
+            ("is_bounded", is_bounded, (board, centre, 4, 3, 0, 1)),
+            ("score", score, (board,)),
+            ("is_win", is_win, (board,)),
+            ("search_max", search_max, ([row[:] for row in board],)),
+            ("search_max_batch", search_max_batch,
+             ([row[:] for row in board],))]
+
+
+def percentile(samples, fraction):
+    '''
+    Return the <fraction> percentile of sorted list <samples>.
+    '''
+    return samples[int(round(fraction * (len(samples) - 1)))]
+
+
+def measure(func, args, min_time=0.1, max_calls=100000):
+    '''
+    Return dictionary of ops/sec, per-call latency percentiles (seconds) and
+    peak memory allocated (bytes) by func(*args), timing each call for at
+    least <min_time> seconds.
+    '''
+    samples = []
+    clock = time.perf_counter
+    start = clock()
+    while (clock() - start < min_time or len(samples) < 5) and \
+            len(samples) < max_calls:
+        before = clock()
+        func(*args)
+        samples.append(clock() - before)
+    total = sum(samples)
+    samples.sort()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"calls": len(samples),
+            "ops_per_sec": len(samples) / total if total else 0.0,
+            "mean_s": total / len(samples),
+            "p50_s": percentile(samples, 0.5),
+            "p90_s": percentile(samples, 0.9),
+            "p99_s": percentile(samples, 0.99),
+            "max_s": samples[-1],
+            "peak_bytes": peak}
+
+
+def run_suite(sizes=(8, 15, 19), min_time=0.1):
+    '''
+    Return dictionary with the machine description and the measurements of
+    every call of "suite_calls" on every position of "make_corpus" for each
+    board size in <sizes>.
+    '''
+    results = []
+    for board_size in sizes:
+        for position, board in make_corpus(board_size).items():
+            for name, func, args in suite_calls(board):
+                res = {"function": name, "board_size": board_size,
+                       "position": position}
+                res.update(measure(func, args, min_time))
+                results.append(res)
+    return {"meta": machine_info(), "results": results}
+
+
+def machine_info():
+    '''
+    Return dictionary describing this run: time, Python, platform and git
+    revision of the code if available.
+    '''
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                  capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "revision": revision}
+
+
+def print_suite(report):
+    '''
+    Prints results of run_suite as a table.
+    '''
+    print("%-16s %5s %-9s %12s %10s %10s %10s %10s" % (
+        "function", "size", "position", "ops/sec", "p50 (us)", "p90 (us)",
+        "p99 (us)", "peak (KB)"))
+    for res in report["results"]:
+        print("%-16s %5d %-9s %12.1f %10.1f %10.1f %10.1f %10.1f" % (
+            res["function"], res["board_size"], res["position"],
+            res["ops_per_sec"], res["p50_s"] * 1e6, res["p90_s"] * 1e6,
+            res["p99_s"] * 1e6, res["peak_bytes"] / 1024))
+
+
+def compare_suites(old, new, threshold=0.1):
+    '''
+    Return list of (function, board size, position, old p50, new p50, ratio)
+    for the measurements of report <new> whose median latency is more than
+    <threshold> (as a fraction) above that of report <old>.
+    '''
+    before = {}
+    for res in old["results"]:
+        before[(res["function"], res["board_size"], res["position"])] = res
+    regressions = []
+    for res in new["results"]:
+        key = (res["function"], res["board_size"], res["position"])
+        if key not in before or before[key]["p50_s"] <= 0:
+            continue
+        ratio = res["p50_s"] / before[key]["p50_s"]
+        if ratio > 1 + threshold:
+            regressions.append(key + (before[key]["p50_s"], res["p50_s"],
+                                      ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+    scaling = commands.add_parser("scaling",
+                                  help="time score/search_max vs board size")
+    scaling.add_argument("--sizes", type=int, nargs="+",
+                         default=[8, 11, 15, 19])
+    scaling.add_argument("--stones", type=int, default=12)
+    scaling.add_argument("--min-time", type=float, default=0.2)
+    par = commands.add_parser("parallel",
+                              help="time process pool search vs workers")
+    par.add_argument("--sizes", type=int, nargs="+", default=[8, 15, 19])
+    par.add_argument("--workers", type=int, nargs="+", default=None)
+    par.add_argument("--stones", type=int, default=12)
+    par.add_argument("--depth", type=int, default=2)
+    par.add_argument("--min-time", type=float, default=0.2)
+    suite = commands.add_parser("suite",
+                                help="measure evaluation and search calls")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[8, 15, 19])
+    suite.add_argument("--min-time", type=float, default=0.1)
+    suite.add_argument("--json", help="write results to this JSON file")
+    suite.add_argument("--profile", action="store_true",
+                       help="profile the engine during the run (slower)")
+    compare = commands.add_parser("compare",
+                                  help="list regressions between two runs")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "scaling":
+        print_scaling(bench_scaling(args.sizes, args.stones, args.min_time))
+    elif args.command == "parallel":
+        print_parallel(bench_parallel(args.sizes, args.workers, args.stones,
+                                      args.depth, args.min_time))
+    elif args.command == "suite":
+        if args.profile:
+            with instrument.profiled() as profile:
+                report = run_suite(args.sizes, args.min_time)
+            report["profile"] = profile.as_dict()
+        else:
+            report = run_suite(args.sizes, args.min_time)
+        print_suite(report)
+        if args.profile:
+            print()
+            print(profile.report())
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=1)
+    elif args.command == "compare":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare_suites(old, new, args.threshold)
+        for function, board_size, position, before, after, ratio in \
+                regressions:
+            print("%-13s %5d %-9s %10.1f us -> %10.1f us (x%.2f)" % (
+                function, board_size, position, before * 1e6, after * 1e6,
+                ratio))
+        if regressions:
+            sys.exit(1)
+        print("No regressions above %d%%" % (args.threshold * 100))
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,165 @@
+'''
+Bitboard representation of a Gomoku board.
+Each colour is stored as one integer with one bit per cell. Rows are laid out
+with one spare (always empty) column after the last column, so that shifting
+a bitboard by the step of a direction never wraps a sequence from the end of
+one row onto the start of the next. Sequences can then be found for the whole
+board at once with shifts and ANDs.
+See docstring of "is_bounded" in gomoku.py for definitions of open, semiopen,
+and closed.
+'''
+
+
+def popcount(bits):
+    '''
+    Return number of set bits in integer <bits>.
+    '''
+    return bin(bits).count("1")
+
+
+class BitBoard:
+    '''
+    Board of size (height x width) with one bitboard per colour.
+    '''
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.stride = width + 1
+        self.black = 0
+        self.white = 0
+        self.on_board = 0
+        for y in range(height):
+            self.on_board |= ((1 << width) - 1) << (y * self.stride)
+        #Bit offset of the next cell in each direction (d_y, d_x)
+        self.steps = {(0, 1): 1,
+                      (1, 0): self.stride,
+                      (1, 1): self.stride + 1,
+                      (1, -1): self.stride - 1}
+
+    def bit(self, y, x):
+        '''
+        Return the bit of cell (x, y).
+        '''
+        return 1 << (y * self.stride + x)
+
+    def get(self, y, x):
+        '''
+        Return contents of cell (x, y) as "b", "w" or " ".
+        '''
+        bit = self.bit(y, x)
+        if self.black & bit:
+            return "b"
+        if self.white & bit:
+            return "w"
+        return " "
+
+    def place(self, y, x, col):
+        '''
+        Place stone of colour <col> at (x, y).
+        '''
+        if col == "b":
+            self.black |= self.bit(y, x)
+        else:
+            self.white |= self.bit(y, x)
+
+    def remove(self, y, x):
+        '''
+        Remove the stone at (x, y).
+        '''
+        mask = ~self.bit(y, x)
+        self.black &= mask
+        self.white &= mask
+
+    def empty(self):
+        '''
+        Return bitboard of the empty cells.
+        '''
+        return self.on_board & ~(self.black | self.white)
+
+    def stones(self, col):
+        '''
+        Return bitboard of the stones of colour <col>.
+        '''
+        if col == "b":
+            return self.black
+        return self.white
+
+    def run_counts(self, col, length):
+        '''
+        Return number of open, semi-open and closed sequences of colour <col>
+        of length <length> as a tuple. Equal to detect_rows2(board, col,
+        length) for the same position.
+        '''
+        stones = self.stones(col)
+        empty = self.empty()
+        open_seq = 0
+        semiopen_seq = 0
+        closed_seq = 0
+        for step in self.steps.values():
+            #Cells starting a sequence: own stone with no own stone before it
+            seq = stones & ~(stones << step)
+            #... followed by <length> - 1 own stones and no more
+            for i in range(1, length):
+                seq &= stones >> (i * step)
+            seq &= ~(stones >> (length * step))
+            if not seq:
+                continue
+            open_start = empty << step
+            open_end = empty >> (length * step)
+            both_open = popcount(seq & open_start & open_end)
+            one_open = popcount(seq & (open_start ^ open_end))
+            open_seq += both_open
+            semiopen_seq += one_open
+            closed_seq += popcount(seq) - both_open - one_open
+        return (open_seq, semiopen_seq, closed_seq)
+
+    def has_run(self, col, length):
+        '''
+        Return True if colour <col> has a sequence of exactly <length> stones
+        anywhere on the board, whatever its ends.
+        '''
+        stones = self.stones(col)
+        for step in self.steps.values():
+            seq = stones & ~(stones << step)
+            for i in range(1, length):
+                seq &= stones >> (i * step)
+            if seq & ~(stones >> (length * step)):
+                return True
+        return False
+
+    def is_win(self):
+        '''
+        Return string to indicate black won, white won, draw or continue
+        playing, like "is_win".
+        '''
+        if self.has_run("b", 5):
+            return "Black won!"
+        if self.has_run("w", 5):
+            return "White won!"
+        if self.empty():
+            return "Continue playing"
+        return "Draw!"
+
+
+def from_board(board):
+    '''
+    Return BitBoard holding the same stones as list-of-lists board <board>.
+    '''
+    bitboard = BitBoard(len(board), len(board[0]))
+    for y in range(bitboard.height):
+        for x in range(bitboard.width):
+            if board[y][x] != " ":
+                bitboard.place(y, x, board[y][x])
+    return bitboard
+
+
+def to_board(bitboard):
+    '''
+    Return list-of-lists board holding the same stones as BitBoard
+    <bitboard>, for use with print_board, put_seq_on_board etc.
+    '''
+    board = []
+    for y in range(bitboard.height):
+        board.append([bitboard.get(y, x) for x in range(bitboard.width)])
+    return board
@@ -0,0 +1,302 @@
+'''
+Opening book for the Gomoku CPU player.
+The book maps early positions to the reply that did best for the side to
+move in self-play games. A position is keyed by its canonical Zobrist hash
+(see symmetry.py), so each opening is stored once whatever its
+orientation, and the reply is turned back into the orientation of the
+board when it is found.
+
+File format (little-endian): the header MAGIC, then board size, largest
+number of stones of a position in the book and number of entries (FORMAT
+"<HHI"), then the entries sorted by key, each a 64-bit key, the reply as
+y * size + x and the number of games the reply was played in ("<QHH").
+The file is memory-mapped on first use and searched by bisection, so
+loading it costs nothing and a lookup reads a few pages.
+
+Run "python book.py build book.bin --games 200" to build a book from games
+of the greedy CPU against itself, or pass JSON lines written by
+tournament.py to build it from those games.
+'''
+
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from symmetry import canonical_key, inverse_move, transform_move
+
+MAGIC = b"GMKBOOK1"
+HEADER = struct.Struct("<HHI")
+ENTRY = struct.Struct("<QHH")
+#Book used by "play_gomoku" if it exists
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "book.bin")
+
+def count_stones(board):
+    '''
+    Return number of stones on board <board>.
+    '''
+    return sum(len(row) - row.count(' ') for row in board)
+
+
+class OpeningBook:
+    '''
+    Opening book read from the file at <path>, opened on first lookup.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.size = None
+        self.max_stones = None
+        self.count = 0
+
+    def open(self):
+        '''
+        Map the book file into memory and read its header. Raise ValueError
+        if the file is not a book or its length does not match the header.
+        '''
+        base = len(MAGIC) + HEADER.size
+        with open(self.path, "rb") as f:
+            length = os.fstat(f.fileno()).st_size
+            #An empty file cannot be mapped
+            if length < base:
+                raise ValueError("%s is not an opening book" % self.path)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if data[:len(MAGIC)] != MAGIC:
+            data.close()
+            raise ValueError("%s is not an opening book" % self.path)
+        size, max_stones, count = HEADER.unpack_from(data, len(MAGIC))
+        if size == 0 or length != base + count * ENTRY.size:
+            data.close()
+            raise ValueError("%s is a truncated or corrupt opening book "
+                             "(%d bytes for %d entries)"
+                             % (self.path, length, count))
+        self.data = data
+        self.size, self.max_stones, self.count = size, max_stones, count
+
+    def close(self):
+        '''
+        Unmap the book file.
+        '''
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def lookup(self, key):
+        '''
+        Return (reply, games) stored for position key <key>, or None.
+        '''
+        if self.data is None:
+            self.open()
+        base = len(MAGIC) + HEADER.size
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = ENTRY.unpack_from(self.data, base + middle * ENTRY.size)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                return entry[1], entry[2]
+        return None
+
+    def probe(self, board):
+        '''
+        Return (y, x) of the book reply for the side to move on board
+        <board>, or None if the position is not in the book.
+        '''
+        if self.data is None:
+            self.open()
+        if len(board) != self.size or len(board[0]) != self.size or \
+                count_stones(board) > self.max_stones:
+            return None
+        key, transform = canonical_key(board)
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        y, x = inverse_move(divmod(entry[0], self.size), transform, self.size,
+                            self.size)
+        if board[y][x] != ' ':
+            return None
+        return (y, x)
+
+
+_books = {}
+
+
+def get_book(path=DEFAULT_PATH):
+    '''
+    Return the shared OpeningBook for the file at <path>, or None if there
+    is no such file. The book is opened here so that a broken file raises
+    ValueError before the game starts.
+    '''
+    if path not in _books:
+        book = None
+        if os.path.exists(path):
+            book = OpeningBook(path)
+            book.open()
+        _books[path] = book
+    return _books[path]
+
+
+def record_positions(record, max_stones):
+    '''
+    Yield (board, move, points) for the positions of game record <record>
+    (as written by tournament.py) with at most <max_stones> stones, where
+    <move> was played by the CPU and <points> is 2 if the side that played
+    it won, 1 for a draw and 0 for a loss. Opening moves are not yielded,
+    since they were random.
+    '''
+    size = record["board_size"]
+    board = [[' '] * size for i in range(size)]
+    col = 'b'
+    opening = len(record["opening"])
+    for ply, (y, x) in enumerate(record["opening"] + record["moves"]):
+        if ply > max_stones:
+            break
+        if ply >= opening:
+            if record["winner"] is None:
+                points = 1
+            elif record["winner"] == col:
+                points = 2
+            else:
+                points = 0
+            yield board, (y, x), points
+        board[y][x] = col
+        col = 'w' if col == 'b' else 'b'
+
+
+def build_entries(records, max_stones=8, min_games=1):
+    '''
+    Return sorted list of (key, reply, games) book entries from the game
+    records <records>: for each position, the reply with the best average
+    result among those played at least <min_games> times, then the most
+    played.
+    '''
+    stats = {}
+    size = None
+    for record in records:
+        size = record["board_size"]
+        for board, move, points in record_positions(record, max_stones):
+            key, transform = canonical_key(board)
+            move = transform_move(move, transform, size, size)
+            replies = stats.setdefault(key, {})
+            games, total = replies.get(move, (0, 0))
+            replies[move] = (games + 1, total + points)
+    entries = []
+    for key, replies in stats.items():
+        best = None
+        for move, (games, total) in replies.items():
+            if games < min_games:
+                continue
+            rank = (total / games, games, move)
+            if best is None or rank > best[0]:
+                best = (rank, move, games)
+        if best is not None:
+            move = best[1]
+            entries.append((key, move[0] * size + move[1],
+                            min(best[2], 0xffff)))
+    entries.sort()
+    return entries
+
+
+def write_book(path, entries, size, max_stones):
+    '''
+    Write the book entries <entries> (see "build_entries") for boards of
+    size (size x size) to <path>.
+    '''
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(size, max_stones, len(entries)))
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+
+
+def selfplay_records(engine, games, size, opening_moves=2, seed=0,
+                     workers=1):
+    '''
+    Return list of records of <games> games of engine description <engine>
+    (see tournament.parse_engine) against itself. Each game opens with the
+    centre, like the CPU, then <opening_moves> - 1 random moves near it.
+    '''
+    #Imported here since tournament.py imports the game modules, which are
+    #not needed to read a book
+    import tournament
+    jobs = []
+    centre = (size // 2, size // 2)
+    for game in range(games):
+        rand = random.Random("book-%d-%d" % (seed, game))
+        squares = [(y, x) for y in range(size // 2 - 2, size // 2 + 3)
+                   for x in range(size // 2 - 2, size // 2 + 3)
+                   if (y, x) != centre and 0 <= y < size and 0 <= x < size]
+        opening = [centre] + rand.sample(squares, max(0, opening_moves - 1))
+        jobs.append((engine, engine, size, opening))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(tournament._play, jobs))
+    return [tournament.play_game(*job) for job in jobs]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from games")
+    build.add_argument("book", help="book file to write")
+    build.add_argument("records", nargs="*",
+                       help="JSON lines files written by tournament.py")
+    build.add_argument("--games", type=int, default=0,
+                       help="self-play games to play as well")
+    build.add_argument("--engine", default="greedy",
+                       help="engine for the self-play games")
+    build.add_argument("--size", type=int, default=8)
+    build.add_argument("--opening-moves", type=int, default=2)
+    build.add_argument("--seed", type=int, default=0)
+    build.add_argument("--workers", type=int, default=1)
+    build.add_argument("--max-stones", type=int, default=8)
+    build.add_argument("--min-games", type=int, default=1)
+    info = commands.add_parser("info", help="describe a book")
+    info.add_argument("book")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        records = []
+        for path in args.records:
+            with open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("type") == "game":
+                        records.append(record)
+        if args.games:
+            import tournament
+            records.extend(selfplay_records(
+                tournament.parse_engine(args.engine), args.games, args.size,
+                args.opening_moves, args.seed, args.workers))
+        sizes = set(record["board_size"] for record in records)
+        if len(sizes) != 1:
+            parser.error("the games must all be on one board size")
+        size = sizes.pop()
+        entries = build_entries(records, args.max_stones, args.min_games)
+        write_book(args.book, entries, size, args.max_stones)
+        print("%d positions from %d games written to %s" % (
+            len(entries), len(records), args.book))
+    elif args.command == "info":
+        book = OpeningBook(args.book)
+        book.open()
+        print("board size %d, positions with at most %d stones, %d entries, "
+              "%d bytes" % (book.size, book.max_stones, book.count,
+                            len(book.data)))
+        book.close()
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
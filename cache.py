@@ -0,0 +1,263 @@
+'''
+Evaluation cache kept across games and processes.
+A cache maps a position key (see "board_key") to an integer: the "score"
+of the board, or with MOVES XORed into the key the square chosen by
+"search_max" as y * width + x, so one cache can hold both. The
+most recently used entries are kept in memory up to a limit on their
+number, or on the memory they take, and the least recently used one is
+evicted when a new entry would go over it. Hits, misses and evictions are
+counted for "stats".
+
+A cache can be saved to a snapshot file and opened from one: the file is
+memory-mapped and searched by bisection, so a new process starts with a
+warm cache without reading it, and the entries it uses are copied into
+memory. Saving merges the entries in memory into those of the snapshot.
+
+File format (little-endian): MAGIC, the number of entries ("<I"), then the
+entries sorted by key, each a 64-bit key and a 64-bit value ("<Qq").
+
+Run "python cache.py warm scores.bin --games 100" to fill a snapshot from
+games of the greedy CPU against itself, and "python cache.py info
+scores.bin" to describe one. Engines use it with "greedy:cache=scores.bin"
+in tournament.py.
+'''
+
+import argparse
+import mmap
+import os
+import struct
+from collections import OrderedDict
+
+from zobrist import get_zobrist
+
+MAGIC = b"GMKCACH1"
+HEADER = struct.Struct("<I")
+ENTRY = struct.Struct("<Qq")
+MAX_ENTRIES = 1000000
+#XORed into the keys of "search_max" moves
+MOVES = 1 << 47
+#Approximate bytes taken in memory by one entry, for <max_bytes>
+ENTRY_BYTES = 120
+
+
+def board_key(board):
+    '''
+    Return 64-bit key of board <board>, or of a Position: the Zobrist hash
+    of its stones, with the board size in the top bits so that boards of
+    different sizes do not share keys.
+    '''
+    height = len(board)
+    width = len(board[0])
+    key = getattr(board, "key", None)
+    if key is None:
+        key = get_zobrist(height, width).hash_board(board)
+    return key ^ (height << 56) ^ (width << 48)
+
+
+class LRUCache:
+    '''
+    Cache of at most <max_entries> entries in memory, and at most about
+    <max_bytes> bytes if given, over the snapshot file at <path> if given.
+    '''
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=None, path=None):
+        if max_bytes is not None:
+            max_entries = min(max_entries, max_bytes // ENTRY_BYTES)
+        if max_entries < 1:
+            raise ValueError("the cache must hold at least one entry")
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.data = None
+        self.count = 0
+        self.hits = 0
+        self.snapshot_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.open(path)
+
+    def open(self, path):
+        '''
+        Map snapshot file <path> into memory. Raise ValueError if the file
+        is not a snapshot.
+        '''
+        self.close()
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if data[:len(MAGIC)] != MAGIC:
+            data.close()
+            raise ValueError("%s is not a cache snapshot" % path)
+        self.data = data
+        self.count = HEADER.unpack_from(data, len(MAGIC))[0]
+
+    def close(self):
+        '''
+        Unmap the snapshot file.
+        '''
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+            self.count = 0
+
+    def _snapshot_lookup(self, key):
+        '''
+        Return value stored for <key> in the snapshot, or None.
+        '''
+        base = len(MAGIC) + HEADER.size
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = ENTRY.unpack_from(self.data, base + middle * ENTRY.size)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                return entry[1]
+        return None
+
+    def get(self, key):
+        '''
+        Return value stored for <key>, or None.
+        '''
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+        if self.data is not None:
+            value = self._snapshot_lookup(key)
+            if value is not None:
+                self.snapshot_hits += 1
+                self._insert(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        '''
+        Store integer <value> for <key>.
+        '''
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.entries[key] = value
+        else:
+            self._insert(key, value)
+
+    def _insert(self, key, value):
+        '''
+        Add a new entry, evicting the least recently used one if full.
+        '''
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        '''
+        Remove the entries in memory and reset the statistics; the snapshot
+        stays open.
+        '''
+        self.entries.clear()
+        self.hits = 0
+        self.snapshot_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        '''
+        Return dictionary of the size and statistics of the cache.
+        '''
+        lookups = self.hits + self.snapshot_hits + self.misses
+        return {"entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "snapshot_entries": self.count,
+                "hits": self.hits,
+                "snapshot_hits": self.snapshot_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.snapshot_hits) / lookups
+                if lookups else 0.0}
+
+    def save(self, path):
+        '''
+        Write the entries of the snapshot and those in memory (which win)
+        to snapshot file <path>, through a temporary file so that a process
+        mapping <path> keeps a whole snapshot.
+        '''
+        merged = {}
+        if self.data is not None:
+            base = len(MAGIC) + HEADER.size
+            for key, value in ENTRY.iter_unpack(
+                    self.data[base:base + self.count * ENTRY.size]):
+                merged[key] = value
+        merged.update(self.entries)
+        temp = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(len(merged)))
+            for key in sorted(merged):
+                f.write(ENTRY.pack(key, merged[key]))
+        os.replace(temp, path)
+        return len(merged)
+
+
+_caches = {}
+
+
+def get_cache(path=None, max_entries=MAX_ENTRIES):
+    '''
+    Return the shared LRUCache of this process over snapshot file <path>
+    (none if None), so that entries are kept from one game to the next.
+    '''
+    if path not in _caches:
+        _caches[path] = LRUCache(max_entries, path=path)
+    return _caches[path]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="fill a snapshot by self-play")
+    warm.add_argument("snapshot", help="snapshot file, extended if it exists")
+    warm.add_argument("--games", type=int, default=100)
+    warm.add_argument("--size", type=int, default=8)
+    warm.add_argument("--opening-moves", type=int, default=2)
+    warm.add_argument("--seed", type=int, default=0)
+    warm.add_argument("--max-entries", type=int, default=MAX_ENTRIES)
+    info = commands.add_parser("info", help="describe a snapshot")
+    info.add_argument("snapshot")
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        #Imported here since the game modules are not needed to read a cache
+        import tournament
+        #The cache of module "cache", which play_game uses, not __main__'s
+        cache = tournament.get_cache(args.snapshot, args.max_entries)
+        engine = tournament.parse_engine("greedy")
+        engine["cache"] = args.snapshot
+        for game in range(args.games):
+            opening = tournament.random_opening(args.size, args.opening_moves,
+                                                args.seed + game)
+            tournament.play_game(engine, engine, args.size, opening)
+        count = cache.save(args.snapshot)
+        print("%d entries written to %s" % (count, args.snapshot))
+        print(cache.stats())
+    elif args.command == "info":
+        cache = LRUCache(1, path=args.snapshot)
+        if cache.data is None:
+            parser.error("no snapshot %s" % args.snapshot)
+        print("%d entries, %d bytes" % (cache.count, len(cache.data)))
+        cache.close()
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,123 @@
+'''
+Headless Gomoku engine.
+GomokuEngine holds one game and never reads from stdin or writes to stdout,
+so it can be driven by servers, batch jobs and benchmarks. Black always
+moves first.
+'''
+
+from gomoku import make_empty_board, choose_move, is_win, check_result
+from transposition import TranspositionTable
+
+RESULTS = ("Black won!", "White won!", "Draw!")
+
+
+class GomokuEngine:
+    '''
+    One game of Gomoku on a board of size <board_size>, or starting from
+    position <board> if given. The CPU's moves are chosen as in "cpu_move":
+    by alpha-beta search for <time_limit> seconds if given, otherwise by
+    the greedy "search_max"; <workers> > 1 uses a process pool. Replies are
+    taken from OpeningBook <book> while the position is in it. With
+    MonteCarlo <mcts> the moves are chosen by its tree search instead.
+    '''
+
+    def __init__(self, board_size=8, board=None, time_limit=None, workers=1,
+                 book=None, mcts=None):
+        if board is None:
+            board = make_empty_board(board_size)
+        self.board = [list(row) for row in board]
+        self.height = len(self.board)
+        self.width = len(self.board[0])
+        self.time_limit = time_limit
+        self.workers = workers
+        self.book = book
+        self.mcts = mcts
+        self.table = TranspositionTable() if time_limit is not None else None
+        self.history = []
+        black = sum(row.count("b") for row in self.board)
+        white = sum(row.count("w") for row in self.board)
+        self.to_move = "b" if black <= white else "w"
+        self.empty_count = self.height * self.width - black - white
+        #After each move only the lines through it are checked
+        self.start_result = is_win(self.board)
+        self._result = self.start_result
+
+    def result(self):
+        '''
+        Return "Black won!", "White won!", "Draw!" or "Continue playing".
+        '''
+        return self._result
+
+    def is_over(self):
+        '''
+        Return True if the game has ended.
+        '''
+        return self.result() in RESULTS
+
+    def legal_moves(self):
+        '''
+        Return list of (y, x) of the free squares, empty if the game is over.
+        '''
+        if self.is_over():
+            return []
+        moves = []
+        for y in range(self.height):
+            for x in range(self.width):
+                if self.board[y][x] == " ":
+                    moves.append((y, x))
+        return moves
+
+    def apply_move(self, y, x):
+        '''
+        Place a stone of the side to move at (x, y) and return the result.
+        Raise ValueError if the move is not legal.
+        '''
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise ValueError("move (%d, %d) is off the board" % (y, x))
+        if self.board[y][x] != " ":
+            raise ValueError("square (%d, %d) is occupied" % (y, x))
+        if self.is_over():
+            raise ValueError("the game is over")
+        self.board[y][x] = self.to_move
+        self.history.append((y, x))
+        self.to_move = "w" if self.to_move == "b" else "b"
+        self.empty_count -= 1
+        self._result = check_result(self.board, (y, x), self.empty_count)
+        return self._result
+
+    def undo(self):
+        '''
+        Take back the last move and return its (y, x). Raise ValueError if
+        no move has been played.
+        '''
+        if not self.history:
+            raise ValueError("no moves to undo")
+        y, x = self.history.pop()
+        self.board[y][x] = " "
+        self.to_move = "w" if self.to_move == "b" else "b"
+        self.empty_count += 1
+        if self.history:
+            self._result = check_result(self.board, self.history[-1],
+                                        self.empty_count)
+        else:
+            self._result = self.start_result
+        return (y, x)
+
+    def best_move(self):
+        '''
+        Return (y, x) of the CPU's move for the side to move, without
+        playing it.
+        '''
+        if self.is_over():
+            raise ValueError("the game is over")
+        return choose_move(self.board, self.to_move, self.time_limit,
+                           self.table, self.workers, book=self.book,
+                           mcts=self.mcts)
+
+    def play_best(self):
+        '''
+        Play the CPU's move for the side to move and return its (y, x).
+        '''
+        move = self.best_move()
+        self.apply_move(move[0], move[1])
+        return move
@@ -0,0 +1,292 @@
+'''
+Incremental line evaluator for Gomoku boards.
+Keeps the open/semi-open/closed sequence counts of every row, column and
+diagonal of a board, so that placing or removing a stone only rescans the
+four lines through that cell instead of the whole board.
+See docstring of "is_bounded" in gomoku.py for definitions of open, semiopen,
+and closed. Lines are classified with the pattern table of patterns.py.
+'''
+
+import json
+
+from patterns import CODES, FEATURES, cell_shift, get_table, line_features, \
+    line_value
+
+MAX_SCORE = 100000
+MAX_LENGTH = 5
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+#Weights of the sequence counts in "score_counts", from the point of view of
+#black, who has just moved. A four of white (open or semi-open) wins next
+#move, so it outweighs everything black has.
+WEIGHTS = {"four_w": -10000,
+           "open_four_b": 500,
+           "semi_open_four_b": 50,
+           "open_three_w": -100,
+           "semi_open_three_w": -30,
+           "open_three_b": 50,
+           "semi_open_three_b": 10,
+           "two_b": 1,
+           "two_w": -1}
+#Order of the weights in weight and feature vectors
+WEIGHT_NAMES = tuple(WEIGHTS)
+
+
+def load_weights(path):
+    '''
+    Return the weights of the evaluation profile saved as JSON at <path>:
+    WEIGHTS with the values given in the file. Raise ValueError if the file
+    has a key that is not in WEIGHTS or a value that is not a number.
+    '''
+    with open(path) as f:
+        loaded = json.load(f)
+    if not isinstance(loaded, dict):
+        raise ValueError("%s does not hold a dictionary of weights" % path)
+    weights = dict(WEIGHTS)
+    for name, value in loaded.items():
+        if name not in WEIGHTS:
+            raise ValueError("unknown weight %r in %s" % (name, path))
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError("weight %r in %s is not a number" % (name, path))
+        weights[name] = value
+    return weights
+
+
+def save_weights(weights, path):
+    '''
+    Write the weights <weights> to <path> as a JSON evaluation profile.
+    '''
+    with open(path, "w") as f:
+        json.dump(dict((name, weights[name]) for name in WEIGHT_NAMES), f,
+                  indent=1)
+        f.write("\n")
+
+
+def weight_vector(weights=None):
+    '''
+    Return list of the weights <weights> (WEIGHTS if None) in the order of
+    WEIGHT_NAMES.
+    '''
+    if weights is None:
+        weights = WEIGHTS
+    return [weights[name] for name in WEIGHT_NAMES]
+
+
+def make_lines(height, width):
+    '''
+    Return (lines, cell_lines) for a board of size (height x width).
+        lines: list of lines, each a list of (y, x) cells in order along one
+               of the directions in DIRECTIONS
+        cell_lines: (height x width) array holding, for each cell, the indices
+                    of the lines through it (one per direction)
+    '''
+    lines = []
+    cell_lines = []
+    for y in range(height):
+        cell_lines.append([[] for x in range(width)])
+    for d_y, d_x in DIRECTIONS:
+        for y in range(height):
+            for x in range(width):
+                #Only start a line at a cell with no predecessor on the board
+                prev_y = y - d_y
+                prev_x = x - d_x
+                if 0 <= prev_y < height and 0 <= prev_x < width:
+                    continue
+                line = []
+                cur_y, cur_x = y, x
+                while 0 <= cur_y < height and 0 <= cur_x < width:
+                    line.append((cur_y, cur_x))
+                    cell_lines[cur_y][cur_x].append(len(lines))
+                    cur_y += d_y
+                    cur_x += d_x
+                lines.append(line)
+    return lines, cell_lines
+
+
+_lines = {}
+
+
+def get_lines(height, width):
+    '''
+    Return (lines, cell_bits) for a board of size (height x width), computed
+    once for each size and shared, so not to be modified.
+        lines: list of lines, as in "make_lines"
+        cell_bits: (height x width) array holding, for each cell, the
+                   (line index, bit position) of the cell in the lines
+                   through it, for the line integers of patterns.py
+    '''
+    if (height, width) not in _lines:
+        lines = make_lines(height, width)[0]
+        cell_bits = []
+        for y in range(height):
+            cell_bits.append([[] for x in range(width)])
+        for index, line in enumerate(lines):
+            for position, (y, x) in enumerate(line):
+                cell_bits[y][x].append((index, cell_shift(position)))
+        _lines[(height, width)] = (lines, cell_bits)
+    return _lines[(height, width)]
+
+
+def board_totals(board):
+    '''
+    Return counts[col][length][bounded] of the sequences of each colour on
+    board <board>, like a "LineEvaluator" built on it, where bounded is the
+    number of blocked ends (0 = open, 1 = semi-open, 2 = closed).
+    counts[col][length] is equal to detect_rows2(board, col, length).
+    '''
+    lines = get_lines(len(board), len(board[0]))[0]
+    table = get_table()
+    totals = {}
+    for col in ("b", "w"):
+        totals[col] = [[0, 0, 0] for i in range(MAX_LENGTH + 1)]
+    for line in lines:
+        value = line_value([CODES[board[y][x]] for y, x in line])
+        for feature in line_features(value, table):
+            col, length, bounded = FEATURES[feature]
+            totals[col][length][bounded] += 1
+    return totals
+
+
+def score_counts(open_b, semi_open_b, open_w, semi_open_w, weights=None):
+    '''
+    Return the score of a position for black from dictionaries mapping
+    sequence length (2 to 5) to the number of open and semi-open sequences of
+    each colour. Assumes black has just moved. The counts are weighted by
+    dictionary <weights> with the keys of WEIGHTS (WEIGHTS if None).
+    '''
+    if weights is None:
+        weights = WEIGHTS
+    if open_b[5] >= 1 or semi_open_b[5] >= 1:
+        return MAX_SCORE
+
+    elif open_w[5] >= 1 or semi_open_w[5] >= 1:
+        return -MAX_SCORE
+
+    return (weights["four_w"] * (open_w[4] + semi_open_w[4])   +
+            weights["open_four_b"] * open_b[4]                  +
+            weights["semi_open_four_b"] * semi_open_b[4]        +
+            weights["open_three_w"] * open_w[3]                 +
+            weights["semi_open_three_w"] * semi_open_w[3]       +
+            weights["open_three_b"] * open_b[3]                 +
+            weights["semi_open_three_b"] * semi_open_b[3]       +
+            weights["two_b"] * (open_b[2] + semi_open_b[2])     +
+            weights["two_w"] * (open_w[2] + semi_open_w[2]))
+
+
+def score_totals(totals, col="b", weights=None):
+    '''
+    Return "score" of a board with sequence counts <totals> (see
+    "board_totals") for colour <col>, assuming <col> has just moved, with
+    weights <weights>.
+    '''
+    other = "w" if col == "b" else "b"
+    mine = totals[col]
+    theirs = totals[other]
+    open_b = {}
+    semi_open_b = {}
+    open_w = {}
+    semi_open_w = {}
+    for i in range(2, 6):
+        open_b[i], semi_open_b[i] = mine[i][0], mine[i][1]
+        open_w[i], semi_open_w[i] = theirs[i][0], theirs[i][1]
+    return score_counts(open_b, semi_open_b, open_w, semi_open_w, weights)
+
+
+def feature_vector(totals, col="b"):
+    '''
+    Return list of the sequence counts of <totals> (see "board_totals")
+    weighted by each weight of WEIGHT_NAMES in "score_counts", assuming
+    <col> has just moved. Unless a colour has a five, "score_totals" is the
+    dot product of this vector and the "weight_vector".
+    '''
+    mine = totals[col]
+    theirs = totals["w" if col == "b" else "b"]
+    return [theirs[4][0] + theirs[4][1],
+            mine[4][0],
+            mine[4][1],
+            theirs[3][0],
+            theirs[3][1],
+            mine[3][0],
+            mine[3][1],
+            mine[2][0] + mine[2][1],
+            theirs[2][0] + theirs[2][1]]
+
+
+class LineEvaluator:
+    '''
+    Tracks the sequence counts of a board as stones are placed and removed.
+    The evaluator works on its own copy of the board given to it. Scores
+    use the weights <weights> (see "score_counts").
+    '''
+
+    def __init__(self, board, weights=None):
+        self.weights = weights
+        self.board = [list(row) for row in board]
+        self.height = len(board)
+        self.width = len(board[0])
+        self.lines, self.cell_bits = get_lines(self.height, self.width)
+        self.table = get_table()
+        #counts[col][length][bounded] summed over all lines
+        self.totals = {}
+        for col in ("b", "w"):
+            self.totals[col] = [[0, 0, 0] for i in range(MAX_LENGTH + 1)]
+        #Each line as an integer of cell codes, see patterns.py
+        self.line_values = []
+        self.line_runs = []
+        for index, line in enumerate(self.lines):
+            self.line_values.append(line_value([CODES[board[y][x]]
+                                                for y, x in line]))
+            self.line_runs.append([])
+            self._rescan(index)
+
+    def _rescan(self, index):
+        '''
+        Recompute the sequences of line <index> and update the totals.
+        '''
+        totals = self.totals
+        for col, length, bounded in self.line_runs[index]:
+            totals[col][length][bounded] -= 1
+        runs = [FEATURES[feature] for feature in
+                line_features(self.line_values[index], self.table)]
+        for col, length, bounded in runs:
+            totals[col][length][bounded] += 1
+        self.line_runs[index] = runs
+
+    def place(self, y, x, col):
+        '''
+        Place stone of colour <col> at (x, y) and update the counts.
+        '''
+        self.board[y][x] = col
+        code = CODES[col]
+        for index, shift in self.cell_bits[y][x]:
+            self.line_values[index] |= code << shift
+            self._rescan(index)
+
+    def remove(self, y, x):
+        '''
+        Remove the stone at (x, y) and update the counts.
+        '''
+        self.board[y][x] = ' '
+        for index, shift in self.cell_bits[y][x]:
+            self.line_values[index] &= ~(3 << shift)
+            self._rescan(index)
+
+    def counts(self, col, length):
+        '''
+        Return number of open, semi-open and closed sequences of colour <col>
+        of length <length> as a tuple, like "detect_rows2".
+        '''
+        return tuple(self.totals[col][length])
+
+    def has_five(self, col):
+        '''
+        Return True if colour <col> has a sequence of exactly five stones,
+        whatever its ends (the win condition of "is_win").
+        '''
+        return sum(self.totals[col][5]) > 0
+
+    def score(self, col="b"):
+        '''
+        Return "score" of the board for colour <col>, assuming <col> has just
+        moved. Equal to score(board) for col="b".
+        '''
+        return score_totals(self.totals, col, self.weights)
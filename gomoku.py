@@ -3,64 +3,191 @@ Game of Gomoku (A.K.A. Five in a Row) for player vs. CPU
 See: https://en.wikipedia.org/wiki/Gomoku
 '''
 
-def play_gomoku(board_size=8):
-    '''
-    Main function to start game on a board of size <board_size>
+import time
+
+from book import get_book
+from cache import MOVES, board_key
+from evaluator import LineEvaluator, board_totals, score_totals
+from movegen import candidate_moves, run_through
+from ponder import Ponderer
+from record import GameRecord, append_record
+from symmetry import move_classes
+from transposition import TranspositionTable
+import search
+
+def play_gomoku(board_size=8, time_limit=None, workers=1, mcts=None,
+                ponder=False, record_path=None):
+    '''
+    Main function to start game on a board of size <board_size>. If
+    <time_limit> is given, the CPU searches each move for that many seconds
+    instead of playing the greedy one-move search. With <workers> > 1 the
+    CPU's moves are evaluated by that many processes. The opening book
+    book.bin is used if it exists (see book.py). With MonteCarlo <mcts> the
+    CPU plays by Monte Carlo tree search (see mcts.py). With <ponder> (and
+    no <mcts>, <workers> 1) the CPU works out its answers to the likely
+    replies while the player thinks (see ponder.py). The game is added to
+    the archive file <record_path> if given (see record.py).
     '''
     board = make_empty_board(board_size)
+    #Search results are kept from one CPU move to the next
+    table = TranspositionTable() if time_limit is not None else None
+    book = get_book()
+    empty_count = board_size * board_size
+    moves = []
+    ponderer = None
+    if ponder and mcts is None and workers == 1:
+        ponderer = Ponderer('b', time_limit, table, book=book)
+
+    def save(result):
+        if record_path is not None:
+            append_record(record_path, GameRecord(board_size, moves, result))
     
     while True:
         print("-------------------------")
         
         # Computer move
-        board = cpu_move(board)
+        move = None
+        if ponderer is not None:
+            move = ponderer.take(board)
+        if move is None:
+            move = choose_move(board, 'b', time_limit, table, workers,
+                               book=book, mcts=mcts)
+        print("Computer move: (%d, %d)\n" % move)
+        board[move[0]][move[1]] = "b"
+        moves.append(move)
+        empty_count -= 1
         print_board(board)
         #analysis(board)
         
-        game_res = is_win(board)
+        game_res = check_result(board, move, empty_count)
         if game_res in ["White won!", "Black won!", "Draw!"]:
             print(game_res)
+            save(game_res)
             return
         
         # Player move
-        board = player_move(board)
-        if board == 'quit':
+        if ponderer is not None:
+            ponderer.start(board)
+        move = read_move(board)
+        if ponderer is not None:
+            ponderer.stop()
+        if move == 'quit':
             print('Game quitted')
+            save("Continue playing")
             return
+        board[move[0]][move[1]] = "w"
+        moves.append(move)
+        empty_count -= 1
         print_board(board)
         #analysis(board)
         
-        game_res = is_win(board)
+        game_res = check_result(board, move, empty_count)
         if game_res in ["White won!", "Black won!", "Draw!"]:
             print(game_res)
+            save(game_res)
             return
 
 
-def cpu_move(board):
+def cpu_move(board, time_limit=None, table=None, workers=1, mcts=None):
     '''
     Place black piece on board <board> at position to maximize score for CPU.
+    See "choose_move" for the meaning of the other arguments.
     '''
+    move_y, move_x = choose_move(board, 'b', time_limit, table, workers,
+                                 mcts=mcts)
+    print("Computer move: (%d, %d)\n" % (move_y, move_x))
+    board[move_y][move_x] = "b"
+    return board
+
+
+def choose_move(board, col='b', time_limit=None, table=None, workers=1,
+                max_depth=None, weights=None, book=None, mcts=None,
+                stop=None, cache=None, batch=False):
+    '''
+    Return (y, x) coordinates of the move for colour <col> on board <board>,
+    without changing the board. With <time_limit> (seconds) or <max_depth>
+    (plies), use the alpha-beta search with iterative deepening and play the
+    best move found within those limits, reusing transposition table
+    <table> if given; otherwise use the one-move "search_max". With
+    <workers> > 1 the root moves are split across that many processes.
+    Positions are scored with the weights <weights> (see "score_counts"). A
+    forced win found by the threat search (see threats.py) is always played
+    first, and before that the reply from OpeningBook <book> if given and
+    the position is in it. The <time_limit> counts from the call, so the
+    time of the book and of the threat search (at most threats.TIME_SHARE
+    of it) is taken from the search. With MonteCarlo <mcts> (see mcts.py) the move is
+    chosen by its tree search instead, for <time_limit> seconds if given.
+    Setting threading.Event <stop> ends the threat search and a
+    single-process alpha-beta search or "search_max" early (see ponder.py). The moves of
+    "search_max" are cached in LRUCache <cache> if given (see cache.py), and
+    found with NumPy if <batch> (see vectorized.py).
+    '''
+    #Imported here since threats.py itself imports this module
+    import threats
+    #Every step below comes out of the same time budget
+    deadline = None
+    if time_limit is not None:
+        deadline = time.perf_counter() + time_limit
     if is_empty(board):
         board_height = len(board)
         board_width = len(board[0])
-        move_y = board_height // 2
-        move_x = board_width // 2
+        return (board_height // 2, board_width // 2)
+    if book is not None:
+        move = book.probe(board)
+        if move is not None:
+            return move
+    threat_deadline = None
+    if deadline is not None:
+        threat_deadline = min(deadline, time.perf_counter() +
+                              threats.TIME_SHARE * time_limit)
+    win = threats.forced_win(board, col, deadline=threat_deadline, stop=stop)
+    if win is not None:
+        return win
+    if deadline is not None:
+        #Time left for the search
+        time_limit = max(0.0, deadline - time.perf_counter())
+    if mcts is not None:
+        return mcts.best_move(board, col, time_limit=time_limit)
+    elif (time_limit is not None or max_depth is not None) and workers > 1:
+        import parallel
+        return parallel.search_parallel(board, col, time_limit, max_depth,
+                                        workers, weights)[0]
+    elif time_limit is not None or max_depth is not None:
+        return search.best_move(board, col, time_limit, max_depth, table,
+                                weights, stop)
+    elif col == 'w':
+        #search_max plays black: play it on the board with colours swapped
+        return search_max(swap_colours(board), workers=workers,
+                          weights=weights, cache=cache, batch=batch,
+                          stop=stop)
     else:
-        move_y, move_x = search_max(board)
-    print("Computer move: (%d, %d)\n" % (move_y, move_x))
-    board[move_y][move_x] = "b"
-    return board
+        return search_max(board, workers=workers, weights=weights,
+                          cache=cache, batch=batch, stop=stop)
 
 
 def player_move(board):
     '''
     Place white piece on board <board> according to user input.
     '''
+    move = read_move(board)
+    if move == 'quit':
+        return 'quit'
+    board[move[0]][move[1]] = "w"
+    return board
+
+
+def read_move(board):
+    '''
+    Return (y, x) of a free square of board <board> read from user input, or
+    'quit'.
+    '''
     print("Your move! (Type 'quit' at any time to quit the game)")
+    board_height = len(board)
+    board_width = len(board[0])
     move_x, move_y = -1, -1
     while True:
-        inp1 = input('x-coord (0-7): ')
-        inp2 = input('y-coord (0-7): ')
+        inp1 = input('x-coord (0-%d): ' % (board_width - 1))
+        inp2 = input('y-coord (0-%d): ' % (board_height - 1))
         if inp1 == 'quit' or inp2 == 'quit':
             return 'quit'
         else:
@@ -72,15 +199,13 @@ def player_move(board):
                 move_y = int(inp2)
             except ValueError:
                 print("Please enter a valid number")
-        if 0 <= move_x <= 7 and 0 <= move_y <= 7:
+        if 0 <= move_x < board_width and 0 <= move_y < board_height:
             if board[move_y][move_x] == " ":
-                board[move_y][move_x] = "w"
-                break
+                return (move_y, move_x)
             else:
                 print("This space is occupied. Please try again.")
         else:
             print("Your coordinates are out of range. Please try again.")
-    return board
 
 
 def make_empty_board(sz):
@@ -109,19 +234,27 @@ def print_board(board):
     Prints board to console
     Inputs: board -- n x n array of strings
     '''
-    s = "*"
-    for i in range(len(board[0])-1):
-        s += str(i%10) + "|"
-    s += str((len(board[0])-1)%10)
-    s += "*\n"
+    print(board_to_text(board))
+
+
+def board_to_text(board):
+    '''
+    Return the drawing of board <board> printed by "print_board".
+    '''
+    width = len(board[0])
+    lines = ["*" + "|".join(str(i%10) for i in range(width)) + "*"]
     for i in range(len(board)):
-        s += str(i%10)
-        for j in range(len(board[0])-1):
-            s += str(board[i][j]) + "|"
-        s += str(board[i][len(board[0])-1])
-        s += "*\n"
-    s += (len(board[0])*2 + 1)*"*"
-    print(s)
+        lines.append(str(i%10) + "|".join(str(cell) for cell in board[i]) + "*")
+    lines.append((width*2 + 1)*"*")
+    return "\n".join(lines)
+
+
+def swap_colours(board):
+    '''
+    Return copy of board <board> with black and white stones swapped.
+    '''
+    swap = {"b": "w", "w": "b", " ": " "}
+    return [[swap[cell] for cell in row] for row in board]
 
 
 def is_win(board):
@@ -140,6 +273,31 @@ def is_win(board):
     return "Draw!"
 
 
+def check_result(board, last_move, empty_count=None):
+    '''
+    Return the same string as is_win(board), assuming the game was still on
+    before the stone at <last_move> (y, x) was placed: only the four lines
+    through that stone are checked for a five. <empty_count> is the number
+    of free squares left, if known; otherwise the board is scanned for one.
+    '''
+    y, x = last_move
+    col = board[y][x]
+    for d_y, d_x in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        if run_through(board, y, x, d_y, d_x, col)[0] == 5:
+            if col == 'b':
+                return "Black won!"
+            return "White won!"
+    if empty_count is None:
+        empty_count = 0
+        for row in board:
+            if ' ' in row:
+                empty_count = 1
+                break
+    if empty_count == 0:
+        return "Draw!"
+    return "Continue playing"
+
+
 def is_bounded(board, y_end, x_end, length, d_y, d_x):
     '''
     Return whether sequence of length <length> in direction (d_x, d_y) with 
@@ -149,6 +307,8 @@ def is_bounded(board, y_end, x_end, length, d_y, d_x):
         Closed: empty space on neither end of sequence
     '''
     bounded_count = 0
+    height = len(board)
+    width = len(board[0])
     y_start = y_end - (d_y * (length - 1))
     x_start = x_end - (d_x * (length - 1))
     bounded_at_start_y = False
@@ -160,7 +320,7 @@ def is_bounded(board, y_end, x_end, length, d_y, d_x):
         if y_start == 0:
             bounded_count += 1
             bounded_at_start_y = True
-        if y_end == 7:
+        if y_end == height - 1:
             bounded_count += 1
             bounded_at_end_y = True
     if d_x == 1:
@@ -168,12 +328,12 @@ def is_bounded(board, y_end, x_end, length, d_y, d_x):
             bounded_at_start_x = True
             if not bounded_at_start_y:
                 bounded_count += 1
-        if x_end == 7:
+        if x_end == width - 1:
             bounded_at_end_x = True
             if not bounded_at_end_y:
                 bounded_count += 1
     elif d_x == -1:
-        if x_start == 7:
+        if x_start == width - 1:
             bounded_at_start_x = True
             if not bounded_at_start_y:
                 bounded_count += 1
@@ -214,6 +374,8 @@ def detect_row2(board, col, y_start, x_start, length, d_y, d_x):
     (d_y, d_x) of length <length> and returns these counts as a tuple.
     See docstring of "is_bounded" for definitions of open, semiopen, and closed.
     '''
+    height = len(board)
+    width = len(board[0])
     cur_y = y_start
     cur_x = x_start
     open_sequences = 0
@@ -222,11 +384,11 @@ def detect_row2(board, col, y_start, x_start, length, d_y, d_x):
     
     #If row is horizontal
     if d_y == 0:
-        while cur_x < 8:
+        while cur_x < width:
             if board[cur_y][cur_x] == col:
                 col_in_row = 0
                 x_in_seq = cur_x
-                while x_in_seq < 8:
+                while x_in_seq < width:
                     if board[cur_y][x_in_seq] == col:
                         col_in_row += 1
                     else:
@@ -243,11 +405,11 @@ def detect_row2(board, col, y_start, x_start, length, d_y, d_x):
             cur_x += d_x
     #If row is vertical
     elif d_x == 0:
-        while cur_y < 8:
+        while cur_y < height:
             if board[cur_y][cur_x] == col:
                 col_in_row = 0
                 y_in_seq = cur_y
-                while y_in_seq < 8:
+                while y_in_seq < height:
                     if board[y_in_seq][cur_x] == col:
                         col_in_row += 1
                     else:
@@ -264,12 +426,12 @@ def detect_row2(board, col, y_start, x_start, length, d_y, d_x):
             cur_y += d_y
     #If row is diagonal from top left to bottom right
     elif d_x == 1:
-        while cur_y < 8 and cur_x < 8:
+        while cur_y < height and cur_x < width:
             if board[cur_y][cur_x] == col:
                 col_in_row = 0
                 y_in_seq = cur_y
                 x_in_seq = cur_x
-                while y_in_seq < 8 and x_in_seq < 8:
+                while y_in_seq < height and x_in_seq < width:
                     if board[y_in_seq][x_in_seq] == col:
                         col_in_row += 1
                     else:
@@ -290,12 +452,12 @@ def detect_row2(board, col, y_start, x_start, length, d_y, d_x):
             cur_x += d_x
     #If row is diagonal from top right to bottom left
     else:
-        while cur_y < 8 and cur_x > -1:
+        while cur_y < height and cur_x > -1:
             if board[cur_y][cur_x] == col:
                 col_in_row = 0
                 y_in_seq = cur_y
                 x_in_seq = cur_x
-                while y_in_seq < 8 and x_in_seq > -1:
+                while y_in_seq < height and x_in_seq > -1:
                     if board[y_in_seq][x_in_seq] == col:
                         col_in_row += 1
                     else:
@@ -335,17 +497,14 @@ def detect_rows2(board, col, length):
     open_seq = 0
     semiopen_seq = 0
     closed_seq = 0
-    for i in range(8):
+    height = len(board)
+    width = len(board[0])
+    for i in range(width):
         #Verticals:
         res1 = detect_row2(board, col, 0, i, length, 1, 0)
         open_seq += res1[0]
         semiopen_seq += res1[1]
         closed_seq += res1[2]
-        #Horizontals:
-        res2 = detect_row2(board, col, i, 0, length, 0, 1)
-        open_seq += res2[0]
-        semiopen_seq += res2[1]
-        closed_seq += res2[2]
         #Diagonal down-right, iterate along x-axis
         res3 = detect_row2(board, col, 0, i, length, 1, 1)
         open_seq += res3[0]
@@ -356,73 +515,117 @@ def detect_rows2(board, col, length):
         open_seq += res5[0]
         semiopen_seq += res5[1]
         closed_seq += res5[2]
-    for i in range(1, 8):
+    for i in range(height):
+        #Horizontals:
+        res2 = detect_row2(board, col, i, 0, length, 0, 1)
+        open_seq += res2[0]
+        semiopen_seq += res2[1]
+        closed_seq += res2[2]
+    for i in range(1, height):
         #Diagonal down-right, iterate along y-axis
         res4 = detect_row2(board, col, i, 0, length, 1, 1)
         open_seq += res4[0]
         semiopen_seq += res4[1]
         closed_seq += res4[2]
         #Diagonal down-left, iterate along y-axis
-        res6 = detect_row2(board, col, i, 7, length, 1, -1)
+        res6 = detect_row2(board, col, i, width - 1, length, 1, -1)
         open_seq += res6[0]
         semiopen_seq += res6[1]
         closed_seq += res6[2]
     return (open_seq, semiopen_seq, closed_seq)
 
 
-def score(board):
+def score(board, cache=None, weights=None):
     '''
     Calculate the "score" of the board for the AI. Assumes black has just moved.
+    Scores use the weights <weights> (see "score_counts"); those with the
+    default weights are looked up in and added to LRUCache <cache> if given.
     '''
-    MAX_SCORE = 100000
-    
-    open_b = {}
-    semi_open_b = {}
-    open_w = {}
-    semi_open_w = {}
-    
-    for i in range(2, 6):
-        open_b[i], semi_open_b[i] = detect_rows(board, "b", i)
-        open_w[i], semi_open_w[i] = detect_rows(board, "w", i)
-    
-    if open_b[5] >= 1 or semi_open_b[5] >= 1:
-        return MAX_SCORE
-    
-    elif open_w[5] >= 1 or semi_open_w[5] >= 1:
-        return -MAX_SCORE
-        
-    return (-10000 * (open_w[4] + semi_open_w[4])+ 
-            500  * open_b[4]                     + 
-            50   * semi_open_b[4]                + 
-            -100  * open_w[3]                    + 
-            -30   * semi_open_w[3]               + 
-            50   * open_b[3]                     + 
-            10   * semi_open_b[3]                +  
-            open_b[2] + semi_open_b[2] - open_w[2] - semi_open_w[2])
+    if cache is not None and weights is None:
+        key = board_key(board)
+        value = cache.get(key)
+        if value is None:
+            value = score(board)
+            cache.put(key, value)
+        return value
+    #Same counts as detect_rows, from the pattern table
+    return score_totals(board_totals(board), weights=weights)
 
 
-def search_max(board):
+def search_max(board, radius=2, workers=1, weights=None, cache=None,
+               batch=False, stop=None):
     '''
     Return (y, x) coordinates of board to maximize score for black (CPU).
-    '''
-    free_squares = []
+    Only free squares within <radius> of a stone are tried. With <workers>
+    > 1 (None for all CPUs) the squares are scored by a process pool.
+    Scores use the weights <weights> (see "score_counts"). Moves found with
+    the default radius and weights are looked up in and added to LRUCache
+    <cache> if given. With <batch> all the squares are scored at once with
+    NumPy (see vectorized.py), which gives the same move. Setting
+    threading.Event <stop> ends the single-process search early, with the
+    best square of those scored so far (see ponder.py).
+    '''
+    if cache is not None and radius == 2 and weights is None:
+        key = board_key(board) ^ MOVES
+        value = cache.get(key)
+        if value is None:
+            move = search_max(board, radius, workers, weights, batch=batch,
+                              stop=stop)
+            #The move of a stopped search is not kept
+            if move == 0 or (stop is not None and stop.is_set()):
+                return move
+            value = move[0] * len(board[0]) + move[1]
+            cache.put(key, value)
+        return divmod(value, len(board[0]))
+    if batch:
+        #Imported here since vectorized.py itself imports this module
+        import vectorized
+        return vectorized.search_max_batch(board, radius, weights)
+    if workers != 1:
+        #Imported here since parallel.py itself imports this module
+        import parallel
+        return parallel.search_max_parallel(board, workers, radius, weights)
+    free_squares = candidate_moves(board, radius)
     cur_max = -100000
     index_cur_max = 0
     
-    for y in range(8):
-        for x in range(8):
-            if board[y][x] == ' ':
-                free_squares.append([y, x])
+    #Squares that a symmetry of the board maps to each other score the
+    #same, so only the first of them is scored
+    classes = move_classes(board, free_squares)
+    scores = {}
+    #Only the four lines through each candidate square are rescanned
+    evaluator = LineEvaluator(board, weights)
     for index in free_squares:
-        board[index[0]][index[1]] = 'b'
-        if score(board) >= cur_max:
-            cur_max = score(board)
+        if stop is not None and stop.is_set():
+            break
+        first = classes[index]
+        if first not in scores:
+            evaluator.place(first[0], first[1], 'b')
+            scores[first] = evaluator.score()
+            evaluator.remove(first[0], first[1])
+        cur_score = scores[first]
+        if cur_score >= cur_max:
+            cur_max = cur_score
             index_cur_max = (index[0], index[1])
-        board[index[0]][index[1]] = ' '
     
     return index_cur_max
 
 
+def board_to_string(board):
+    '''
+    Return compact string form of board <board>: one character per cell
+    ("b", "w" or "." for empty), rows separated by "/".
+    '''
+    return "/".join("".join(row).replace(" ", ".") for row in board)
+
+
+def string_to_board(s):
+    '''
+    Return board from its compact string form <s>, see "board_to_string".
+    '''
+    return [list(row.replace(".", " ")) for row in s.split("/")]
+
+
 def put_seq_on_board(board, y, x, d_y, d_x, length, col):
     '''
     For testing purposes. Put sequence of colour <col> of length <length> 
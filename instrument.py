@@ -0,0 +1,264 @@
+'''
+Opt-in profiling of the Gomoku engine.
+While profiling is enabled, the functions of the evaluation and search
+pipeline are replaced by wrappers that count their calls and time them,
+everywhere they are referenced in the loaded modules. When it is disabled
+the original functions are put back, so the engine runs exactly as
+without this module. Times are wall-clock and include the time spent in
+the functions called, which are themselves timed, so the totals of nested
+functions overlap. Work done in other processes (workers > 1) is not seen.
+
+    with profiled() as profile:
+        engine.play_best()
+    print(profile.report())
+
+Run "python instrument.py" to profile a game of the CPU against itself.
+'''
+
+import argparse
+import functools
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+class Profile:
+    '''
+    Counters and timers collected while profiling.
+    '''
+
+    def __init__(self):
+        self.counters = {}
+        #[calls, total seconds, longest call in seconds] by name
+        self.timers = {}
+
+    def count(self, name, amount=1):
+        '''
+        Add <amount> to counter <name>.
+        '''
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_time(self, name, seconds):
+        '''
+        Record a call of <seconds> seconds to timer <name>.
+        '''
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0.0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+
+    def clear(self):
+        '''
+        Reset all counters and timers.
+        '''
+        self.counters.clear()
+        self.timers.clear()
+
+    def as_dict(self):
+        '''
+        Return counters and timers as a dictionary that can be saved as JSON.
+        '''
+        timers = {}
+        for name, (calls, total, longest) in self.timers.items():
+            timers[name] = {"calls": calls,
+                            "total_s": total,
+                            "mean_s": total / calls,
+                            "max_s": longest}
+        return {"counters": dict(self.counters), "timers": timers}
+
+    def report(self):
+        '''
+        Return the timers, slowest in total first, and the counters as text.
+        '''
+        lines = ["%-24s %10s %12s %12s %12s" % ("function", "calls",
+                                                "total (ms)", "mean (us)",
+                                                "max (ms)")]
+        timers = sorted(self.timers.items(), key=lambda item: -item[1][1])
+        for name, (calls, total, longest) in timers:
+            lines.append("%-24s %10d %12.3f %12.3f %12.3f" % (
+                name, calls, total * 1000, total / calls * 1e6,
+                longest * 1000))
+        if self.counters:
+            lines.append("")
+            lines.append("%-24s %10s" % ("counter", "count"))
+            for name, value in sorted(self.counters.items()):
+                lines.append("%-24s %10d" % (name, value))
+        return "\n".join(lines)
+
+
+_active = None
+#(owner, attribute, original value) of every replaced function
+_patches = []
+
+
+def _timed(profile, name, func):
+    '''
+    Return wrapper of <func> adding each call to timer <name>.
+    '''
+    clock = time.perf_counter
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add_time(name, clock() - start)
+    return wrapper
+
+
+def _counted(profile, name, func):
+    '''
+    Return wrapper of <func> counting its calls in counter <name>.
+    '''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile.count(name)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _hits(profile, name, func):
+    '''
+    Return wrapper of <func> counting the calls returning None in counter
+    <name>.misses and the others in <name>.hits.
+    '''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        profile.count(name + (".misses" if result is None else ".hits"))
+        return result
+    return wrapper
+
+
+def _targets():
+    '''
+    Return list of (owner, attribute, wrapper maker, name) of the functions
+    to profile, where owner is a module or a class.
+    '''
+    import book
+    import cache
+    import evaluator
+    import gomoku
+    import mcts
+    import movegen
+    import patterns
+    import search
+    import threats
+    import transposition
+    return [(gomoku, "choose_move", _timed, "choose_move"),
+            (gomoku, "search_max", _timed, "search_max"),
+            (gomoku, "score", _timed, "score"),
+            (gomoku, "is_win", _timed, "is_win"),
+            (gomoku, "check_result", _timed, "check_result"),
+            (evaluator, "board_totals", _timed, "board_totals"),
+            (evaluator.LineEvaluator, "__init__", _timed, "evaluator.init"),
+            (evaluator.LineEvaluator, "score", _timed, "evaluator.score"),
+            (evaluator.LineEvaluator, "place", _timed, "evaluator.place"),
+            (evaluator.LineEvaluator, "remove", _timed, "evaluator.remove"),
+            (patterns, "line_features", _timed, "line_features"),
+            (movegen, "order_moves", _timed, "order_moves"),
+            (movegen, "candidate_moves", _timed, "candidate_moves"),
+            (search.Searcher, "search", _timed, "search"),
+            (search.Searcher, "negamax", _counted, "search.nodes"),
+            (transposition.TranspositionTable, "lookup", _hits, "table"),
+            (threats, "forced_win", _timed, "forced_win"),
+            (threats.ThreatSearch, "count_node", _counted, "threats.nodes"),
+            (book.OpeningBook, "probe", _hits, "book"),
+            (cache.LRUCache, "get", _hits, "cache"),
+            (mcts.MonteCarlo, "search", _timed, "mcts.search")]
+
+
+def _replace(owner, attribute, value):
+    '''
+    Set <owner>.<attribute> to <value>, remembering the old value.
+    '''
+    _patches.append((owner, attribute, getattr(owner, attribute)))
+    setattr(owner, attribute, value)
+
+
+def enable(profile=None):
+    '''
+    Start profiling into Profile <profile> (a new one if None) and return
+    it. Functions of a module are also replaced where other loaded modules
+    imported them by name.
+    '''
+    global _active
+    if _active is not None:
+        disable()
+    if profile is None:
+        profile = Profile()
+    for owner, attribute, make, name in _targets():
+        original = getattr(owner, attribute)
+        wrapper = make(profile, name, original)
+        if isinstance(owner, type):
+            _replace(owner, attribute, wrapper)
+            continue
+        for module in list(sys.modules.values()):
+            if getattr(module, attribute, None) is original:
+                _replace(module, attribute, wrapper)
+    _active = profile
+    return profile
+
+
+def disable():
+    '''
+    Stop profiling and put back the original functions.
+    '''
+    global _active
+    while _patches:
+        owner, attribute, original = _patches.pop()
+        setattr(owner, attribute, original)
+    _active = None
+
+
+def active():
+    '''
+    Return the Profile being collected, or None if profiling is disabled.
+    '''
+    return _active
+
+
+@contextmanager
+def profiled(profile=None):
+    '''
+    Context manager profiling its body, giving the Profile.
+    '''
+    profile = enable(profile)
+    try:
+        yield profile
+    finally:
+        disable()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="search each move for this many seconds "
+                             "instead of playing the greedy move")
+    parser.add_argument("--json", help="write the profile to this JSON file")
+    args = parser.parse_args()
+
+    from engine import GomokuEngine
+    game = GomokuEngine(args.size, time_limit=args.time_limit)
+    with profiled() as profile:
+        while not game.is_over():
+            game.play_best()
+    print("%s after %d moves\n" % (game.result(), len(game.history)))
+    print(profile.report())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(profile.as_dict(), f, indent=1)
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,354 @@
+'''
+Monte Carlo tree search for the Gomoku CPU player.
+The tree is grown by UCT: each playout walks down from the root through
+the child maximising wins / visits + c * sqrt(ln(parent visits) / visits),
+adds one new child, and finishes the game with random moves, which are
+only chosen among the empty squares next to a stone. The result is added
+to every node on the way back up, and the move played is the root child
+visited most.
+
+Playouts run on a flat bytearray of patterns.CODES with a border of EDGE
+cells, so neighbours and runs are found by adding offsets without bounds
+checks, and only the lines through each new stone are checked for a five.
+The tree is kept between calls: when the board is a position of the tree
+(the previous root after our move and the reply), search continues from
+that node instead of starting again.
+
+    player = MonteCarlo(exploration=1.0, playouts=2000)
+    move = player.best_move(board, 'b')
+
+Run "python tournament.py mcts:playouts=2000 greedy" to compare it with
+the other CPU players.
+'''
+
+import math
+import random
+import time
+
+from patterns import BLACK, CODES, EDGE, WHITE
+from position import Position
+
+#Playouts a move if neither a number of playouts nor a time is given
+PLAYOUTS = 1000
+EXPLORATION = 1.0
+#Distance from a stone of the squares tried by the tree and the playouts
+RADIUS = 1
+#Playouts between checks of the clock
+CLOCK_EVERY = 32
+
+
+class Node:
+    '''
+    Node of the search tree, reached by colour <col> playing flat board
+    index <move> from Node <parent>. <wins> counts the playouts through the
+    node won by <col>, draws counting half. <winner> is the code of the
+    colour that won at the node (0 for a draw) or None if the game goes on.
+    '''
+
+    __slots__ = ("move", "col", "parent", "children", "untried", "visits",
+                 "wins", "winner")
+
+    def __init__(self, move, col, parent, winner=None):
+        self.move = move
+        self.col = col
+        self.parent = parent
+        self.children = []
+        #Moves not yet expanded, None until the node is first expanded
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+        self.winner = winner
+
+
+class MonteCarlo:
+    '''
+    Monte Carlo tree search player with exploration constant
+    <exploration>, searching <playouts> playouts or <time_limit> seconds a
+    move, whichever ends first (PLAYOUTS playouts if neither is given).
+    Random moves come from random.Random(<seed>).
+    '''
+
+    def __init__(self, exploration=EXPLORATION, playouts=None,
+                 time_limit=None, radius=RADIUS, seed=0):
+        self.exploration = exploration
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.radius = radius
+        self.rand = random.Random(seed)
+        self.size = None
+        self.root = None
+        self.position = None
+        #Statistics of the last search
+        self.last_playouts = 0
+        self.last_reused = 0
+
+    def _layout(self, height, width):
+        '''
+        Set up the flat board layout for boards of size (height x width):
+        <radius> EDGE cells before each row and above and below the board.
+        '''
+        if self.size == (height, width):
+            return
+        pad = self.radius
+        self.size = (height, width)
+        self.stride = stride = width + pad
+        self.base = pad * stride + pad
+        self.length = (height + 2 * pad) * stride + pad
+        self.offsets = [d_y * stride + d_x
+                        for d_y in range(-pad, pad + 1)
+                        for d_x in range(-pad, pad + 1) if d_y or d_x]
+        self.steps = (1, stride, stride + 1, stride - 1)
+        self.root = None
+
+    def index(self, y, x):
+        '''
+        Return flat board index of square (y, x).
+        '''
+        return self.base + y * self.stride + x
+
+    def square(self, index):
+        '''
+        Return (y, x) of flat board index <index>.
+        '''
+        return divmod(index - self.base, self.stride)
+
+    def flat_board(self, board):
+        '''
+        Return (cells, near, empty) for board <board>: the flat board, list
+        of the empty indices within <radius> of a stone and number of empty
+        squares.
+        '''
+        height, width = self.size
+        cells = bytearray([EDGE]) * self.length
+        empty = 0
+        for y in range(height):
+            row = board[y]
+            start = self.index(y, 0)
+            for x in range(width):
+                cells[start + x] = CODES[row[x]]
+                if row[x] == ' ':
+                    empty += 1
+        near = []
+        flags = bytearray(self.length)
+        for i in range(self.length):
+            if cells[i] == BLACK or cells[i] == WHITE:
+                for offset in self.offsets:
+                    j = i + offset
+                    if cells[j] == 0 and not flags[j]:
+                        flags[j] = 1
+                        near.append(j)
+        if not near and empty:
+            #Empty board: start in the centre
+            near.append(self.index(height // 2, width // 2))
+        near.sort()
+        return cells, near, empty
+
+    def is_five(self, cells, i, col):
+        '''
+        Return True if the stone of code <col> at index <i> is in a run of
+        exactly five.
+        '''
+        for step in self.steps:
+            count = 1
+            j = i + step
+            while cells[j] == col:
+                count += 1
+                j += step
+            j = i - step
+            while cells[j] == col:
+                count += 1
+                j -= step
+            if count == 5:
+                return True
+        return False
+
+    def playout(self, cells, near, empty, col):
+        '''
+        Finish the game on flat board <cells> (changed) with random moves
+        from <near> (changed), colour code <col> to move and <empty> empty
+        squares, and return the code of the winner, 0 for a draw.
+        '''
+        random = self.rand.random
+        offsets = self.offsets
+        steps = self.steps
+        while empty:
+            #Squares taken since they were added are dropped when drawn
+            while True:
+                if not near:
+                    #No empty square next to a stone: the board is full
+                    return 0
+                k = int(random() * len(near))
+                i = near[k]
+                if cells[i] == 0:
+                    break
+                near[k] = near[-1]
+                near.pop()
+            cells[i] = col
+            empty -= 1
+            for step in steps:
+                count = 1
+                j = i + step
+                while cells[j] == col:
+                    count += 1
+                    j += step
+                j = i - step
+                while cells[j] == col:
+                    count += 1
+                    j -= step
+                if count == 5:
+                    return col
+            for offset in offsets:
+                if cells[i + offset] == 0:
+                    near.append(i + offset)
+            #BLACK <-> WHITE
+            col = 3 - col
+        return 0
+
+    def _reuse(self, position):
+        '''
+        Return the node of the tree for Position <position>, detached from
+        its parent, or None if the position is not in the tree.
+        '''
+        if self.root is None or self.position.width != position.width or \
+                self.position.height != position.height:
+            return None
+        old = self.position.cells
+        new = position.cells
+        added = {}
+        for k in range(len(old)):
+            if old[k] != new[k]:
+                if old[k] != 32:
+                    return None
+                y, x = divmod(k, position.width)
+                added[self.index(y, x)] = CODES[chr(new[k])]
+        node = self.root
+        while added:
+            for child in node.children:
+                if added.get(child.move) == child.col:
+                    del added[child.move]
+                    node = child
+                    break
+            else:
+                return None
+        if node.winner is not None or \
+                CODES[position.to_move] == node.col:
+            return None
+        node.parent = None
+        return node
+
+    def _select(self, node):
+        '''
+        Return the child of <node> with the highest UCT value.
+        '''
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        best = None
+        best_value = -1.0
+        for child in node.children:
+            value = child.wins / child.visits + \
+                exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+    def search(self, board, col='b', playouts=None, time_limit=None):
+        '''
+        Grow the tree for colour <col> to move on board <board> for
+        <playouts> playouts or <time_limit> seconds (the player's own limits
+        if both are None) and return the root Node.
+        '''
+        if playouts is None and time_limit is None:
+            playouts = self.playouts
+            time_limit = self.time_limit
+            if playouts is None and time_limit is None:
+                playouts = PLAYOUTS
+        self._layout(len(board), len(board[0]))
+        position = Position.from_board(board, col)
+        root = self._reuse(position)
+        if root is None:
+            root = Node(None, 3 - CODES[col], None)
+        self.root = root
+        self.position = position
+        self.last_reused = root.visits
+        cells, near, empty = self.flat_board(board)
+        offsets = self.offsets
+        deadline = None
+        if time_limit is not None:
+            deadline = time.perf_counter() + time_limit
+        count = 0
+        while playouts is None or count < playouts:
+            if deadline is not None and count % CLOCK_EVERY == 0 and \
+                    time.perf_counter() >= deadline and count > 0:
+                break
+            count += 1
+            board_cells = cells[:]
+            board_near = near[:]
+            left = empty
+            node = root
+            #Selection: down through fully expanded nodes
+            while node.winner is None and node.untried == [] and \
+                    node.children:
+                node = self._select(node)
+                board_cells[node.move] = node.col
+                left -= 1
+                for offset in offsets:
+                    if board_cells[node.move + offset] == 0:
+                        board_near.append(node.move + offset)
+            #Expansion: one new child
+            if node.winner is None:
+                if node.untried is None:
+                    node.untried = sorted(set(
+                        i for i in board_near if board_cells[i] == 0))
+                    self.rand.shuffle(node.untried)
+                if node.untried:
+                    move = node.untried.pop()
+                    mover = 3 - node.col
+                    board_cells[move] = mover
+                    left -= 1
+                    winner = None
+                    if self.is_five(board_cells, move, mover):
+                        winner = mover
+                    elif left == 0:
+                        winner = 0
+                    child = Node(move, mover, node, winner)
+                    node.children.append(child)
+                    node = child
+                    for offset in offsets:
+                        if board_cells[move + offset] == 0:
+                            board_near.append(move + offset)
+            #Simulation
+            if node.winner is not None:
+                result = node.winner
+            else:
+                result = self.playout(board_cells, board_near, left,
+                                      3 - node.col)
+            #Backpropagation
+            while node is not None:
+                node.visits += 1
+                if result == node.col:
+                    node.wins += 1.0
+                elif result == 0:
+                    node.wins += 0.5
+                node = node.parent
+        self.last_playouts = count
+        return root
+
+    def best_move(self, board, col='b', playouts=None, time_limit=None):
+        '''
+        Return (y, x) of the move for colour <col> on board <board>: the
+        root child visited most after "search". Raise ValueError if the
+        board is full.
+        '''
+        root = self.search(board, col, playouts, time_limit)
+        if not root.children:
+            if root.untried:
+                return self.square(root.untried[-1])
+            for y in range(len(board)):
+                for x in range(len(board[0])):
+                    if board[y][x] == ' ':
+                        return (y, x)
+            raise ValueError("the board is full")
+        best = max(root.children, key=lambda child: (child.visits,
+                                                     child.wins))
+        return self.square(best.move)
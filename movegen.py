@@ -0,0 +1,155 @@
+'''
+Candidate move generation for the Gomoku CPU player.
+Only empty squares within a small distance of a stone already on the board
+are worth searching. CandidateSet keeps that set up to date as stones are
+placed and removed, and order_moves sorts candidates so that moves making or
+blocking the strongest sequences are searched first.
+'''
+
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+#Priority of a move by the sequence it makes (attack) or blocks (defence),
+#indexed by (length, open ends). Winning comes before blocking a five,
+#which comes before making an open four, etc.
+ATTACK = {(5, 0): 1000000, (5, 1): 1000000, (5, 2): 1000000,
+          (4, 2): 50000, (4, 1): 5000,
+          (3, 2): 2000, (3, 1): 200,
+          (2, 2): 100, (2, 1): 10}
+DEFENCE = {(5, 0): 500000, (5, 1): 500000, (5, 2): 500000,
+           (4, 2): 20000, (4, 1): 4000,
+           (3, 2): 1000, (3, 1): 100,
+           (2, 2): 50, (2, 1): 5}
+
+
+class CandidateSet:
+    '''
+    Set of the empty squares of board <board> within distance <radius>
+    (in any direction) of a stone. The set follows the stones placed and
+    removed through "place" and "remove", which do not modify <board>
+    themselves: call them after changing the board.
+    '''
+
+    def __init__(self, board, radius=2):
+        self.board = board
+        self.height = len(board)
+        self.width = len(board[0])
+        self.radius = radius
+        #near[y][x] = number of stones within <radius> of (x, y)
+        self.near = [[0] * self.width for y in range(self.height)]
+        self.candidates = set()
+        for y in range(self.height):
+            for x in range(self.width):
+                if board[y][x] != ' ':
+                    self._update(y, x, 1)
+        for y in range(self.height):
+            for x in range(self.width):
+                if board[y][x] == ' ' and self.near[y][x] > 0:
+                    self.candidates.add((y, x))
+
+    def _update(self, y, x, change):
+        '''
+        Add <change> to the near count of the squares around (x, y), and
+        return the squares whose count changed.
+        '''
+        radius = self.radius
+        near = self.near
+        cells = []
+        for cur_y in range(max(0, y - radius), min(self.height, y + radius + 1)):
+            row = near[cur_y]
+            for cur_x in range(max(0, x - radius),
+                               min(self.width, x + radius + 1)):
+                row[cur_x] += change
+                cells.append((cur_y, cur_x))
+        return cells
+
+    def place(self, y, x):
+        '''
+        Update the set after a stone was placed at (x, y).
+        '''
+        board = self.board
+        candidates = self.candidates
+        for cell in self._update(y, x, 1):
+            if board[cell[0]][cell[1]] == ' ':
+                candidates.add(cell)
+        candidates.discard((y, x))
+
+    def remove(self, y, x):
+        '''
+        Update the set after the stone at (x, y) was removed.
+        '''
+        near = self.near
+        candidates = self.candidates
+        for cell in self._update(y, x, -1):
+            if near[cell[0]][cell[1]] == 0:
+                candidates.discard(cell)
+        if near[y][x] > 0:
+            candidates.add((y, x))
+
+    def cells(self):
+        '''
+        Return list of the candidate squares in row-major order.
+        '''
+        return sorted(self.candidates)
+
+
+def run_through(board, y, x, d_y, d_x, col):
+    '''
+    Return (length, open ends) of the sequence of colour <col> through (x, y)
+    in direction (d_y, d_x) if a stone of colour <col> were placed at (x, y).
+    '''
+    height = len(board)
+    width = len(board[0])
+    length = 1
+    open_ends = 0
+    for sign in (1, -1):
+        cur_y = y + sign * d_y
+        cur_x = x + sign * d_x
+        while 0 <= cur_y < height and 0 <= cur_x < width and \
+                board[cur_y][cur_x] == col:
+            length += 1
+            cur_y += sign * d_y
+            cur_x += sign * d_x
+        if 0 <= cur_y < height and 0 <= cur_x < width and \
+                board[cur_y][cur_x] == ' ':
+            open_ends += 1
+    return length, open_ends
+
+
+def move_priority(board, y, x, col):
+    '''
+    Return how urgent the empty square (x, y) is for colour <col> to play,
+    from the sequences it would make for <col> and block for the opponent.
+    '''
+    opp = "w" if col == "b" else "b"
+    priority = 0
+    for d_y, d_x in DIRECTIONS:
+        length, open_ends = run_through(board, y, x, d_y, d_x, col)
+        priority += ATTACK.get((min(length, 5), open_ends), 0)
+        length, open_ends = run_through(board, y, x, d_y, d_x, opp)
+        priority += DEFENCE.get((min(length, 5), open_ends), 0)
+    return priority
+
+
+def order_moves(board, moves, col):
+    '''
+    Return list <moves> of (y, x) sorted by decreasing priority for colour
+    <col>; moves of equal priority keep their order.
+    '''
+    priorities = {}
+    for y, x in moves:
+        priorities[(y, x)] = move_priority(board, y, x, col)
+    return sorted(moves, key=lambda move: -priorities[move])
+
+
+def candidate_moves(board, radius=2):
+    '''
+    Return list of the empty squares within <radius> of a stone in row-major
+    order, or of every empty square if the board has no stones.
+    '''
+    moves = CandidateSet(board, radius).cells()
+    if not moves:
+        for y in range(len(board)):
+            for x in range(len(board[0])):
+                if board[y][x] == ' ':
+                    moves.append((y, x))
+    return moves
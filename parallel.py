@@ -0,0 +1,171 @@
+'''
+Parallel evaluation of the CPU's candidate moves across a process pool.
+The candidate moves at the root are split into contiguous chunks, one per
+worker, and the board is sent to the workers in its compact string form
+to keep the cost of pickling low. The scores of "search_max_parallel" are
+merged back in the original move order, so ties are broken exactly as in
+"search_max". The alpha-beta search of "search_parallel" may choose another
+move than the sequential search among moves of equal value (see there).
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from evaluator import LineEvaluator
+from gomoku import board_to_string, string_to_board
+from movegen import candidate_moves
+from search import Searcher, WIN_BOUND
+from transposition import TranspositionTable
+
+_pools = {}
+#Transposition table of a worker process, kept between its searches
+_worker_table = None
+
+
+def get_pool(workers):
+    '''
+    Return the shared process pool with <workers> workers, starting it on
+    first use.
+    '''
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _pools[workers]
+
+
+def shutdown_pools():
+    '''
+    Stop all the shared process pools.
+    '''
+    for pool in _pools.values():
+        pool.shutdown()
+    _pools.clear()
+
+
+def split(moves, parts):
+    '''
+    Return list <moves> split into at most <parts> contiguous chunks of
+    nearly equal size.
+    '''
+    parts = max(1, min(parts, len(moves)))
+    size, extra = divmod(len(moves), parts)
+    chunks = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(moves[start:end])
+        start = end
+    return chunks
+
+
+def _score_moves(compact, moves, weights=None):
+    '''
+    Worker: return list of the scores for black of each move in <moves> on
+    the board in compact form <compact>, using the weights <weights>.
+    '''
+    evaluator = LineEvaluator(string_to_board(compact), weights)
+    scores = []
+    for y, x in moves:
+        evaluator.place(y, x, 'b')
+        scores.append(evaluator.score())
+        evaluator.remove(y, x)
+    return scores
+
+
+def search_max_parallel(board, workers=None, radius=2, weights=None):
+    '''
+    Return the same (y, x) as search_max(board, radius, weights=weights),
+    with the candidate squares scored by <workers> processes (all CPUs if
+    None).
+    '''
+    moves = candidate_moves(board, radius)
+    if not moves:
+        return 0
+    if workers is None:
+        workers = os.cpu_count()
+    chunks = split(moves, workers)
+    compact = board_to_string(board)
+    scores = []
+    for chunk_scores in get_pool(workers).map(_score_moves,
+                                              [compact] * len(chunks), chunks,
+                                              [weights] * len(chunks)):
+        scores.extend(chunk_scores)
+
+    cur_max = -100000
+    index_cur_max = 0
+    for move, cur_score in zip(moves, scores):
+        if cur_score >= cur_max:
+            cur_max = cur_score
+            index_cur_max = move
+    return index_cur_max
+
+
+def _search_moves(compact, col, moves, time_limit, max_depth, weights=None):
+    '''
+    Worker: run the alpha-beta search from the board in compact form
+    <compact> over root moves <moves> only, and return the list of
+    (depth, move, value) of each completed iteration.
+    '''
+    global _worker_table
+    if _worker_table is None:
+        _worker_table = TranspositionTable()
+    if weights is not None:
+        #Values stored with other weights would not match
+        table = TranspositionTable()
+    else:
+        table = _worker_table
+    searcher = Searcher(string_to_board(compact), col, table,
+                        weights=weights)
+    searcher.search(time_limit, max_depth, moves)
+    return searcher.iterations
+
+
+def search_parallel(board, col="b", time_limit=0.5, max_depth=None,
+                    workers=None, weights=None):
+    '''
+    Return (move, value, depth) like search.search, with the root moves
+    shared between <workers> processes (all CPUs if None), each searching
+    its own moves by iterative deepening within <time_limit> seconds. The
+    result comes from the deepest iteration completed by every worker.
+    Among the best moves of the workers, ties go to the move later in
+    row-major order. Within a worker ties are broken as in
+    Searcher.search_root, which searches the best move of the previous
+    iteration first, so among moves of equal value the move chosen is not
+    always the last in row-major order, nor the one of the sequential
+    search.
+    '''
+    if workers is None:
+        workers = os.cpu_count()
+    moves = candidate_moves(board)
+    chunks = split(moves, workers)
+    compact = board_to_string(board)
+    count = len(chunks)
+    results = list(get_pool(workers).map(_search_moves, [compact] * count,
+                                         [col] * count, chunks,
+                                         [time_limit] * count,
+                                         [max_depth] * count,
+                                         [weights] * count))
+    #Workers stop deepening once their moves are won or lost, and those
+    #results hold at any depth
+    depth = None
+    for iterations in results:
+        if not iterations or abs(iterations[-1][2]) < WIN_BOUND:
+            if depth is None or len(iterations) < depth:
+                depth = len(iterations)
+    if depth is None:
+        depth = max(len(iterations) for iterations in results)
+    if depth == 0:
+        #Some worker did not finish depth 1: use the shallowest results
+        #available rather than nothing
+        results = [iterations for iterations in results if iterations]
+        if not results:
+            return moves[0], 0, 0
+        depth = 1
+    best_move = None
+    best = None
+    for iterations in results:
+        move, value = iterations[min(depth, len(iterations)) - 1][1:]
+        #Ties between workers go to the move later in row-major order
+        if best is None or value > best or \
+                (value == best and move > best_move):
+            best_move, best = move, value
+    return best_move, best, depth
@@ -0,0 +1,194 @@
+'''
+Precomputed line-pattern table for Gomoku evaluation.
+Each cell of a line is coded in two bits (empty, black, white or off the
+board) and a whole line is kept as one integer, padded with off-board cells
+at both ends. The table maps every window of WINDOW cells to the sequence,
+if any, that starts at its second cell: its colour, its length and how many
+of its ends are bounded, as in "is_bounded". The starts of the sequences of
+a line are found with a few bit operations, so classifying a line takes one
+table lookup per sequence instead of walking each sequence and checking its
+ends.
+'''
+
+import os
+
+EMPTY = 0
+BLACK = 1
+WHITE = 2
+EDGE = 3
+CODES = {' ': EMPTY, 'b': BLACK, 'w': WHITE}
+COLOURS = {BLACK: 'b', WHITE: 'w'}
+
+MAX_LENGTH = 5
+#The cell before the sequence, the longest sequence counted, and one more
+#cell to see the end of the sequence
+WINDOW = MAX_LENGTH + 2
+MASK = (1 << (2 * WINDOW)) - 1
+#Off-board cells padding a line after its last cell, so that the window of
+#every cell of the line is complete
+PADDING = WINDOW - 2
+#Low bit of every cell of a line, by number of cells (see "low_bits")
+_low_bits = {}
+
+#Header of the table cache file, followed by one byte per window
+CACHE_MAGIC = b"GMKPAT1\n"
+
+
+def feature(col, length, bounded):
+    '''
+    Return the table value of a sequence of colour <col> ("b" or "w") of
+    length <length> with <bounded> blocked ends (0 = open, 1 = semi-open,
+    2 = closed). 0 stands for no sequence.
+    '''
+    c = 0 if col == "b" else 1
+    return 1 + (c * MAX_LENGTH + length - 1) * 3 + bounded
+
+
+#(col, length, bounded) of each table value
+FEATURES = [None]
+for _col in ("b", "w"):
+    for _length in range(1, MAX_LENGTH + 1):
+        for _bounded in range(3):
+            FEATURES.append((_col, _length, _bounded))
+FEATURE_COUNT = len(FEATURES)
+
+
+def window_feature(cells):
+    '''
+    Return the table value for the window of cell codes <cells>, in line
+    order: the sequence starting at cells[1], if cells[1] holds a stone
+    that does not continue a sequence from cells[0]. Sequences longer than
+    MAX_LENGTH are not counted.
+    '''
+    start = cells[1]
+    if start not in COLOURS or cells[0] == start:
+        return 0
+    length = 1
+    while length < WINDOW - 1 and cells[1 + length] == start:
+        length += 1
+    if length > MAX_LENGTH:
+        return 0
+    bounded = 0
+    if cells[0] != EMPTY:
+        bounded += 1
+    if cells[1 + length] != EMPTY:
+        bounded += 1
+    return feature(COLOURS[start], length, bounded)
+
+
+def build_table():
+    '''
+    Return the pattern table as a bytes object indexed by window.
+    '''
+    table = bytearray(MASK + 1)
+    for index in range(MASK + 1):
+        cells = [(index >> (2 * i)) & 3 for i in range(WINDOW)]
+        table[index] = window_feature(cells)
+    return bytes(table)
+
+
+def load_table(path):
+    '''
+    Return the pattern table saved at <path>, or None if the file is
+    missing or does not hold a table of the right size.
+    '''
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(CACHE_MAGIC) or \
+            len(data) != len(CACHE_MAGIC) + MASK + 1:
+        return None
+    return data[len(CACHE_MAGIC):]
+
+
+def save_table(table, path):
+    '''
+    Write pattern table <table> to <path>, through a temporary file so that
+    a concurrent reader never sees half a table.
+    '''
+    temp = "%s.%d.tmp" % (path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(CACHE_MAGIC)
+        f.write(table)
+    os.replace(temp, path)
+
+
+_table = None
+
+
+def get_table(cache_path=None):
+    '''
+    Return the pattern table, built on first use. If <cache_path> is given
+    the table is read from that file, or written there after building it.
+    '''
+    global _table
+    if _table is None:
+        table = None
+        if cache_path is not None:
+            table = load_table(cache_path)
+        if table is None:
+            table = build_table()
+            if cache_path is not None:
+                try:
+                    save_table(table, cache_path)
+                except OSError:
+                    pass
+        _table = table
+    return _table
+
+
+def cell_shift(position):
+    '''
+    Return the bit position in a line value of the cell at index <position>
+    of the line.
+    '''
+    return 2 * (position + 1)
+
+
+def line_value(codes):
+    '''
+    Return the integer of the line of cell codes <codes>: cell i in bits
+    cell_shift(i), with off-board cells before the first cell and after the
+    last one.
+    '''
+    value = EDGE
+    for position, code in enumerate(codes):
+        value |= code << cell_shift(position)
+    for position in range(len(codes), len(codes) + PADDING):
+        value |= EDGE << cell_shift(position)
+    return value
+
+
+def low_bits(cells):
+    '''
+    Return integer with the low bit of each of <cells> cells set.
+    '''
+    bits = _low_bits.get(cells)
+    if bits is None:
+        bits = _low_bits[cells] = int("01" * cells, 2)
+    return bits
+
+
+def line_features(value, table=None):
+    '''
+    Return list of the table values (see "feature") of every sequence in the
+    line of integer <value> (see "line_value").
+    '''
+    if table is None:
+        table = get_table()
+    #A sequence starts at a cell holding a stone (code 01 or 10) that
+    #differs from the cell before it
+    stones = (value ^ (value >> 1)) & low_bits((value.bit_length() + 1) // 2)
+    changes = value ^ (value << 2)
+    starts = stones & (changes | (changes >> 1))
+    features = []
+    while starts:
+        low = starts & -starts
+        start = low.bit_length() - 1
+        found = table[(value >> (start - 2)) & MASK]
+        if found:
+            features.append(found)
+        starts ^= low
+    return features
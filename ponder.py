@@ -0,0 +1,114 @@
+'''
+Pondering: searching on the opponent's time.
+While the opponent thinks, a background thread plays each of their likely
+replies on a copy of the board, most threatening first (see
+"order_moves"), and works out the CPU's answer to it with the same
+settings as the real move. Answers are kept by Position (see position.py),
+so when the opponent plays a reply that was pondered the answer is ready
+at once. Pondering is stopped as soon as the opponent has moved: a search
+in progress is abandoned and its result is not kept, but it still fills
+the transposition table shared with the next search.
+
+The thread only runs while the main thread waits for input, so they never
+search at the same time and can share one TranspositionTable.
+
+    ponderer = Ponderer('b', time_limit=1.0, table=table)
+    ponderer.start(board)
+    move = read_move(board)
+    ...
+    move = ponderer.take(board) or choose_move(board, 'b', 1.0, table)
+'''
+
+import threading
+
+from movegen import candidate_moves, order_moves
+from position import Position
+
+
+class Ponderer:
+    '''
+    Ponders the answers of colour <col> to the replies of its opponent.
+    The answers are chosen by "choose_move" with <time_limit>, <table>,
+    <max_depth>, <weights> and <book>; at most <replies> replies are
+    pondered each turn (all the candidate moves if None).
+    '''
+
+    def __init__(self, col='b', time_limit=None, table=None, max_depth=None,
+                 weights=None, book=None, replies=None):
+        self.col = col
+        self.time_limit = time_limit
+        self.table = table
+        self.max_depth = max_depth
+        self.weights = weights
+        self.book = book
+        self.replies = replies
+        #Answer (y, x) by Position after the reply, with <col> to move
+        self.answers = {}
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.pondered = 0
+
+    def start(self, board):
+        '''
+        Start pondering on board <board>, with the opponent to move. The
+        board is copied, so it can be changed while pondering goes on.
+        '''
+        self.stop()
+        self.answers = {}
+        self.stop_event = threading.Event()
+        board = [list(row) for row in board]
+        self.thread = threading.Thread(target=self._run,
+                                       args=(board, self.stop_event),
+                                       name="ponder", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Stop pondering and wait for the thread to finish.
+        '''
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def take(self, board):
+        '''
+        Stop pondering and return the pondered answer (y, x) for board
+        <board> with colour <col> to move, or None if it was not pondered.
+        '''
+        self.stop()
+        move = self.answers.get(Position.from_board(board, self.col))
+        if move is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return move
+
+    def _run(self, board, stop):
+        '''
+        Thread: ponder the replies of the opponent on board <board> until
+        Event <stop> is set.
+        '''
+        #Imported here since gomoku.py imports this module
+        from gomoku import check_result, choose_move
+        opponent = 'w' if self.col == 'b' else 'b'
+        replies = order_moves(board, candidate_moves(board), opponent)
+        if self.replies is not None:
+            replies = replies[:self.replies]
+        for y, x in replies:
+            if stop.is_set():
+                return
+            board[y][x] = opponent
+            if check_result(board, (y, x)) != "Continue playing":
+                board[y][x] = ' '
+                continue
+            move = choose_move(board, self.col, self.time_limit, self.table,
+                               max_depth=self.max_depth,
+                               weights=self.weights, book=self.book,
+                               stop=stop)
+            if not stop.is_set():
+                self.answers[Position.from_board(board, self.col)] = move
+                self.pondered += 1
+            board[y][x] = ' '
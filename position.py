@@ -0,0 +1,206 @@
+'''
+Compact immutable Gomoku positions.
+A Position holds its cells in one bytes object, the side to move, the
+Zobrist hash of the stones (updated with one XOR per move, see zobrist.py)
+and the tuple of moves played to reach it. Playing a move returns a new
+Position and undoing it rebuilds the one before, so positions can be
+shared, kept as snapshots and used as dictionary keys without copying.
+A Position holds no link to the positions before it, so one kept as a key
+(e.g. by ponder.py) does not keep the rest of the game in memory.
+Two positions are equal if they have the same stones and side to move,
+whatever moves led to them.
+
+A Position is also a read-only board: position[y][x] is " ", "b" or "w"
+and len(position) is its number of rows, so it can be passed directly to
+the functions of gomoku.py that do not modify the board, such as "score",
+"is_win" and "search_max".
+
+    position = Position.empty(8, 8).play(4, 4).play(4, 5)
+    score(position), search_max(position)
+'''
+
+from zobrist import get_zobrist
+
+#Byte of each cell value, and back
+BYTES = {" ": 32, "b": 98, "w": 119}
+CELLS = {32: " ", 98: "b", 119: "w"}
+
+
+class Position:
+    '''
+    Position of (height x width) cells <cells> (bytes of BYTES in row-major
+    order) with <to_move> to play, reached by playing the (y, x) <moves> in
+    order with "play" (empty if it was not). Use "empty", "from_board" or
+    "from_string" to create one and "play" to make moves.
+    '''
+
+    __slots__ = ("height", "width", "cells", "to_move", "moves", "key",
+                 "_rows")
+
+    def __init__(self, height, width, cells, to_move="b", moves=(),
+                 key=None):
+        self.height = height
+        self.width = width
+        self.cells = cells
+        self.to_move = to_move
+        self.moves = moves
+        self._rows = None
+        if key is None:
+            key = get_zobrist(height, width).hash_board(self)
+        self.key = key
+
+    @classmethod
+    def empty(cls, height, width=None):
+        '''
+        Return the empty position of size (height x width), square if
+        <width> is None, with black to move.
+        '''
+        if width is None:
+            width = height
+        return cls(height, width, b" " * (height * width), "b", key=0)
+
+    @classmethod
+    def from_board(cls, board, to_move=None):
+        '''
+        Return the position of board <board> with <to_move> to play; if None,
+        black is to move when both colours have as many stones, else white.
+        '''
+        text = "".join("".join(row) for row in board)
+        try:
+            cells = text.encode("ascii")
+        except UnicodeEncodeError:
+            raise ValueError("unknown cell in board")
+        if cells.translate(None, b" bw"):
+            raise ValueError("unknown cell in board")
+        if to_move is None:
+            to_move = "b" if cells.count(b"b") <= cells.count(b"w") else "w"
+        return cls(len(board), len(board[0]), cells, to_move)
+
+    @classmethod
+    def from_string(cls, s, to_move=None):
+        '''
+        Return the position of compact string <s> (see "board_to_string"),
+        with <to_move> as in "from_board".
+        '''
+        return cls.from_board(s.replace(".", " ").split("/"), to_move)
+
+    def rows(self):
+        '''
+        Return tuple of the rows of the position as strings, which can be
+        read as a board.
+        '''
+        if self._rows is None:
+            text = self.cells.decode("ascii")
+            width = self.width
+            self._rows = tuple(text[i:i + width]
+                               for i in range(0, len(text), width))
+        return self._rows
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        return self.rows()[y]
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __hash__(self):
+        if self.to_move == "w":
+            return self.key ^ get_zobrist(self.height,
+                                          self.width).white_to_move
+        return self.key
+
+    def __eq__(self, other):
+        if not isinstance(other, Position):
+            return NotImplemented
+        return (self.key == other.key and self.to_move == other.to_move and
+                self.width == other.width and self.cells == other.cells)
+
+    @property
+    def move(self):
+        '''
+        The last move (y, x) played, or None.
+        '''
+        return self.moves[-1] if self.moves else None
+
+    def __repr__(self):
+        return "Position(%r, to_move=%r)" % (self.to_string(), self.to_move)
+
+    def get(self, y, x):
+        '''
+        Return the cell at (y, x): " ", "b" or "w".
+        '''
+        return CELLS[self.cells[y * self.width + x]]
+
+    def play(self, y, x):
+        '''
+        Return the position after the side to move plays (y, x). Raise
+        ValueError if the square is off the board or taken.
+        '''
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise ValueError("(%d, %d) is off the board" % (y, x))
+        index = y * self.width + x
+        if self.cells[index] != 32:
+            raise ValueError("(%d, %d) is taken" % (y, x))
+        col = self.to_move
+        cells = bytearray(self.cells)
+        cells[index] = BYTES[col]
+        key = self.key ^ get_zobrist(self.height, self.width).keys[col][y][x]
+        return Position(self.height, self.width, bytes(cells),
+                        "w" if col == "b" else "b", self.moves + ((y, x),),
+                        key)
+
+    def undo(self):
+        '''
+        Return the position before the last move. Raise ValueError if the
+        position was not reached by "play".
+        '''
+        if not self.moves:
+            raise ValueError("no move to undo")
+        y, x = self.moves[-1]
+        index = y * self.width + x
+        col = CELLS[self.cells[index]]
+        cells = bytearray(self.cells)
+        cells[index] = BYTES[" "]
+        key = self.key ^ get_zobrist(self.height, self.width).keys[col][y][x]
+        return Position(self.height, self.width, bytes(cells), col,
+                        self.moves[:-1], key)
+
+    def history(self):
+        '''
+        Return list of the (y, x) moves played to reach the position, in
+        order.
+        '''
+        return list(self.moves)
+
+    def stones(self):
+        '''
+        Return number of stones on the board.
+        '''
+        return len(self.cells) - self.cells.count(b" ")
+
+    def result(self):
+        '''
+        Return the same string as "is_win" for the position. As in
+        "check_result", only the lines through the last move are checked,
+        assuming the game was still on before it.
+        '''
+        #Imported here since gomoku.py is not needed to build positions
+        from gomoku import check_result, is_win
+        if not self.moves:
+            return is_win(self)
+        return check_result(self, self.move, self.cells.count(b" "))
+
+    def board(self):
+        '''
+        Return the position as a new list of lists board, which can be
+        modified.
+        '''
+        return [list(row) for row in self.rows()]
+
+    def to_string(self):
+        '''
+        Return compact string form of the position, see "board_to_string".
+        '''
+        return "/".join(self.rows()).replace(" ", ".")
@@ -0,0 +1,381 @@
+'''
+Game records of Gomoku.
+A GameRecord holds the board size, the moves in order (black first) and
+the result. Records are kept in archive files, and have a text form of one
+line per game in the usual notation of Gomoku and Renju programs: columns
+are letters from "a" on the left, rows are numbers from 1 at the bottom,
+and the result is written as in PGN:
+
+    15 1-0 h8 h9 i8 g8 j8 k8 i7 i9 g9 f10 j7 k6 j9 k10 j6 j5 j10
+
+Archive format (little-endian): MAGIC, then the records one after the
+other, each the board size, the result code (RESULTS) and the number of
+moves ("<BBH"), then each move as y * size + x, one byte each on boards of
+up to 16 x 16 and two ("<H") on larger ones. Archives are read one record
+at a time, so they can be of any size.
+
+Positions are rebuilt by playing the moves one by one on a Position (see
+position.py) rather than building each board again. "evaluate" re-runs
+"search_max" for the side to move and "score" on every position of every
+record with a process pool, and "diff" compares the output of two runs,
+e.g. of two versions of the engine, and lists the positions where the
+move chosen changed.
+
+Run "python record.py evaluate games.gmr -o old.jsonl", then again with
+the new engine to new.jsonl, then "python record.py diff old.jsonl
+new.jsonl". "python record.py import games.jsonl games.gmr" converts the
+games written by tournament.py, "text" prints an archive in the text form
+and "pack" converts the text form back.
+'''
+
+import argparse
+import json
+import os
+import struct
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, zip_longest
+
+from position import Position
+
+MAGIC = b"GMKGAME1"
+HEADER = struct.Struct("<BBH")
+WIDE_MOVE = struct.Struct("<H")
+#Result codes of the archive format, and their text form
+RESULTS = ("Continue playing", "Black won!", "White won!", "Draw!")
+RESULT_TEXT = ("*", "1-0", "0-1", "1/2-1/2")
+#Records sent to a worker at a time
+CHUNK = 64
+
+
+class GameRecord:
+    '''
+    Game on a board of size (size x size) with the (y, x) moves <moves>,
+    black first, and result <result>, one of RESULTS.
+    '''
+
+    __slots__ = ("size", "moves", "result")
+
+    def __init__(self, size, moves=(), result="Continue playing"):
+        if result not in RESULTS:
+            raise ValueError("unknown result %r" % result)
+        self.size = size
+        self.moves = [tuple(move) for move in moves]
+        self.result = result
+
+    def __eq__(self, other):
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return (self.size == other.size and self.moves == other.moves and
+                self.result == other.result)
+
+    def __repr__(self):
+        return "GameRecord(%r)" % self.to_text()
+
+    def to_bytes(self):
+        '''
+        Return the record in the archive format.
+        '''
+        size = self.size
+        data = bytearray(HEADER.pack(size, RESULTS.index(self.result),
+                                     len(self.moves)))
+        if size <= 16:
+            data.extend(y * size + x for y, x in self.moves)
+        else:
+            for y, x in self.moves:
+                data.extend(WIDE_MOVE.pack(y * size + x))
+        return bytes(data)
+
+    def to_text(self):
+        '''
+        Return the record in the text form.
+        '''
+        return " ".join([str(self.size),
+                         RESULT_TEXT[RESULTS.index(self.result)]] +
+                        [square_name(move, self.size) for move in self.moves])
+
+    @classmethod
+    def from_text(cls, text):
+        '''
+        Return the record of text form <text>. Raise ValueError if it is not
+        valid.
+        '''
+        fields = text.split()
+        if len(fields) < 2:
+            raise ValueError("a record needs a size and a result")
+        try:
+            size = int(fields[0])
+        except ValueError:
+            raise ValueError("bad board size %r" % fields[0])
+        if fields[1] not in RESULT_TEXT:
+            raise ValueError("bad result %r" % fields[1])
+        moves = [parse_square(name, size) for name in fields[2:]]
+        return cls(size, moves, RESULTS[RESULT_TEXT.index(fields[1])])
+
+    def positions(self):
+        '''
+        Yield (Position, move) for each move of the game, with the position
+        before the move, then (final Position, None).
+        '''
+        position = Position.empty(self.size)
+        for y, x in self.moves:
+            yield position, (y, x)
+            position = position.play(y, x)
+        yield position, None
+
+
+def square_name(move, size):
+    '''
+    Return the text name of square (y, x) <move> on a board of size
+    (size x size), e.g. "h8" for the centre of a 15 x 15 board.
+    '''
+    y, x = move
+    return "%s%d" % (chr(ord("a") + x), size - y)
+
+
+def parse_square(name, size):
+    '''
+    Inverse of "square_name". Raise ValueError if <name> is not a square
+    of the board.
+    '''
+    try:
+        x = ord(name[0].lower()) - ord("a")
+        y = size - int(name[1:])
+    except (IndexError, ValueError):
+        raise ValueError("bad square %r" % name)
+    if not (0 <= y < size and 0 <= x < size):
+        raise ValueError("square %r is off the board" % name)
+    return (y, x)
+
+
+def read_archive(f):
+    '''
+    Yield the GameRecords of binary archive file object <f>. Raise
+    ValueError if it is not an archive or ends inside a record.
+    '''
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a game archive")
+    index = 0
+    while True:
+        head = f.read(HEADER.size)
+        if not head:
+            return
+        if len(head) != HEADER.size:
+            raise ValueError("archive ends inside record %d" % index)
+        size, result, count = HEADER.unpack(head)
+        wide = size > 16
+        body = f.read(count * (2 if wide else 1))
+        if len(body) != count * (2 if wide else 1):
+            raise ValueError("archive ends inside record %d" % index)
+        if wide:
+            cells = [cell for cell, in WIDE_MOVE.iter_unpack(body)]
+        else:
+            cells = body
+        yield GameRecord(size, [divmod(cell, size) for cell in cells],
+                         RESULTS[result])
+        index += 1
+
+
+def write_archive(path, records, append=False):
+    '''
+    Write GameRecords <records> to archive file <path>, after the records
+    already there if <append>, and return their number.
+    '''
+    new = not append or not os.path.exists(path) or \
+        os.path.getsize(path) == 0
+    count = 0
+    with open(path, "wb" if new else "ab") as f:
+        if new:
+            f.write(MAGIC)
+        for record in records:
+            f.write(record.to_bytes())
+            count += 1
+    return count
+
+
+def append_record(path, record):
+    '''
+    Add GameRecord <record> at the end of archive file <path>, created if
+    missing.
+    '''
+    write_archive(path, [record], append=True)
+
+
+def evaluate_record(record):
+    '''
+    Return dictionary of the moves "search_max" chooses for the side to
+    move ("moves", None where there is none) and the "score" of each
+    position before a move of game record <record>.
+    '''
+    #Imported here since the game modules are not needed to read records
+    from gomoku import score, search_max, swap_colours
+    moves = []
+    scores = []
+    for position, played in record.positions():
+        if played is None:
+            break
+        if position.to_move == "w":
+            move = search_max(swap_colours(position))
+        else:
+            move = search_max(position)
+        moves.append(list(move) if move != 0 else None)
+        scores.append(score(position))
+    return {"moves": moves, "scores": scores}
+
+
+def _evaluate_chunk(items):
+    '''
+    Worker: return list of the outputs of the (index, record) <items>.
+    '''
+    results = []
+    for index, record in items:
+        result = {"game": index, "size": record.size}
+        result.update(evaluate_record(record))
+        results.append(result)
+    return results
+
+
+def evaluate_stream(records, workers=1):
+    '''
+    Yield the output dictionary of each of the GameRecords <records>, in
+    order, with the index of the game. With <workers> > 1 chunks of CHUNK
+    records are evaluated by a process pool, with at most two chunks per
+    worker read ahead.
+    '''
+    items = enumerate(records)
+    if workers <= 1:
+        for item in items:
+            yield _evaluate_chunk([item])[0]
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(items, CHUNK))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_evaluate_chunk, chunk))
+            if not pending:
+                return
+            for result in pending.popleft().result():
+                yield result
+
+
+def diff_evaluations(old, new):
+    '''
+    Yield (game, ply, old move, new move) for each position where the
+    evaluations <old> and <new> (iterables of "evaluate_stream" outputs of
+    the same archive) chose different moves. Raise ValueError if they are
+    not of the same games.
+    '''
+    for first, second in zip_longest(old, new):
+        if first is None or second is None:
+            raise ValueError("the evaluations have different numbers of "
+                             "games")
+        if first["game"] != second["game"] or \
+                len(first["moves"]) != len(second["moves"]):
+            raise ValueError("evaluations of different games at game %d" %
+                             first["game"])
+        for ply, (a, b) in enumerate(zip(first["moves"], second["moves"])):
+            if a != b:
+                yield first["game"], ply, a, b
+
+
+def read_tournament(f):
+    '''
+    Yield the GameRecords of the games in JSON lines file object <f>
+    written by tournament.py.
+    '''
+    for line in f:
+        data = json.loads(line)
+        if data.get("type") == "game":
+            yield GameRecord(data["board_size"],
+                             data["opening"] + data["moves"], data["result"])
+
+
+def read_text(f):
+    '''
+    Yield the GameRecords of text file object <f>, one per non-empty line.
+    Raise ValueError naming the line of a bad record.
+    '''
+    for index, line in enumerate(f):
+        if line.strip():
+            try:
+                yield GameRecord.from_text(line)
+            except ValueError as e:
+                raise ValueError("line %d: %s" % (index + 1, e))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    evaluate = commands.add_parser("evaluate",
+                                   help="evaluate every position")
+    evaluate.add_argument("archive")
+    evaluate.add_argument("-o", "--output",
+                          help="output file (default stdout)")
+    evaluate.add_argument("--workers", type=int, default=1,
+                          help="processes (0 for all CPUs)")
+    diff = commands.add_parser("diff", help="compare two evaluations")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    text = commands.add_parser("text", help="print an archive as text")
+    text.add_argument("archive")
+    pack = commands.add_parser("pack", help="convert text records")
+    pack.add_argument("text", help="text records file")
+    pack.add_argument("archive")
+    imports = commands.add_parser("import",
+                                  help="convert tournament.py games")
+    imports.add_argument("games", help="JSON lines file of tournament.py")
+    imports.add_argument("archive")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "evaluate":
+            workers = args.workers or os.cpu_count()
+            out = open(args.output, "w") if args.output else sys.stdout
+            try:
+                with open(args.archive, "rb") as f:
+                    for result in evaluate_stream(read_archive(f), workers):
+                        out.write(json.dumps(result) + "\n")
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        elif args.command == "diff":
+            counts = {"positions": 0, "changed": 0}
+
+            def counted(f):
+                for line in f:
+                    result = json.loads(line)
+                    counts["positions"] += len(result["moves"])
+                    yield result
+
+            with open(args.old) as old, open(args.new) as new:
+                for game, ply, a, b in diff_evaluations(counted(old),
+                                                        map(json.loads, new)):
+                    counts["changed"] += 1
+                    print("game %d ply %d: %s -> %s" % (game, ply, a, b))
+            print("%(changed)d of %(positions)d positions changed" % counts)
+        elif args.command == "text":
+            with open(args.archive, "rb") as f:
+                for record in read_archive(f):
+                    print(record.to_text())
+        elif args.command == "pack":
+            with open(args.text) as f:
+                count = write_archive(args.archive, read_text(f))
+            print("%d games written to %s" % (count, args.archive))
+        elif args.command == "import":
+            with open(args.games) as f:
+                count = write_archive(args.archive, read_tournament(f))
+            print("%d games written to %s" % (count, args.archive))
+    except ValueError as e:
+        parser.error(str(e))
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
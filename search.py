@@ -0,0 +1,305 @@
+'''
+Alpha-beta search for the Gomoku CPU player.
+Negamax with alpha-beta pruning over the static "score" of the line
+evaluator, run with iterative deepening so that a move is always available
+when the time budget for the move runs out. Positions already searched are
+looked up by Zobrist hash in a transposition table, which can be kept
+between moves and games.
+'''
+
+import time
+
+from evaluator import LineEvaluator, MAX_SCORE
+from movegen import CandidateSet, order_moves
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
+from zobrist import get_zobrist
+
+INFINITY = 10 * MAX_SCORE
+#Values beyond this are wins/losses found in the search, stored relative to
+#the node in the transposition table
+WIN_BOUND = MAX_SCORE - 1000
+#Number of nodes searched between two checks of the clock
+CHECK_EVERY = 64
+
+
+class SearchTimeout(Exception):
+    '''
+    Raised inside the search when the time budget is used up or the search
+    is stopped.
+    '''
+    pass
+
+
+def other(col):
+    '''
+    Return the colour playing against colour <col>.
+    '''
+    if col == "b":
+        return "w"
+    return "b"
+
+
+class Searcher:
+    '''
+    Negamax searcher for the position <board> with <col> to move.
+    Scores are from the point of view of the side to move; a win found
+    <ply> moves into the search is worth MAX_SCORE - ply. A new
+    TranspositionTable is used unless <table> is given. Positions are
+    scored with the weights <weights> (see "score_counts"). The search ends
+    early, as when time runs out, once threading.Event <stop> is set.
+    '''
+
+    def __init__(self, board, col="b", table=None, radius=2, weights=None,
+                 stop=None):
+        self.evaluator = LineEvaluator(board, weights)
+        self.board = self.evaluator.board
+        self.candidates = CandidateSet(self.board, radius)
+        self.width = len(board[0])
+        self.col = col
+        self.zobrist = get_zobrist(len(board), self.width)
+        self.key = self.zobrist.hash_board(board)
+        if table is None:
+            table = TranspositionTable()
+        self.table = table
+        self.deadline = None
+        self.stop = stop
+        self.nodes = 0
+        self.iterations = []
+        #(move, value) of the best root move of the current iteration so far
+        self.partial = None
+
+    def free_squares(self):
+        '''
+        Return list of (y, x) of the free squares in row-major order.
+        '''
+        board = self.board
+        moves = []
+        for y in range(len(board)):
+            for x in range(len(board[0])):
+                if board[y][x] == ' ':
+                    moves.append((y, x))
+        return moves
+
+    def moves(self):
+        '''
+        Return list of (y, x) of the squares near a stone in row-major order
+        (every free square if there is no stone yet).
+        '''
+        moves = self.candidates.cells()
+        if not moves:
+            moves = self.free_squares()
+        return moves
+
+    def play(self, y, x, col):
+        '''
+        Place stone of colour <col> at (x, y), updating evaluator and hash.
+        '''
+        self.evaluator.place(y, x, col)
+        self.candidates.place(y, x)
+        self.key ^= self.zobrist.keys[col][y][x]
+
+    def undo(self, y, x, col):
+        '''
+        Remove the stone of colour <col> at (x, y) placed by "play".
+        '''
+        self.evaluator.remove(y, x)
+        self.candidates.remove(y, x)
+        self.key ^= self.zobrist.keys[col][y][x]
+
+    def position_key(self, col):
+        '''
+        Return hash of the current position with <col> to move.
+        '''
+        if col == "w":
+            return self.key ^ self.zobrist.white_to_move
+        return self.key
+
+    def check_time(self):
+        '''
+        Raise SearchTimeout if the deadline has passed or the search was
+        stopped.
+        '''
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout()
+
+    def negamax(self, depth, alpha, beta, col, ply):
+        '''
+        Return value of the position for <col> (to move) searched to depth
+        <depth>, within the window (alpha, beta).
+        '''
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            self.check_time()
+        evaluator = self.evaluator
+        last_col = other(col)
+        if evaluator.has_five(last_col):
+            return -(MAX_SCORE - ply)
+        if depth == 0:
+            return -evaluator.score(last_col)
+        key = self.position_key(col)
+        entry = self.table.lookup(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, value, flag, move = entry
+            if move != NO_MOVE:
+                table_move = divmod(move, self.width)
+            if entry_depth >= depth:
+                value = from_table(value, ply)
+                if flag == EXACT:
+                    return value
+                if flag == LOWER and value >= beta:
+                    return value
+                if flag == UPPER and value <= alpha:
+                    return value
+        moves = self.moves()
+        if not moves:
+            return 0
+        #Threats first, so that cutoffs come early. Just above the leaves
+        #ordering costs about as much as evaluating every move.
+        if depth > 1:
+            moves = order_moves(self.board, moves, col)
+        if table_move in moves:
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+        alpha_start = alpha
+        best = -INFINITY
+        best_move = moves[0]
+        for y, x in moves:
+            self.play(y, x, col)
+            value = -self.negamax(depth - 1, -beta, -alpha, last_col, ply + 1)
+            self.undo(y, x, col)
+            if value > best:
+                best = value
+                best_move = (y, x)
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        if best <= alpha_start:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, to_table(best, ply), flag,
+                         best_move[0] * self.width + best_move[1])
+        return best
+
+    def search_root(self, depth, first_move=None, moves=None):
+        '''
+        Return (move, value) of the best move at depth <depth>, among
+        <moves> if given. Moves are searched in row-major order, <first_move>
+        first if given; among moves of equal value the last one searched is
+        kept, like the ">=" rule of "search_max".
+        '''
+        if moves is None:
+            moves = self.moves()
+        moves = list(moves)
+        if first_move in moves:
+            moves.remove(first_move)
+            moves.insert(0, first_move)
+        col = self.col
+        best_move = moves[0]
+        best = -INFINITY
+        for y, x in moves:
+            self.play(y, x, col)
+            #Window lowered by one so that ties with the best are exact
+            value = -self.negamax(depth - 1, -INFINITY, -(best - 1),
+                                  other(col), 1)
+            self.undo(y, x, col)
+            if value >= best:
+                best = value
+                best_move = (y, x)
+                self.partial = (best_move, best)
+        return best_move, best
+
+    def search(self, time_limit=None, max_depth=None, root_moves=None):
+        '''
+        Run iterative deepening until <time_limit> seconds have passed or
+        depth <max_depth> is done, and return (move, value, depth) of the
+        deepest completed iteration. Only <root_moves> are tried at the root
+        if given. The result of each iteration is kept in self.iterations.
+        '''
+        start = time.perf_counter()
+        if time_limit is not None:
+            self.deadline = start + time_limit
+        self.table.new_search()
+        self.iterations = []
+        if root_moves is None:
+            root_moves = self.moves()
+        free = len(self.free_squares())
+        if max_depth is None or max_depth > free:
+            max_depth = free
+        best_move = None
+        best = 0
+        completed = 0
+        for depth in range(1, max_depth + 1):
+            try:
+                move, value = self.search_root(depth, best_move, root_moves)
+            except SearchTimeout:
+                break
+            best_move, best, completed = move, value, depth
+            self.iterations.append((depth, move, value))
+            #A forced win or loss will not change with more depth
+            if abs(best) >= MAX_SCORE - max_depth:
+                break
+        if best_move is None:
+            #Not even depth 1 finished: play the best move seen so far
+            if self.partial is not None:
+                best_move, best = self.partial
+            else:
+                best_move = root_moves[0]
+        return best_move, best, completed
+
+
+def to_table(value, ply):
+    '''
+    Return search value <value> at <ply> as stored in the transposition
+    table, with wins and losses counted from the node instead of the root.
+    '''
+    if value >= WIN_BOUND:
+        return value + ply
+    if value <= -WIN_BOUND:
+        return value - ply
+    return value
+
+
+def from_table(value, ply):
+    '''
+    Inverse of "to_table".
+    '''
+    if value >= WIN_BOUND:
+        return value - ply
+    if value <= -WIN_BOUND:
+        return value + ply
+    return value
+
+
+def search(board, col="b", time_limit=0.5, max_depth=None, table=None,
+           weights=None, stop=None):
+    '''
+    Return (move, value, depth) of the best move for colour <col> on board
+    <board> found by iterative deepening within <time_limit> seconds (no
+    limit if None) and at most <max_depth> plies deep. Pass the same
+    TranspositionTable as <table> to reuse results between calls, as long
+    as the weights <weights> stay the same. Only squares near a stone are
+    searched, see "movegen". Setting threading.Event <stop> from another
+    thread ends the search early. The <time_limit> counts from the call,
+    including the time to set up the search.
+    '''
+    start = time.perf_counter()
+    searcher = Searcher(board, col, table, weights=weights, stop=stop)
+    if time_limit is not None:
+        time_limit = max(0.0, time_limit - (time.perf_counter() - start))
+    return searcher.search(time_limit, max_depth)
+
+
+def best_move(board, col="b", time_limit=0.5, max_depth=None, table=None,
+              weights=None, stop=None):
+    '''
+    Return (y, x) coordinates of the best move for colour <col> on board
+    <board> within <time_limit> seconds.
+    '''
+    return search(board, col, time_limit, max_depth, table, weights, stop)[0]
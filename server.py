@@ -0,0 +1,487 @@
+'''
+Gomoku server: many games against the CPU over TCP.
+The protocol is one JSON object per line each way. Each request has a
+"cmd" and gets one reply with "ok" (and "error" if false); an "id" in the
+request is copied to the reply.
+    {"cmd": "new", "size": 8, "cpu": "b", "time_limit": null}
+        start a game; the CPU plays colour "cpu" and moves first if black
+    {"cmd": "move", "session": 1, "y": 3, "x": 4}
+        play a move for the player, and get the CPU's reply
+    {"cmd": "state", "session": 1}
+    {"cmd": "close", "session": 1}
+    {"cmd": "stats"}
+        active sessions, queued CPU moves and move latency percentiles
+Replies about a game hold "session", "board" (compact form, see
+"board_to_string"), "to_move", "result" and "cpu_move" when the CPU moved.
+Requests on one connection are answered in order. Sessions belong to
+their connection and end with it.
+
+The CPU's moves are computed in a process pool, so a slow move delays only
+its own game. Run "python server.py serve", then "python server.py play"
+for a console game or "python server.py load" to run many games at once.
+'''
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from gomoku import board_to_string, check_result, choose_move, \
+    make_empty_board, print_board, read_move, string_to_board
+from transposition import TranspositionTable
+
+DEFAULT_PORT = 7654
+RESULTS = ("Black won!", "White won!", "Draw!")
+#Largest board accepted: the CPU's greedy move scores every empty square,
+#so its time grows quickly with the size of the board
+MAX_SIZE = 19
+#Longest time a CPU move may take (seconds), so that one game cannot hold
+#a worker for long
+MAX_TIME_LIMIT = 10.0
+#Number of recent CPU moves kept for the latency percentiles
+LATENCY_SAMPLES = 1000
+
+#Transposition table of a worker process, kept between the moves it plays
+_worker_table = None
+
+
+def _cpu_move(compact, col, time_limit):
+    '''
+    Worker: return (y, x) of the CPU's move for colour <col> on the board in
+    compact form <compact>.
+    '''
+    global _worker_table
+    table = None
+    if time_limit is not None:
+        if _worker_table is None:
+            _worker_table = TranspositionTable()
+        table = _worker_table
+    return choose_move(string_to_board(compact), col, time_limit, table)
+
+
+class Session:
+    '''
+    One game on a board of size <size> with the CPU playing colour <cpu>,
+    stored as its list of moves (y * size + x).
+    '''
+
+    __slots__ = ("id", "size", "cpu", "time_limit", "moves", "result",
+                 "lock")
+
+    def __init__(self, session_id, size, cpu, time_limit):
+        self.id = session_id
+        self.size = size
+        self.cpu = cpu
+        self.time_limit = time_limit
+        self.moves = array("H")
+        self.result = "Continue playing"
+        self.lock = asyncio.Lock()
+
+    def board(self):
+        '''
+        Return the board of the game.
+        '''
+        board = make_empty_board(self.size)
+        col = "b"
+        for move in self.moves:
+            y, x = divmod(move, self.size)
+            board[y][x] = col
+            col = "w" if col == "b" else "b"
+        return board
+
+    def to_move(self):
+        '''
+        Return the colour to move.
+        '''
+        return "b" if len(self.moves) % 2 == 0 else "w"
+
+    def play(self, board, y, x):
+        '''
+        Play (x, y) for the side to move on <board>, the board of the game,
+        and update the result. Raise ValueError if the move is not legal.
+        '''
+        if self.result in RESULTS:
+            raise ValueError("the game is over")
+        if not (0 <= y < self.size and 0 <= x < self.size):
+            raise ValueError("move (%d, %d) is off the board" % (y, x))
+        if board[y][x] != " ":
+            raise ValueError("square (%d, %d) is occupied" % (y, x))
+        board[y][x] = self.to_move()
+        self.moves.append(y * self.size + x)
+        empty_count = self.size * self.size - len(self.moves)
+        self.result = check_result(board, (y, x), empty_count)
+
+    def state(self, board):
+        '''
+        Return dictionary describing the game for a reply.
+        '''
+        return {"session": self.id,
+                "board": board_to_string(board),
+                "to_move": self.to_move(),
+                "result": self.result}
+
+
+def is_integer(value):
+    '''
+    Return True if JSON value <value> is an integer (not a boolean).
+    '''
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value):
+    '''
+    Return True if JSON value <value> is a number (not a boolean).
+    '''
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def percentile(samples, fraction):
+    '''
+    Return the <fraction> percentile of sorted list <samples>, or None if
+    it is empty.
+    '''
+    if not samples:
+        return None
+    return samples[int(round(fraction * (len(samples) - 1)))]
+
+
+class GomokuServer:
+    '''
+    Hosts the games of all the connections, with the CPU's moves computed
+    by <workers> processes (all CPUs if None). At most <max_sessions> games
+    are open at once.
+    '''
+
+    def __init__(self, workers=None, max_sessions=10000):
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.queued = 0
+        self.cpu_moves = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.connections = 0
+        self.started = time.time()
+
+    async def cpu_move(self, session, board):
+        '''
+        Play the CPU's move in <session> with board <board>, computed in the
+        pool, and return it. Raise ValueError if the engine fails.
+        '''
+        loop = asyncio.get_running_loop()
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            move = await loop.run_in_executor(
+                self.pool, _cpu_move, board_to_string(board), session.cpu,
+                session.time_limit)
+        except Exception as e:
+            raise ValueError("the CPU move failed: %s" % (e,))
+        finally:
+            self.queued -= 1
+        self.latencies.append(time.perf_counter() - start)
+        self.cpu_moves += 1
+        session.play(board, move[0], move[1])
+        return move
+
+    def stats(self):
+        '''
+        Return dictionary of the server statistics.
+        '''
+        samples = sorted(self.latencies)
+        return {"sessions": len(self.sessions),
+                "connections": self.connections,
+                "queued": self.queued,
+                "cpu_moves": self.cpu_moves,
+                "latency_p50_s": percentile(samples, 0.5),
+                "latency_p90_s": percentile(samples, 0.9),
+                "latency_p99_s": percentile(samples, 0.99),
+                "uptime_s": time.time() - self.started}
+
+    def get_session(self, request, owned):
+        '''
+        Return the session of <request>, which must be one of <owned>.
+        '''
+        session_id = request.get("session")
+        if not is_integer(session_id):
+            raise ValueError("session must be an integer")
+        if session_id not in owned:
+            raise ValueError("no session %r" % (session_id,))
+        return self.sessions[session_id]
+
+    async def handle(self, request, owned):
+        '''
+        Return the reply to <request> from a connection owning the session
+        ids in set <owned>.
+        '''
+        cmd = request.get("cmd")
+        if cmd == "new":
+            size = request.get("size", 8)
+            cpu = request.get("cpu", "b")
+            time_limit = request.get("time_limit")
+            if not is_integer(size) or not 5 <= size <= MAX_SIZE:
+                raise ValueError("size must be from 5 to %d" % MAX_SIZE)
+            if not isinstance(cpu, str) or cpu not in ("b", "w"):
+                raise ValueError('cpu must be "b" or "w"')
+            if time_limit is not None and not (
+                    is_number(time_limit) and
+                    0 < time_limit <= MAX_TIME_LIMIT):
+                raise ValueError("time_limit must be positive and at most %g" %
+                                 MAX_TIME_LIMIT)
+            if len(self.sessions) >= self.max_sessions:
+                raise ValueError("too many sessions")
+            session = Session(next(self.ids), size, cpu, time_limit)
+            self.sessions[session.id] = session
+            owned.add(session.id)
+            board = session.board()
+            reply = {}
+            if cpu == "b":
+                async with session.lock:
+                    try:
+                        reply["cpu_move"] = list(
+                            await self.cpu_move(session, board))
+                    except ValueError:
+                        owned.discard(session.id)
+                        del self.sessions[session.id]
+                        raise
+            reply.update(session.state(board))
+            return reply
+        elif cmd == "move":
+            session = self.get_session(request, owned)
+            y = request.get("y")
+            x = request.get("x")
+            if not is_integer(y) or not is_integer(x):
+                raise ValueError("y and x must be integers")
+            async with session.lock:
+                board = session.board()
+                if session.to_move() == session.cpu:
+                    raise ValueError("it is the CPU's move")
+                session.play(board, y, x)
+                reply = {}
+                if session.result not in RESULTS:
+                    try:
+                        reply["cpu_move"] = list(
+                            await self.cpu_move(session, board))
+                    except ValueError:
+                        #Take the player's move back, so it can be sent again
+                        session.moves.pop()
+                        session.result = "Continue playing"
+                        raise
+                reply.update(session.state(board))
+            return reply
+        elif cmd == "state":
+            session = self.get_session(request, owned)
+            return session.state(session.board())
+        elif cmd == "close":
+            session = self.get_session(request, owned)
+            owned.discard(session.id)
+            del self.sessions[session.id]
+            return {"session": session.id}
+        elif cmd == "stats":
+            return self.stats()
+        raise ValueError("unknown command %r" % (cmd,))
+
+    async def serve_connection(self, reader, writer):
+        '''
+        Answer the requests of one connection until it closes, then end
+        its sessions.
+        '''
+        owned = set()
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                    reply = {"ok": True}
+                    reply.update(await self.handle(request, owned))
+                except ValueError as e:
+                    reply = {"ok": False, "error": str(e)}
+                    request = request if isinstance(request, dict) else {}
+                if "id" in request:
+                    reply["id"] = request["id"]
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            for session_id in owned:
+                del self.sessions[session_id]
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        '''
+        Accept connections on (host, port) until cancelled.
+        '''
+        server = await asyncio.start_server(self.serve_connection, host,
+                                            port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        '''
+        Stop the worker processes.
+        '''
+        self.pool.shutdown()
+
+
+class GomokuClient:
+    '''
+    Connection to a Gomoku server, sending one request at a time.
+    '''
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=DEFAULT_PORT):
+        '''
+        Return client connected to the server at (host, port).
+        '''
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, cmd, **fields):
+        '''
+        Send request <cmd> with <fields> and return the reply. Raise
+        ValueError with the server's message if it failed.
+        '''
+        fields["cmd"] = cmd
+        self.writer.write((json.dumps(fields) + "\n").encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        reply = json.loads(line)
+        if not reply["ok"]:
+            raise ValueError(reply["error"])
+        return reply
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def play_console(host, port, size, time_limit):
+    '''
+    Play a game against the server's CPU at the console, like
+    "play_gomoku".
+    '''
+    client = await GomokuClient.connect(host, port)
+    reply = await client.request("new", size=size, cpu="b",
+                                 time_limit=time_limit)
+    while True:
+        print("-------------------------")
+        print("Computer move: (%d, %d)\n" % tuple(reply["cpu_move"]))
+        board = string_to_board(reply["board"])
+        print_board(board)
+        if reply["result"] in RESULTS:
+            print(reply["result"])
+            break
+        move = read_move(board)
+        if move == 'quit':
+            print('Game quitted')
+            break
+        reply = await client.request("move", session=reply["session"],
+                                     y=move[0], x=move[1])
+        if "cpu_move" not in reply:
+            print_board(string_to_board(reply["board"]))
+            print(reply["result"])
+            break
+    await client.close()
+
+
+async def random_game(host, port, size, time_limit, seed):
+    '''
+    Play a game of random moves against the server's CPU on a new
+    connection and return the number of moves played.
+    '''
+    rand = random.Random(seed)
+    client = await GomokuClient.connect(host, port)
+    reply = await client.request("new", size=size, cpu="b",
+                                 time_limit=time_limit)
+    moves = 1
+    while reply["result"] not in RESULTS:
+        board = string_to_board(reply["board"])
+        free = [(y, x) for y in range(size) for x in range(size)
+                if board[y][x] == " "]
+        y, x = rand.choice(free)
+        reply = await client.request("move", session=reply["session"],
+                                     y=y, x=x)
+        moves += 1 + ("cpu_move" in reply)
+    await client.close()
+    return moves
+
+
+async def load_test(host, port, sessions, size, time_limit):
+    '''
+    Play <sessions> games of random moves at once and print the moves per
+    second and the server's statistics.
+    '''
+    start = time.perf_counter()
+    moves = await asyncio.gather(*[random_game(host, port, size, time_limit,
+                                               seed)
+                                   for seed in range(sessions)])
+    elapsed = time.perf_counter() - start
+    client = await GomokuClient.connect(host, port)
+    stats = await client.request("stats")
+    await client.close()
+    print("%d games, %d moves in %.2f s (%.1f moves/s)" % (
+        sessions, sum(moves), elapsed, sum(moves) / elapsed))
+    for key in ("cpu_moves", "latency_p50_s", "latency_p90_s",
+                "latency_p99_s"):
+        print("%-15s %s" % (key, stats[key]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the server")
+    serve.add_argument("--workers", type=int, default=None)
+    serve.add_argument("--max-sessions", type=int, default=10000)
+    play = commands.add_parser("play", help="play a game at the console")
+    play.add_argument("--size", type=int, default=8)
+    play.add_argument("--time-limit", type=float, default=None)
+    load = commands.add_parser("load", help="play many random games at once")
+    load.add_argument("--sessions", type=int, default=20)
+    load.add_argument("--size", type=int, default=8)
+    load.add_argument("--time-limit", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = GomokuServer(args.workers, args.max_sessions)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+    elif args.command == "play":
+        asyncio.run(play_console(args.host, args.port, args.size,
+                                 args.time_limit))
+    elif args.command == "load":
+        asyncio.run(load_test(args.host, args.port, args.sessions, args.size,
+                              args.time_limit))
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,190 @@
+'''
+Symmetries of Gomoku boards.
+A square board has 8 symmetries (rotations and reflections), a rectangular
+one 4, and the sequences, scores and best moves of a position are the same
+in every orientation. A board is put in canonical orientation by the
+transform giving the smallest Zobrist hash (or compact string), so that
+caches, transposition tables and opening books can keep one entry for all
+the orientations of a position and turn moves back with the inverse
+transform.
+'''
+
+from zobrist import get_zobrist
+
+#Each transform maps (y, x) on a board whose last row and column are
+#(last_y, last_x). 1, 3, 5 and 7 swap rows and columns, so they only apply
+#to square boards.
+TRANSFORMS = (lambda y, x, last_y, last_x: (y, x),
+              lambda y, x, last_y, last_x: (x, last_y - y),
+              lambda y, x, last_y, last_x: (last_y - y, last_x - x),
+              lambda y, x, last_y, last_x: (last_x - x, y),
+              lambda y, x, last_y, last_x: (y, last_x - x),
+              lambda y, x, last_y, last_x: (x, y),
+              lambda y, x, last_y, last_x: (last_y - y, x),
+              lambda y, x, last_y, last_x: (last_x - x, last_y - y))
+IDENTITY = 0
+
+
+def _inverses():
+    '''
+    Return list of the index of the inverse of each of TRANSFORMS.
+    '''
+    inverses = []
+    for transform in TRANSFORMS:
+        y, x = transform(1, 2, 9, 9)
+        for index, other in enumerate(TRANSFORMS):
+            if other(y, x, 9, 9) == (1, 2):
+                inverses.append(index)
+                break
+    return inverses
+
+
+INVERSES = _inverses()
+
+
+def transforms(height, width):
+    '''
+    Return tuple of the indices in TRANSFORMS of the symmetries of a board
+    of size (height x width).
+    '''
+    if height == width:
+        return tuple(range(len(TRANSFORMS)))
+    return (0, 2, 4, 6)
+
+
+def transform_move(move, transform, height, width):
+    '''
+    Return (y, x) of square <move> of a board of size (height x width)
+    after symmetry <transform>.
+    '''
+    return TRANSFORMS[transform](move[0], move[1], height - 1, width - 1)
+
+
+def inverse_move(move, transform, height, width):
+    '''
+    Return (y, x) of the square that symmetry <transform> maps to <move>:
+    turns a move on the transformed board back to the original board.
+    '''
+    return transform_move(move, INVERSES[transform], height, width)
+
+
+def transform_board(board, transform):
+    '''
+    Return copy of board <board> after symmetry <transform>.
+    '''
+    height = len(board)
+    width = len(board[0])
+    new_board = [[' '] * width for i in range(height)]
+    for y in range(height):
+        for x in range(width):
+            new_y, new_x = TRANSFORMS[transform](y, x, height - 1, width - 1)
+            new_board[new_y][new_x] = board[y][x]
+    return new_board
+
+
+def symmetric_hashes(board):
+    '''
+    Return dictionary mapping each symmetry of board <board> to the Zobrist
+    hash of the board after it.
+    '''
+    height = len(board)
+    width = len(board[0])
+    keys = get_zobrist(height, width).keys
+    hashes = {}
+    functions = []
+    for transform in transforms(height, width):
+        hashes[transform] = 0
+        functions.append((transform, TRANSFORMS[transform]))
+    for y in range(height):
+        row = board[y]
+        for x in range(width):
+            col = row[x]
+            if col == ' ':
+                continue
+            col_keys = keys[col]
+            for transform, function in functions:
+                t_y, t_x = function(y, x, height - 1, width - 1)
+                hashes[transform] ^= col_keys[t_y][t_x]
+    return hashes
+
+
+def canonical_key(board):
+    '''
+    Return (key, transform) for board <board>: the smallest Zobrist hash of
+    its symmetric boards, and the symmetry giving it (the first one if
+    several do). Boards that are symmetric to each other get the same key.
+    '''
+    hashes = symmetric_hashes(board)
+    key = min(hashes.values())
+    for transform in sorted(hashes):
+        if hashes[transform] == key:
+            return key, transform
+
+
+def canonical(board):
+    '''
+    Return (canonical board, transform): the symmetric board of <board>
+    with the smallest compact string (see "board_to_string") and the
+    symmetry giving it. <board> can also be given in compact form, and the
+    canonical board is then returned in compact form too.
+    '''
+    #Imported here since gomoku.py imports this module through book.py
+    from gomoku import board_to_string, string_to_board
+    compact = isinstance(board, str)
+    if compact:
+        board = string_to_board(board)
+    best = None
+    for transform in transforms(len(board), len(board[0])):
+        text = board_to_string(transform_board(board, transform))
+        if best is None or text < best[0]:
+            best = (text, transform)
+    if compact:
+        return best
+    return string_to_board(best[0]), best[1]
+
+
+def stabilizer(board):
+    '''
+    Return list of the symmetries that leave board <board> unchanged,
+    starting with the identity.
+    '''
+    height = len(board)
+    width = len(board[0])
+    stones = []
+    for y in range(height):
+        row = board[y]
+        for x in range(width):
+            if row[x] != ' ':
+                stones.append((y, x, row[x]))
+    found = []
+    for transform in transforms(height, width):
+        function = TRANSFORMS[transform]
+        for y, x, col in stones:
+            t_y, t_x = function(y, x, height - 1, width - 1)
+            if board[t_y][t_x] != col:
+                break
+        else:
+            found.append(transform)
+    return found
+
+
+def move_classes(board, moves):
+    '''
+    Return dictionary mapping each move in <moves> to the first move of
+    <moves> (in the order given) that a symmetry of board <board> maps to
+    it. Moves mapped to the same move lead to positions that are symmetric
+    to each other, so only one of them needs to be evaluated.
+    '''
+    height = len(board)
+    width = len(board[0])
+    symmetries = stabilizer(board)
+    classes = {}
+    for move in moves:
+        if move in classes:
+            continue
+        classes[move] = move
+        for transform in symmetries[1:]:
+            image = transform_move(move, transform, height, width)
+            if image not in classes:
+                classes[image] = move
+    return dict((move, classes[move]) for move in moves)
@@ -0,0 +1,9 @@
+'''
+The game modules live at the top of the repository; make them importable
+when pytest is run from anywhere.
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,22 @@
+import pytest
+
+from analyze import analyze_item, decode_board, encode_board, parse_board
+
+
+def test_binary_round_trip():
+    board = parse_board("b  / w /  b")
+    assert decode_board(encode_board(board)) == board
+
+
+@pytest.mark.parametrize("record", [b"", b"\x00", b"\x03\x00", b"\x01\x03"])
+def test_bad_records_are_rejected(record):
+    with pytest.raises(ValueError):
+        decode_board(record)
+    result = analyze_item((7, record), True, False)
+    assert result["index"] == 7 and "error" in result
+
+
+def test_bad_text_is_reported():
+    assert "error" in analyze_item((0, "bx/  "), False, False)
+    result = analyze_item((1, "b   "), False, True)
+    assert result["board"] == "b./.." and "best_move" in result
@@ -0,0 +1,52 @@
+import pytest
+
+from book import OpeningBook, get_book, write_book
+from gomoku import make_empty_board
+from symmetry import canonical_key, transform_board, transform_move, \
+    transforms
+
+
+def test_reply_is_found_in_every_orientation(tmp_path):
+    board = make_empty_board(9)
+    board[4][4] = "b"
+    board[3][5] = "w"
+    key, transform = canonical_key(board)
+    reply = (2, 6)
+    stored = transform_move(reply, transform, 9, 9)
+    path = str(tmp_path / "book.bin")
+    write_book(path, [(key, stored[0] * 9 + stored[1], 3)], 9, 4)
+    book = OpeningBook(path)
+    assert book.probe(board) == reply
+    for other in transforms(9, 9):
+        turned = transform_board(board, other)
+        assert book.probe(turned) == transform_move(reply, other, 9, 9)
+    book.close()
+
+
+def test_unknown_positions_are_not_in_the_book(tmp_path):
+    path = str(tmp_path / "book.bin")
+    write_book(path, [], 9, 4)
+    book = OpeningBook(path)
+    board = make_empty_board(9)
+    board[4][4] = "b"
+    assert book.probe(board) is None
+    assert book.probe(make_empty_board(8)) is None
+    book.close()
+
+
+@pytest.mark.parametrize("cut", [None, 0, 5, -1])
+def test_broken_files_are_rejected(tmp_path, cut):
+    path = str(tmp_path / "book.bin")
+    write_book(path, [(1, 2, 3), (4, 5, 6)], 9, 4)
+    with open(path, "rb") as f:
+        data = f.read()
+    #No cut means a bad magic
+    data = b"X" + data[1:] if cut is None else data[:cut]
+    with open(path, "wb") as f:
+        f.write(data)
+    with pytest.raises(ValueError, match="book.bin"):
+        OpeningBook(path).open()
+    with pytest.raises(ValueError, match="book.bin"):
+        OpeningBook(path).probe(make_empty_board(9))
+    with pytest.raises(ValueError, match="book.bin"):
+        get_book(path)
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+import bitboard
+from evaluator import LineEvaluator, board_totals
+from gomoku import detect_rows2, make_empty_board, put_seq_on_board, score
+
+
+def random_board(size, stones, seed):
+    rand = random.Random(seed)
+    board = make_empty_board(size)
+    for i in range(stones):
+        board[rand.randrange(size)][rand.randrange(size)] = "bw"[i % 2]
+    return board
+
+
+@pytest.mark.parametrize("size", [5, 8, 15, 19, 70])
+def test_totals_match_detect_rows2(size):
+    for seed in range(3):
+        board = random_board(size, size * size // 5, seed)
+        totals = board_totals(board)
+        for col in "bw":
+            for length in range(1, 6):
+                assert tuple(totals[col][length]) == \
+                    detect_rows2(board, col, length)
+
+
+@pytest.mark.parametrize("size", [8, 15])
+def test_bitboard_matches_detect_rows2(size):
+    for seed in range(3):
+        board = random_board(size, size * size // 4, seed)
+        bits = bitboard.from_board(board)
+        for col in "bw":
+            for length in range(2, 6):
+                assert bits.run_counts(col, length) == \
+                    detect_rows2(board, col, length)
+
+
+def test_long_line_past_64_cells():
+    board = make_empty_board(100)
+    put_seq_on_board(board, 97, 90, 0, 1, 4, "b")
+    assert board_totals(board)["b"][4] == [1, 0, 0]
+    assert detect_rows2(board, "b", 4) == (1, 0, 0)
+
+
+def test_line_evaluator_follows_moves():
+    board = random_board(15, 40, 1)
+    evaluator = LineEvaluator(board)
+    rand = random.Random(2)
+    played = []
+    for i in range(20):
+        y, x = rand.randrange(15), rand.randrange(15)
+        if board[y][x] != " ":
+            continue
+        col = "bw"[i % 2]
+        board[y][x] = col
+        evaluator.place(y, x, col)
+        played.append((y, x))
+        assert evaluator.score() == score(board)
+    for y, x in reversed(played):
+        board[y][x] = " "
+        evaluator.remove(y, x)
+    assert evaluator.score() == score(board)
@@ -0,0 +1,22 @@
+import evaluator
+from gomoku import choose_move, make_empty_board
+from instrument import profiled
+import patterns
+from transposition import TranspositionTable
+
+
+def test_profile_sees_the_move_path():
+    board = make_empty_board(8)
+    board[4][4] = "b"
+    board[3][3] = "w"
+    line_features = evaluator.line_features
+    with profiled() as profile:
+        choose_move(board, "b")
+        choose_move(board, "w", max_depth=3, table=TranspositionTable(4096))
+    for name in ("choose_move", "search_max", "search", "forced_win",
+                 "evaluator.place", "evaluator.remove", "line_features",
+                 "order_moves"):
+        assert profile.timers[name][0] > 0, name
+    assert profile.counters["search.nodes"] > 0
+    #The original functions are put back
+    assert evaluator.line_features is line_features is patterns.line_features
@@ -0,0 +1,31 @@
+import threading
+
+from gomoku import choose_move, make_empty_board, put_seq_on_board, \
+    search_max
+from movegen import candidate_moves, order_moves
+from ponder import Ponderer
+import threats
+
+
+def test_stopped_searches_return_at_once():
+    board = make_empty_board(8)
+    put_seq_on_board(board, 3, 2, 0, 1, 3, "b")
+    stop = threading.Event()
+    stop.set()
+    assert threats.forced_win(board, "b") is not None
+    assert threats.forced_win(board, "b", stop=stop) is None
+    assert search_max(board) != 0
+    assert search_max(board, stop=stop) == 0
+
+
+def test_pondered_answer_is_taken():
+    board = make_empty_board(8)
+    board[4][4] = "b"
+    ponderer = Ponderer("b", replies=3)
+    ponderer.start(board)
+    ponderer.thread.join()
+    assert ponderer.pondered == 3
+    y, x = order_moves(board, candidate_moves(board), "w")[0]
+    board[y][x] = "w"
+    assert ponderer.take(board) == choose_move(board, "b")
+    assert ponderer.hits == 1
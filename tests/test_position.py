@@ -0,0 +1,35 @@
+import gc
+
+import pytest
+
+from position import Position
+
+
+def test_play_and_undo():
+    empty = Position.empty(8)
+    position = empty.play(4, 4).play(3, 3)
+    assert position.history() == [(4, 4), (3, 3)]
+    assert position.move == (3, 3) and position.to_move == "b"
+    before = position.undo()
+    assert before == empty.play(4, 4) and before.key == empty.play(4, 4).key
+    assert before.undo() == empty and before.undo().key == 0
+    with pytest.raises(ValueError):
+        empty.undo()
+    with pytest.raises(ValueError):
+        position.play(4, 4)
+
+
+def test_equal_whatever_the_move_order():
+    first = Position.empty(8).play(1, 1).play(2, 2).play(3, 3)
+    second = Position.empty(8).play(3, 3).play(2, 2).play(1, 1)
+    assert first == second and hash(first) == hash(second)
+    assert first == Position.from_board(first.board())
+    assert first.result() == "Continue playing"
+
+
+def test_kept_position_does_not_keep_earlier_ones():
+    kept = Position.empty(8).play(4, 4).play(3, 3)
+    assert not any(isinstance(referent, Position)
+                   for referent in gc.get_referents(kept))
+    assert kept.history() == [(4, 4), (3, 3)]
+    assert kept.undo().undo() == Position.empty(8)
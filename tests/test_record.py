@@ -0,0 +1,51 @@
+import pytest
+
+from record import GameRecord, parse_square, read_archive, square_name, \
+    write_archive
+
+
+def test_text_form_round_trip():
+    record = GameRecord(15, [(7, 7), (6, 7), (7, 8)], "Black won!")
+    assert record.to_text() == "15 1-0 h8 h9 i8"
+    assert GameRecord.from_text(record.to_text()) == record
+
+
+def test_squares():
+    assert square_name((7, 7), 15) == "h8"
+    assert parse_square("h8", 15) == (7, 7)
+    with pytest.raises(ValueError):
+        parse_square("z1", 15)
+    with pytest.raises(ValueError):
+        GameRecord.from_text("15 2-0 h8")
+
+
+def test_archive_round_trip(tmp_path):
+    records = [GameRecord(8, [(4, 4), (3, 3)], "Continue playing"),
+               GameRecord(19, [(18, 18), (0, 0), (9, 9)], "Draw!"),
+               GameRecord(15, [], "White won!")]
+    path = str(tmp_path / "games.gmr")
+    assert write_archive(path, records[:2]) == 2
+    write_archive(path, records[2:], append=True)
+    with open(path, "rb") as f:
+        assert list(read_archive(f)) == records
+
+
+def test_truncated_archive(tmp_path):
+    path = str(tmp_path / "games.gmr")
+    write_archive(path, [GameRecord(8, [(4, 4), (3, 3)])])
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-1])
+    with open(path, "rb") as f:
+        with pytest.raises(ValueError):
+            list(read_archive(f))
+
+
+def test_positions_replay_the_game():
+    record = GameRecord(8, [(4, 4), (3, 3), (4, 5)])
+    positions = list(record.positions())
+    assert [move for position, move in positions] == record.moves + [None]
+    final = positions[-1][0]
+    assert final.get(4, 5) == "b" and final.get(3, 3) == "w"
+    assert final.history() == record.moves
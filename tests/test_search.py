@@ -0,0 +1,42 @@
+from evaluator import WEIGHTS
+from gomoku import make_empty_board, put_seq_on_board
+import search
+from transposition import TranspositionTable
+
+
+def test_plays_the_winning_move():
+    board = make_empty_board(8)
+    put_seq_on_board(board, 3, 1, 0, 1, 4, "b")
+    put_seq_on_board(board, 5, 1, 0, 1, 3, "w")
+    move, value, depth = search.search(board, "b", None, 2)
+    assert move in ((3, 0), (3, 5))
+    assert value >= search.WIN_BOUND
+
+
+def test_blocks_an_open_four():
+    board = make_empty_board(8)
+    put_seq_on_board(board, 4, 2, 0, 1, 3, "w")
+    put_seq_on_board(board, 1, 1, 1, 1, 2, "b")
+    move = search.best_move(board, "b", None, 2)
+    assert move in ((4, 1), (4, 5))
+
+
+def test_same_move_with_and_without_table():
+    board = make_empty_board(8)
+    put_seq_on_board(board, 3, 3, 0, 1, 2, "b")
+    put_seq_on_board(board, 4, 3, 0, 1, 2, "w")
+    table = TranspositionTable(capacity=4096)
+    first = search.search(board, "b", None, 3, table)
+    again = search.search(board, "b", None, 3, table)
+    assert first == search.search(board, "b", None, 3) == again
+
+
+def test_float_weights_with_table():
+    board = make_empty_board(8)
+    put_seq_on_board(board, 3, 3, 0, 1, 2, "b")
+    put_seq_on_board(board, 4, 3, 0, 1, 2, "w")
+    weights = dict(WEIGHTS, open_three_b=80.5)
+    move, value, depth = search.search(board, "b", None, 2,
+                                       TranspositionTable(capacity=4096),
+                                       weights)
+    assert board[move[0]][move[1]] == " " and depth == 2
@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def gomoku_server():
+    game_server = server.GomokuServer(workers=1)
+    game_server.pool.shutdown()
+    #Threads are enough to run the CPU's moves in tests
+    game_server.pool = ThreadPoolExecutor(max_workers=1)
+    yield game_server
+    game_server.close()
+
+
+def ask(game_server, requests):
+    '''
+    Return the replies of <game_server> to <requests> from one connection,
+    with the message of the ValueError in place of a failed reply.
+    '''
+    async def run():
+        owned = set()
+        replies = []
+        for request in requests:
+            try:
+                replies.append(await game_server.handle(request, owned))
+            except ValueError as e:
+                replies.append(str(e))
+        return replies
+    return asyncio.run(run())
+
+
+def test_game(gomoku_server):
+    new, moved, state = ask(gomoku_server, [
+        {"cmd": "new", "size": 8, "cpu": "b"},
+        {"cmd": "move", "session": 1, "y": 0, "x": 0},
+        {"cmd": "state", "session": 1}])
+    assert new["cpu_move"] == [4, 4] and new["to_move"] == "w"
+    assert "cpu_move" in moved and moved["to_move"] == "w"
+    assert state["board"] == moved["board"]
+
+
+@pytest.mark.parametrize("request_", [
+    {"cmd": "new", "size": 20},
+    {"cmd": "new", "size": True},
+    {"cmd": "new", "cpu": ["b"]},
+    {"cmd": "new", "time_limit": -1},
+    {"cmd": "new", "time_limit": 1e9},
+    {"cmd": "state", "session": [1]},
+    {"cmd": "move", "session": {"a": 1}, "y": 0, "x": 0},
+    {"cmd": "state", "session": 2},
+    {"cmd": "nothing"}])
+def test_bad_requests_get_errors(gomoku_server, request_):
+    assert isinstance(ask(gomoku_server, [request_])[0], str)
+
+
+def test_engine_failure_takes_the_move_back(gomoku_server, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("engine failed")
+    monkeypatch.setattr(server, "_cpu_move", fail)
+    new, error, state = ask(gomoku_server, [
+        {"cmd": "new", "size": 8, "cpu": "w"},
+        {"cmd": "move", "session": 1, "y": 3, "x": 3},
+        {"cmd": "state", "session": 1}])
+    assert "engine failed" in error
+    assert state["to_move"] == "b"
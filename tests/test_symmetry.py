@@ -0,0 +1,42 @@
+import random
+
+from gomoku import make_empty_board
+from symmetry import canonical, canonical_key, inverse_move, stabilizer, \
+    transform_board, transform_move, transforms
+
+
+def random_board(size, stones, seed):
+    rand = random.Random(seed)
+    board = make_empty_board(size)
+    for i in range(stones):
+        board[rand.randrange(size)][rand.randrange(size)] = "bw"[i % 2]
+    return board
+
+
+def test_canonical_key_is_the_same_for_symmetric_boards():
+    board = random_board(9, 12, 0)
+    key = canonical_key(board)[0]
+    for transform in transforms(9, 9):
+        assert canonical_key(transform_board(board, transform))[0] == key
+        assert canonical(transform_board(board, transform))[0] == \
+            canonical(board)[0]
+
+
+def test_inverse_move_undoes_transform_move():
+    for transform in transforms(7, 7):
+        for move in ((0, 0), (1, 5), (6, 3)):
+            moved = transform_move(move, transform, 7, 7)
+            assert inverse_move(moved, transform, 7, 7) == move
+
+
+def test_rectangular_boards_have_four_symmetries():
+    assert len(transforms(5, 8)) == 4
+
+
+def test_stabilizer():
+    board = make_empty_board(7)
+    assert len(stabilizer(board)) == 8
+    board[3][3] = "b"
+    assert len(stabilizer(board)) == 8
+    board[3][4] = "w"
+    assert stabilizer(board)[0] == 0 and len(stabilizer(board)) == 2
@@ -0,0 +1,50 @@
+from transposition import ENTRY_BYTES, EXACT, LOWER, NO_MOVE, UPPER, \
+    TranspositionTable
+
+import pytest
+
+
+def test_store_and_lookup():
+    table = TranspositionTable(capacity=64)
+    table.store(12345, 3, 250, LOWER, 17)
+    assert table.lookup(12345) == (3, 250, LOWER, 17)
+    assert table.lookup(12345 + 64) is None
+    assert table.hits == 1 and table.misses == 1
+
+
+def test_float_values():
+    table = TranspositionTable(capacity=64)
+    table.store(1, 2, 80.5, EXACT)
+    table.store(2, 2, -1234.25, UPPER)
+    assert table.lookup(1) == (2, 80.5, EXACT, NO_MOVE)
+    assert table.lookup(2)[1] == -1234.25
+
+
+def test_integral_values_come_back_as_int():
+    table = TranspositionTable(capacity=64)
+    table.store(1, 2, 300.0, EXACT)
+    value = table.lookup(1)[1]
+    assert value == 300 and isinstance(value, int)
+
+
+def test_deeper_entry_of_same_search_is_kept():
+    table = TranspositionTable(capacity=1)
+    table.store(1, 5, 10, EXACT)
+    table.store(2, 3, 20, EXACT)
+    assert table.lookup(1) == (5, 10, EXACT, NO_MOVE)
+    assert table.rejected == 1
+    table.new_search()
+    table.store(2, 3, 20, EXACT)
+    assert table.lookup(2) == (3, 20, EXACT, NO_MOVE)
+    assert table.lookup(1) is None
+
+
+def test_size_and_clear():
+    table = TranspositionTable(max_bytes=1000)
+    assert table.capacity == 1000 // ENTRY_BYTES
+    table.store(7, 1, 1, EXACT)
+    assert table.used() == 1
+    table.clear()
+    assert table.used() == 0 and table.stats()["stores"] == 0
+    with pytest.raises(ValueError):
+        TranspositionTable(capacity=0)
@@ -0,0 +1,36 @@
+from evaluator import WEIGHT_NAMES, load_weights, save_weights
+from record import GameRecord
+from tune import Dataset, fit, game_features, load_features, \
+    pack_features, save_features
+
+
+def sample_records():
+    win = GameRecord(8, [(4, 0), (5, 0), (4, 1), (5, 1), (4, 2), (5, 2),
+                         (4, 3), (6, 6), (4, 4)], "Black won!")
+    loss = GameRecord(8, [(0, 0), (3, 0), (0, 7), (3, 1), (7, 7), (3, 2),
+                          (7, 0), (3, 3), (6, 6), (3, 4)], "White won!")
+    return [win, loss]
+
+
+def test_features_file_round_trip(tmp_path):
+    items = [item for record in sample_records()
+             for item in game_features(record)]
+    rows, count = pack_features(items)
+    assert count == len(items) > 0
+    path = str(tmp_path / "features.bin")
+    save_features(path, rows, count)
+    assert load_features(path) == (rows, count)
+
+
+def test_fitted_weights_are_integers(tmp_path):
+    items = [item for record in sample_records()
+             for item in game_features(record)]
+    dataset = Dataset(*pack_features(items))
+    weights, before, after = fit(dataset, iterations=20,
+                                 fixed=("four_w",))
+    assert set(weights) == set(WEIGHT_NAMES)
+    assert all(isinstance(value, int) for value in weights.values())
+    assert weights["four_w"] == -10000
+    path = str(tmp_path / "weights.json")
+    save_weights(weights, path)
+    assert load_weights(path) == weights
@@ -0,0 +1,399 @@
+'''
+Threat-space search for forced wins.
+Only threatening moves are searched for the attacker: fours (a move after
+which one more stone makes five) and, optionally, open threes (a move after
+which one more stone makes an open four). The defender's replies are limited
+to the squares that stop the threat, plus fours of their own. A win by
+continuous fours is a VCF, a win by fours and threes a VCT.
+
+The squares where a threat can be made are kept up to date as stones are
+placed and removed during the search, rather than found again by scanning
+the board at every position. The search stops at a node limit, and at a
+deadline or when a threading.Event is set, so that it can run within the
+time of a move (see "choose_move") and be cancelled (see ponder.py).
+See: https://en.wikipedia.org/wiki/Gomoku#Theoretical_generalizations
+'''
+
+import time
+
+from gomoku import is_bounded
+from movegen import run_through
+
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+#Stones on a line near a square needed for the threats looked for: a three
+#can become an open three, a four and a five
+THRESHOLDS = (2, 3, 4)
+#Largest share of the time of a timed move spent looking for a forced win
+TIME_SHARE = 0.25
+
+
+class LimitReached(Exception):
+    '''
+    Raised inside the search when the node or time limit is reached.
+    '''
+    pass
+
+
+def other(col):
+    '''
+    Return the colour playing against colour <col>.
+    '''
+    if col == "b":
+        return "w"
+    return "b"
+
+
+class ThreatSearch:
+    '''
+    Search for a forced win of colour <col> on a copy of board <board>,
+    stopping after <max_nodes> positions, <time_limit> seconds, at
+    time.perf_counter() <deadline> or when threading.Event <stop> is set.
+    '''
+
+    def __init__(self, board, col, max_nodes=20000, time_limit=None,
+                 deadline=None, stop=None):
+        self.board = [list(row) for row in board]
+        self.height = len(board)
+        self.width = len(board[0])
+        self.col = col
+        self.max_nodes = max_nodes
+        if time_limit is not None:
+            end = time.perf_counter() + time_limit
+            if deadline is None or end < deadline:
+                deadline = end
+        self.deadline = deadline
+        self.stop = stop
+        self.nodes = 0
+        #Stones of each colour seen from each square (y, x, direction)
+        #among the four squares on either side
+        self.counts = {"b": {}, "w": {}}
+        #Number of directions of each square with at least <stones> stones
+        #of each colour, by <stones> in THRESHOLDS
+        self.near = {"b": {}, "w": {}}
+        for near in self.near.values():
+            for stones in THRESHOLDS:
+                near[stones] = {}
+        for y, row in enumerate(self.board):
+            for x, cell in enumerate(row):
+                if cell != ' ':
+                    self.add_counts(y, x, cell, 1)
+
+    def on_board(self, y, x):
+        return 0 <= y < self.height and 0 <= x < self.width
+
+    def add_counts(self, y, x, col, change):
+        '''
+        Add <change> to the counts of the squares near (x, y) for a stone of
+        colour <col> placed (1) or removed (-1) there.
+        '''
+        counts = self.counts[col]
+        near = self.near[col]
+        height = self.height
+        width = self.width
+        for direction, (d_y, d_x) in enumerate(DIRECTIONS):
+            for step in (-4, -3, -2, -1, 1, 2, 3, 4):
+                cur_y = y + step * d_y
+                cur_x = x + step * d_x
+                if not (0 <= cur_y < height and 0 <= cur_x < width):
+                    continue
+                key = (cur_y, cur_x, direction)
+                old = counts.get(key, 0)
+                new = old + change
+                if new:
+                    counts[key] = new
+                else:
+                    del counts[key]
+                square = (cur_y, cur_x)
+                for stones in THRESHOLDS:
+                    squares = near[stones]
+                    if old < stones <= new:
+                        squares[square] = squares.get(square, 0) + 1
+                    elif new < stones <= old:
+                        if squares[square] == 1:
+                            del squares[square]
+                        else:
+                            squares[square] -= 1
+
+    def place(self, y, x, col):
+        '''
+        Place a stone of colour <col> at (x, y) during the search.
+        '''
+        self.board[y][x] = col
+        self.add_counts(y, x, col, 1)
+
+    def remove(self, y, x):
+        '''
+        Take back the stone at (x, y).
+        '''
+        col = self.board[y][x]
+        self.board[y][x] = ' '
+        self.add_counts(y, x, col, -1)
+
+    def makes_five(self, y, x, col):
+        '''
+        Return True if a stone of colour <col> at empty square (x, y) makes
+        a sequence of exactly five, the winning condition of "is_win".
+        '''
+        for d_y, d_x in DIRECTIONS:
+            if run_through(self.board, y, x, d_y, d_x, col)[0] == 5:
+                return True
+        return False
+
+    def fives_near(self, y, x, col):
+        '''
+        Return set of the empty squares on the lines through (x, y), at most
+        four squares away, where colour <col> would make five along that
+        line. Fives in other directions are not looked for: the search only
+        calls this when <col> had no five square before the stone at (x, y).
+        The stone at (x, y) may be missing from the counts.
+        '''
+        board = self.board
+        height = self.height
+        width = self.width
+        counts = self.counts[col]
+        squares = set()
+        for direction, (d_y, d_x) in enumerate(DIRECTIONS):
+            for step in (-4, -3, -2, -1, 1, 2, 3, 4):
+                cur_y = y + step * d_y
+                cur_x = x + step * d_x
+                #A five needs four stones near the square, one of which
+                #may be the stone at (x, y)
+                if 0 <= cur_y < height and 0 <= cur_x < width and \
+                        board[cur_y][cur_x] == ' ' and \
+                        counts.get((cur_y, cur_x, direction), 0) >= 3 and \
+                        run_through(board, cur_y, cur_x, d_y, d_x, col)[0] == 5:
+                    squares.add((cur_y, cur_x))
+        return squares
+
+    def fives(self, col):
+        '''
+        Return set of all the empty squares where colour <col> would make
+        five. Such a square has four stones of colour <col> near it on a
+        line through it.
+        '''
+        squares = set()
+        for y, x in self.threat_squares(col, 4):
+            if self.makes_five(y, x, col):
+                squares.add((y, x))
+        return squares
+
+    def threat_squares(self, col, stones):
+        '''
+        Return sorted list of the empty squares that have at least <stones>
+        stones of colour <col> among the four squares on either side along
+        one of the lines through them (<stones> one of THRESHOLDS).
+        '''
+        board = self.board
+        return sorted(square for square in self.near[col][stones]
+                      if board[square[0]][square[1]] == ' ')
+
+    def four_moves(self, col, only=None):
+        '''
+        Return list of (move, five squares) of the moves of colour <col>
+        that make a four, i.e. leave at least one square where <col> would
+        make five. Only move <only> is tried if given.
+        '''
+        moves = []
+        candidates = [only] if only is not None else \
+            self.threat_squares(col, 3)
+        for y, x in candidates:
+            self.board[y][x] = col
+            squares = self.fives_near(y, x, col)
+            self.board[y][x] = ' '
+            if squares:
+                moves.append(((y, x), squares))
+        return moves
+
+    def three_moves(self, col, only=None):
+        '''
+        Return list of (move, defence squares) of the moves of colour <col>
+        that make an open three: a sequence of exactly three, open at both
+        ends (see "is_bounded"), that one more stone turns into a four with
+        two five squares. The defence squares are the free squares within
+        two of the ends of the three. Only move <only> is tried if given.
+        '''
+        board = self.board
+        moves = []
+        candidates = [only] if only is not None else \
+            self.threat_squares(col, 2)
+        for y, x in candidates:
+            board[y][x] = col
+            defences = set()
+            for d_y, d_x in DIRECTIONS:
+                if run_through(board, y, x, d_y, d_x, col)[0] != 3:
+                    continue
+                #Ends of the three
+                y_end, x_end = y, x
+                while self.on_board(y_end + d_y, x_end + d_x) and \
+                        board[y_end + d_y][x_end + d_x] == col:
+                    y_end += d_y
+                    x_end += d_x
+                y_start = y_end - 2 * d_y
+                x_start = x_end - 2 * d_x
+                if is_bounded(board, y_end, x_end, 3, d_y, d_x) != "OPEN":
+                    continue
+                if not self.extends_to_open_four(y_start, x_start, y_end, x_end,
+                                                 d_y, d_x, col):
+                    continue
+                for step in (-2, -1):
+                    cur_y = y_start + step * d_y
+                    cur_x = x_start + step * d_x
+                    if self.on_board(cur_y, cur_x) and board[cur_y][cur_x] == ' ':
+                        defences.add((cur_y, cur_x))
+                for step in (1, 2):
+                    cur_y = y_end + step * d_y
+                    cur_x = x_end + step * d_x
+                    if self.on_board(cur_y, cur_x) and board[cur_y][cur_x] == ' ':
+                        defences.add((cur_y, cur_x))
+            board[y][x] = ' '
+            if defences:
+                moves.append(((y, x), defences))
+        return moves
+
+    def extends_to_open_four(self, y_start, x_start, y_end, x_end, d_y, d_x,
+                             col):
+        '''
+        Return True if a stone of colour <col> at either end of the three
+        from (x_start, y_start) to (x_end, y_end) makes a four with two
+        squares where <col> would make five.
+        '''
+        board = self.board
+        for cur_y, cur_x in ((y_start - d_y, x_start - d_x),
+                             (y_end + d_y, x_end + d_x)):
+            board[cur_y][cur_x] = col
+            squares = self.fives_near(cur_y, cur_x, col)
+            board[cur_y][cur_x] = ' '
+            if len(squares) >= 2:
+                return True
+        return False
+
+    def count_node(self):
+        '''
+        Count one more position, raising LimitReached past the limits or
+        when the search is stopped.
+        '''
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise LimitReached()
+        if self.deadline is not None and \
+                time.perf_counter() >= self.deadline:
+            raise LimitReached()
+        if self.stop is not None and self.stop.is_set():
+            raise LimitReached()
+
+    def attack(self, depth, threes):
+        '''
+        Return list of moves (attacker and defender alternating, attacker
+        first) of a forced win for the attacker to move within <depth>
+        attacker moves, or None. Open threes are tried if <threes>.
+        '''
+        self.count_node()
+        board = self.board
+        col = self.col
+        opp = other(col)
+        own_fives = self.fives(col)
+        if own_fives:
+            return [min(own_fives)]
+        if depth == 0:
+            return None
+        opp_fives = self.fives(opp)
+        if len(opp_fives) >= 2:
+            return None
+        #A four of the defender must be blocked, and the block must be a
+        #threat itself for the attack to go on
+        only = min(opp_fives) if opp_fives else None
+
+        fours = self.four_moves(col, only)
+        for move, squares in fours:
+            if len(squares) >= 2:
+                return [move]
+            defence = min(squares)
+            self.place(move[0], move[1], col)
+            self.place(defence[0], defence[1], opp)
+            line = self.attack(depth - 1, threes)
+            self.remove(defence[0], defence[1])
+            self.remove(move[0], move[1])
+            if line is not None:
+                return [move, defence] + line
+
+        if not threes:
+            return None
+        #A three that is also a four only has one reply, tried above
+        four_squares = set(move for move, squares in fours)
+        for move, defences in self.three_moves(col, only):
+            if move in four_squares:
+                continue
+            self.place(move[0], move[1], col)
+            replies = set(defences)
+            for reply, squares in self.four_moves(opp):
+                replies.add(reply)
+            line = None
+            for reply in sorted(replies):
+                self.place(reply[0], reply[1], opp)
+                sub_line = self.attack(depth - 1, threes)
+                self.remove(reply[0], reply[1])
+                if sub_line is None:
+                    line = None
+                    break
+                if line is None:
+                    line = [reply] + sub_line
+            self.remove(move[0], move[1])
+            if line is not None:
+                return [move] + line
+        return None
+
+    def solve(self, depth, threes):
+        '''
+        Return forced winning line within <depth> attacker moves, or None if
+        there is none or the limits were reached first.
+        '''
+        try:
+            return self.attack(depth, threes)
+        except LimitReached:
+            return None
+
+
+def find_vcf(board, col, max_depth=10, max_nodes=20000, time_limit=None,
+             deadline=None, stop=None):
+    '''
+    Return list of moves of a win by continuous fours for colour <col> to
+    move on board <board>, or None.
+    '''
+    return ThreatSearch(board, col, max_nodes, time_limit, deadline,
+                        stop).solve(max_depth, False)
+
+
+def find_vct(board, col, max_depth=4, max_nodes=20000, time_limit=None,
+             deadline=None, stop=None):
+    '''
+    Return list of moves of a win by fours and open threes for colour <col>
+    to move on board <board>, or None. For each three only the defender's
+    replies near the three and their own fours are tried.
+    '''
+    return ThreatSearch(board, col, max_nodes, time_limit, deadline,
+                        stop).solve(max_depth, True)
+
+
+def forced_win(board, col, max_nodes=200, time_limit=None, deadline=None,
+               stop=None):
+    '''
+    Return (y, x) of the first move of a forced win for colour <col> to move
+    on board <board>, or None. Wins by fours alone are looked for first,
+    then wins by fours and threes, each within <max_nodes> positions. A
+    <time_limit> (seconds) or time.perf_counter() <deadline> also bounds
+    the search, but makes the result depend on the speed of the machine.
+    Setting threading.Event <stop> ends the search, with no win found.
+    '''
+    if time_limit is not None:
+        end = time.perf_counter() + time_limit
+        if deadline is None or end < deadline:
+            deadline = end
+    line = find_vcf(board, col, max_nodes=max_nodes, deadline=deadline,
+                    stop=stop)
+    if line is None and (deadline is None or
+                         time.perf_counter() < deadline):
+        line = find_vct(board, col, max_nodes=max_nodes, deadline=deadline,
+                        stop=stop)
+    if line is None:
+        return None
+    return line[0]
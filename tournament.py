@@ -0,0 +1,330 @@
+'''
+Self-play tournaments between CPU players.
+Every pair of engines plays the given number of games, each game starting
+from a few random moves around the centre and replayed with colours
+swapped, so that both engines get the same openings. An engine is written
+as "kind[:key=value,...]":
+    greedy                   one-move "search_max"
+    search:depth=2           alpha-beta search to a fixed depth
+    search:time=0.1          alpha-beta search for 0.1 seconds a move
+    greedy:open_three_b=80   any key of evaluator.WEIGHTS changes a weight
+    greedy:weights=w.json    evaluation profile read from a JSON file
+    greedy:book=book.bin     replies from an opening book first
+    greedy:cache=scores.bin  moves cached across games (see cache.py)
+    greedy:batch=1           squares scored at once with NumPy (vectorized.py)
+    mcts:playouts=2000       Monte Carlo tree search, 2000 playouts a move
+    mcts:time=0.5,c=1.4      ... for 0.5 seconds with exploration 1.4
+Games can be spread over a process pool. Each game and the summary are
+written as one JSON object per line, followed by the profile of the engine
+with --profile (see instrument.py).
+Run "python tournament.py greedy search:depth=2 --games 10".
+'''
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from book import get_book
+from cache import get_cache
+from engine import GomokuEngine
+from evaluator import WEIGHTS, load_weights
+from gomoku import choose_move
+import instrument
+from mcts import EXPLORATION, MonteCarlo
+from transposition import TranspositionTable
+
+KINDS = ("greedy", "search", "mcts")
+
+
+def parse_engine(text):
+    '''
+    Return engine description dictionary for engine string <text> (see the
+    module docstring). Raise ValueError if <text> is not valid.
+    '''
+    kind, sep, options = text.partition(":")
+    if kind not in KINDS:
+        raise ValueError("unknown engine kind %r in %r" % (kind, text))
+    engine = {"name": text, "kind": kind, "time_limit": None,
+              "max_depth": None, "weights": None, "book": None,
+              "playouts": None, "exploration": EXPLORATION, "cache": None,
+              "batch": False}
+    weights = dict(WEIGHTS)
+    changed = False
+    for option in options.split(",") if options else []:
+        key, sep, value = option.partition("=")
+        if not sep:
+            raise ValueError("option %r of %r has no value" % (option, text))
+        if key == "time":
+            engine["time_limit"] = float(value)
+        elif key == "depth":
+            engine["max_depth"] = int(value)
+        elif key == "playouts" and kind == "mcts":
+            engine["playouts"] = int(value)
+        elif key == "c" and kind == "mcts":
+            engine["exploration"] = float(value)
+        elif key == "book":
+            if not os.path.exists(value):
+                raise ValueError("no opening book %s" % value)
+            engine["book"] = value
+        elif key == "cache" and kind == "greedy":
+            engine["cache"] = value
+        elif key == "batch" and kind == "greedy":
+            engine["batch"] = bool(int(value))
+        elif key == "weights":
+            weights.update(load_weights(value))
+            changed = True
+        elif key in WEIGHTS:
+            weights[key] = float(value)
+            changed = True
+        else:
+            raise ValueError("unknown option %r of %r" % (key, text))
+    if kind == "search" and engine["time_limit"] is None and \
+            engine["max_depth"] is None:
+        raise ValueError("engine %r needs a depth or a time" % text)
+    if kind == "greedy" and (engine["time_limit"] is not None or
+                             engine["max_depth"] is not None):
+        raise ValueError("greedy engine %r does not search" % text)
+    if kind == "mcts" and engine["max_depth"] is not None:
+        raise ValueError("mcts engine %r has no depth" % text)
+    if changed:
+        engine["weights"] = weights
+    return engine
+
+
+def random_opening(board_size, moves, seed):
+    '''
+    Return list of <moves> reproducible random moves (y, x) within two
+    squares of the centre of a board of size (board_size x board_size).
+    '''
+    rand = random.Random("%d-%d-%d" % (board_size, moves, seed))
+    centre = board_size // 2
+    squares = []
+    for y in range(centre - 2, centre + 3):
+        for x in range(centre - 2, centre + 3):
+            if 0 <= y < board_size and 0 <= x < board_size:
+                squares.append((y, x))
+    return rand.sample(squares, min(moves, len(squares)))
+
+
+def play_game(black, white, board_size=8, opening=()):
+    '''
+    Return dictionary describing a game between engine descriptions
+    <black> and <white> on a board of size (board_size x board_size),
+    after the moves <opening>: result, winner ("b", "w" or None), moves
+    and the time taken by each engine to choose its moves.
+    '''
+    game = GomokuEngine(board_size)
+    for y, x in opening:
+        game.apply_move(y, x)
+    engines = {"b": black, "w": white}
+    #Each engine keeps its own search results (or tree) for the whole game
+    tables = {}
+    trees = {}
+    for col, engine in engines.items():
+        tables[col] = None
+        trees[col] = None
+        if engine["kind"] == "search":
+            tables[col] = TranspositionTable()
+        elif engine["kind"] == "mcts":
+            trees[col] = MonteCarlo(engine["exploration"],
+                                    engine["playouts"])
+    books = {}
+    caches = {}
+    for col, engine in engines.items():
+        books[col] = get_book(engine["book"]) if engine["book"] else None
+        caches[col] = get_cache(engine["cache"]) if engine["cache"] else None
+    times = {"b": [], "w": []}
+    start = time.perf_counter()
+    while not game.is_over():
+        col = game.to_move
+        engine = engines[col]
+        before = time.perf_counter()
+        move = choose_move(game.board, col, engine["time_limit"], tables[col],
+                           max_depth=engine["max_depth"],
+                           weights=engine["weights"], book=books[col],
+                           mcts=trees[col], cache=caches[col],
+                           batch=engine["batch"])
+        times[col].append(time.perf_counter() - before)
+        game.apply_move(move[0], move[1])
+    result = game.result()
+    winner = None
+    if result == "Black won!":
+        winner = "b"
+    elif result == "White won!":
+        winner = "w"
+    return {"type": "game",
+            "black": black["name"],
+            "white": white["name"],
+            "board_size": board_size,
+            "result": result,
+            "winner": winner,
+            "opening": [list(move) for move in opening],
+            "moves": [list(move) for move in game.history[len(opening):]],
+            "move_times": times,
+            "duration_s": time.perf_counter() - start}
+
+
+def _play(args):
+    '''
+    Worker: play_game(*args).
+    '''
+    return play_game(*args)
+
+
+def schedule(engines, games, board_size=8, opening_moves=2, seed=0):
+    '''
+    Return list of the play_game arguments of a round robin between
+    engine descriptions <engines>: <games> games for each pair, in pairs of
+    games with the same opening and the colours swapped.
+    '''
+    jobs = []
+    for first in range(len(engines)):
+        for second in range(first + 1, len(engines)):
+            for game in range(games):
+                opening = random_opening(board_size, opening_moves,
+                                         seed + game // 2)
+                if game % 2 == 0:
+                    black, white = engines[first], engines[second]
+                else:
+                    black, white = engines[second], engines[first]
+                jobs.append((black, white, board_size, opening))
+    return jobs
+
+
+def summarize(records, elapsed):
+    '''
+    Return summary dictionary of the game records <records> played in
+    <elapsed> seconds: games/sec, moves/sec, and for each engine its games,
+    wins, losses, draws, win rate (draws counting half) and average time
+    per move.
+    '''
+    engines = {}
+    moves = 0
+    for record in records:
+        moves += len(record["moves"])
+        for col in ("b", "w"):
+            name = record["black"] if col == "b" else record["white"]
+            stats = engines.setdefault(name, {"games": 0, "wins": 0,
+                                              "losses": 0, "draws": 0,
+                                              "moves": 0, "time_s": 0.0})
+            stats["games"] += 1
+            if record["winner"] is None:
+                stats["draws"] += 1
+            elif record["winner"] == col:
+                stats["wins"] += 1
+            else:
+                stats["losses"] += 1
+            stats["moves"] += len(record["move_times"][col])
+            stats["time_s"] += sum(record["move_times"][col])
+    for stats in engines.values():
+        stats["win_rate"] = (stats["wins"] + 0.5 * stats["draws"]) / \
+            stats["games"]
+        stats["mean_move_s"] = stats["time_s"] / stats["moves"] \
+            if stats["moves"] else 0.0
+    return {"type": "summary",
+            "games": len(records),
+            "moves": moves,
+            "elapsed_s": elapsed,
+            "games_per_sec": len(records) / elapsed if elapsed else 0.0,
+            "moves_per_sec": moves / elapsed if elapsed else 0.0,
+            "engines": engines}
+
+
+def run_tournament(engines, games, board_size=8, opening_moves=2, seed=0,
+                   workers=1, out=None):
+    '''
+    Play the round robin of "schedule" with <workers> processes and return
+    its summary (see "summarize"). Every game record, then the summary, is
+    written as a line of JSON to file object <out> if given.
+    '''
+    jobs = schedule(engines, games, board_size, opening_moves, seed)
+    records = []
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_play, jobs)
+            for record in results:
+                records.append(record)
+                if out is not None:
+                    out.write(json.dumps(record) + "\n")
+    else:
+        for job in jobs:
+            record = play_game(*job)
+            records.append(record)
+            if out is not None:
+                out.write(json.dumps(record) + "\n")
+    summary = summarize(records, time.perf_counter() - start)
+    if out is not None:
+        out.write(json.dumps(summary) + "\n")
+    return summary
+
+
+def print_summary(summary):
+    '''
+    Prints summary of run_tournament as a table.
+    '''
+    print("%d games, %d moves in %.2f s: %.2f games/s, %.1f moves/s" % (
+        summary["games"], summary["moves"], summary["elapsed_s"],
+        summary["games_per_sec"], summary["moves_per_sec"]))
+    print("%-30s %6s %6s %6s %6s %9s %14s" % ("engine", "games", "wins",
+                                               "losses", "draws", "win rate",
+                                               "ms per move"))
+    for name, stats in sorted(summary["engines"].items()):
+        print("%-30s %6d %6d %6d %6d %9.3f %14.3f" % (
+            name, stats["games"], stats["wins"], stats["losses"],
+            stats["draws"], stats["win_rate"], stats["mean_move_s"] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("engines", nargs="+",
+                        help="engines to play, see above")
+    parser.add_argument("--games", type=int, default=10,
+                        help="games for each pair of engines")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--opening-moves", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes (0 for all CPUs)")
+    parser.add_argument("--out", help="write JSON lines to this file")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the engines (needs --workers 1)")
+    args = parser.parse_args()
+    if len(set(args.engines)) != len(args.engines) or len(args.engines) < 2:
+        parser.error("at least two different engines are needed")
+    try:
+        engines = [parse_engine(text) for text in args.engines]
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    workers = args.workers or os.cpu_count()
+    if args.profile and workers != 1:
+        parser.error("--profile only sees this process: use --workers 1")
+
+    out = open(args.out, "w") if args.out else None
+    profile = instrument.enable() if args.profile else None
+    try:
+        summary = run_tournament(engines, args.games, args.size,
+                                 args.opening_moves, args.seed, workers, out)
+        if profile is not None and out is not None:
+            record = {"type": "profile"}
+            record.update(profile.as_dict())
+            out.write(json.dumps(record) + "\n")
+    finally:
+        instrument.disable()
+        if out is not None:
+            out.close()
+    print_summary(summary)
+    if profile is not None:
+        print()
+        print(profile.report())
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
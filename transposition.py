@@ -0,0 +1,115 @@
+'''
+Fixed-capacity transposition table for the alpha-beta search.
+Entries are kept in flat typed arrays indexed by hash, so the memory used is
+fixed when the table is created. When two positions map to the same slot the
+entry searched deeper is kept, unless the stored one is left over from an
+earlier search.
+'''
+
+from array import array
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+NO_MOVE = -1
+
+#Bytes per entry: key (8), value (8), move (2), depth (1), flag (1), age (1).
+#Values are doubles since scores are not integers with non-integer weights.
+ENTRY_BYTES = 21
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class TranspositionTable:
+    '''
+    Table of (depth, value, flag, move) entries keyed by 64-bit Zobrist hash.
+    Size it either by <capacity> (number of entries) or by <max_bytes>.
+    '''
+
+    def __init__(self, capacity=None, max_bytes=DEFAULT_MAX_BYTES):
+        if capacity is None:
+            capacity = max_bytes // ENTRY_BYTES
+        if capacity < 1:
+            raise ValueError("transposition table needs at least one entry")
+        self.capacity = capacity
+        self.keys = array('Q', [0]) * capacity
+        self.values = array('d', [0]) * capacity
+        self.moves = array('h', [NO_MOVE]) * capacity
+        #Depth -1 marks an empty slot
+        self.depths = array('b', [-1]) * capacity
+        self.flags = array('b', [EXACT]) * capacity
+        self.ages = array('B', [0]) * capacity
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def new_search(self):
+        '''
+        Mark the start of a new search; entries of earlier searches are
+        replaced first.
+        '''
+        self.age = (self.age + 1) % 256
+
+    def lookup(self, key):
+        '''
+        Return (depth, value, flag, move) stored for hash <key>, or None.
+        '''
+        slot = key % self.capacity
+        if self.depths[slot] >= 0 and self.keys[slot] == key:
+            self.hits += 1
+            value = self.values[slot]
+            #Integer scores are given back as integers
+            if value.is_integer():
+                value = int(value)
+            return (self.depths[slot], value, self.flags[slot],
+                    self.moves[slot])
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, flag, move=NO_MOVE):
+        '''
+        Store entry for hash <key>. An entry for another position in the same
+        slot is evicted if it is from an earlier search or not deeper.
+        '''
+        slot = key % self.capacity
+        if self.depths[slot] >= 0 and self.keys[slot] != key:
+            if self.ages[slot] == self.age and self.depths[slot] > depth:
+                self.rejected += 1
+                return
+            self.evictions += 1
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.moves[slot] = move
+        self.depths[slot] = min(depth, 127)
+        self.flags[slot] = flag
+        self.ages[slot] = self.age
+        self.stores += 1
+
+    def clear(self):
+        '''
+        Remove all entries and reset the counters.
+        '''
+        self.__init__(self.capacity)
+
+    def used(self):
+        '''
+        Return number of occupied slots.
+        '''
+        return self.capacity - self.depths.count(-1)
+
+    def stats(self):
+        '''
+        Return dictionary of the table counters.
+        '''
+        lookups = self.hits + self.misses
+        return {"capacity": self.capacity,
+                "bytes": self.capacity * ENTRY_BYTES,
+                "used": self.used(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "rejected": self.rejected}
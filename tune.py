@@ -0,0 +1,331 @@
+'''
+Offline tuning of the evaluation weights.
+"score" is a weighted sum of sequence counts (see
+evaluator.feature_vector), so the weights can be fitted to positions whose
+outcome is known: the probability that the side that has just moved goes
+on to win is modelled as 1 / (1 + exp(-score / SCALE)), and the weights
+are moved by gradient descent (Adam) to minimise the log loss over all
+positions.
+
+Positions are read once and turned into their feature vectors, stored with
+their labels as one compact array of 16-bit integers, so each iteration is
+a matrix-vector product over that array instead of a scan of every board.
+The array is saved to a file, so that fits with other settings start at
+once. With NumPy the products are vectorised; without it they are done in
+Python, which is much slower.
+
+Positions come from game archives (see record.py) or game records of
+tournament.py, labelled by the result of the game, or from JSON lines of
+the form {"board": "<compact board>", "result": 1.0}, where result is 1,
+0.5 or 0 for a win, draw or loss of the side that has just moved (black
+unless "col" is given). Positions where a colour has a five are skipped,
+since "score" does not use the weights there.
+
+Run "python tune.py extract games.gmr -o features.bin", then "python
+tune.py fit features.bin -o weights.json" and use the profile with
+"greedy:weights=weights.json" in tournament.py.
+'''
+
+import argparse
+import json
+import math
+import struct
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from evaluator import LineEvaluator, WEIGHT_NAMES, board_totals, \
+    feature_vector, load_weights, save_weights, weight_vector
+
+MAGIC = b"GMKFEAT1"
+#Number of positions and of features of each
+HEADER = struct.Struct("<II")
+#Score giving odds of e to 1
+SCALE = 200.0
+#Counts are stored as 16-bit integers
+MAX_COUNT = 32767
+
+
+def game_features(record):
+    '''
+    Yield (features, label) for the positions of GameRecord <record> after
+    each move, with the label 2 if the side that made the move won, 1 for
+    a draw and 0 for a loss. Nothing is yielded for unfinished games. The
+    counts are updated move by move by a LineEvaluator.
+    '''
+    if record.result == "Black won!":
+        winner = "b"
+    elif record.result == "White won!":
+        winner = "w"
+    elif record.result == "Draw!":
+        winner = None
+    else:
+        return
+    evaluator = LineEvaluator([[' '] * record.size
+                               for y in range(record.size)])
+    col = "b"
+    for y, x in record.moves:
+        evaluator.place(y, x, col)
+        if not evaluator.has_five("b") and not evaluator.has_five("w"):
+            if winner is None:
+                label = 1
+            else:
+                label = 2 if winner == col else 0
+            yield feature_vector(evaluator.totals, col), label
+        col = "w" if col == "b" else "b"
+
+
+def position_features(data):
+    '''
+    Return (features, label) of labelled position dictionary <data> (see
+    the module docstring), or None if a colour has a five.
+    '''
+    #Imported here since gomoku.py is only needed to read boards
+    from gomoku import string_to_board
+    totals = board_totals(string_to_board(data["board"]))
+    if totals["b"][5] != [0, 0, 0] or totals["w"][5] != [0, 0, 0]:
+        return None
+    result = data["result"]
+    if result not in (0, 0.5, 1):
+        raise ValueError("result %r is not 0, 0.5 or 1" % result)
+    return feature_vector(totals, data.get("col", "b")), int(result * 2)
+
+
+def read_source(path):
+    '''
+    Yield (features, label) of the positions in file <path>: a game
+    archive, or JSON lines of tournament.py games or labelled positions.
+    '''
+    #Imported here since record.py is only needed to read games
+    import record
+    with open(path, "rb") as f:
+        is_archive = f.read(len(record.MAGIC)) == record.MAGIC
+    if is_archive:
+        with open(path, "rb") as f:
+            for game in record.read_archive(f):
+                yield from game_features(game)
+        return
+    with open(path) as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data.get("type") == "game":
+                game = record.GameRecord(data["board_size"],
+                                         data["opening"] + data["moves"],
+                                         data["result"])
+                yield from game_features(game)
+            elif "board" in data and "result" in data:
+                try:
+                    item = position_features(data)
+                except ValueError as e:
+                    raise ValueError("%s line %d: %s" % (path, index + 1, e))
+                if item is not None:
+                    yield item
+
+
+def pack_features(items):
+    '''
+    Return (rows, count): array of 16-bit integers holding the features
+    then the label of each of the (features, label) <items>, row after row,
+    and the number of rows.
+    '''
+    rows = array("h")
+    count = 0
+    for features, label in items:
+        rows.extend(min(value, MAX_COUNT) for value in features)
+        rows.append(label)
+        count += 1
+    return rows, count
+
+
+def save_features(path, rows, count):
+    '''
+    Write the feature rows <rows> of <count> positions to <path>.
+    '''
+    if sys.byteorder != "little":
+        rows = array("h", rows)
+        rows.byteswap()
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(count, len(WEIGHT_NAMES)))
+        rows.tofile(f)
+
+
+def load_features(path):
+    '''
+    Return (rows, count) saved by "save_features" at <path>. Raise
+    ValueError if the file does not hold features of the current weights.
+    '''
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("%s is not a features file" % path)
+    count, features = HEADER.unpack_from(data, len(MAGIC))
+    if features != len(WEIGHT_NAMES):
+        raise ValueError("%s has %d features, not %d" % (
+            path, features, len(WEIGHT_NAMES)))
+    rows = array("h")
+    rows.frombytes(data[len(MAGIC) + HEADER.size:])
+    if sys.byteorder != "little":
+        rows.byteswap()
+    if len(rows) != count * (features + 1):
+        raise ValueError("%s is truncated" % path)
+    return rows, count
+
+
+class Dataset:
+    '''
+    Feature matrix and labels (as win probabilities) of the <count>
+    positions in feature rows <rows>, as NumPy arrays if available.
+    '''
+
+    def __init__(self, rows, count):
+        width = len(WEIGHT_NAMES) + 1
+        self.count = count
+        if np is not None:
+            matrix = np.frombuffer(rows, dtype=np.int16).reshape(count, width)
+            self.features = matrix[:, :-1].astype(np.float64)
+            self.labels = matrix[:, -1] / 2.0
+        else:
+            self.features = [rows[i * width:(i + 1) * width - 1]
+                             for i in range(count)]
+            self.labels = [rows[(i + 1) * width - 1] / 2.0
+                           for i in range(count)]
+
+    def predictions(self, weights):
+        '''
+        Return the predicted win probability of every position with the
+        weight vector <weights>.
+        '''
+        if np is not None:
+            scores = self.features @ np.asarray(weights, dtype=np.float64)
+            return 1.0 / (1.0 + np.exp(-scores / SCALE))
+        predictions = []
+        for row in self.features:
+            score = sum(w * f for w, f in zip(weights, row))
+            predictions.append(1.0 / (1.0 + math.exp(-score / SCALE)))
+        return predictions
+
+    def loss(self, weights):
+        '''
+        Return the mean log loss of the predictions with weight vector
+        <weights>.
+        '''
+        eps = 1e-12
+        p = self.predictions(weights)
+        if np is not None:
+            p = np.clip(p, eps, 1 - eps)
+            return float(-np.mean(self.labels * np.log(p) +
+                                  (1 - self.labels) * np.log(1 - p)))
+        total = 0.0
+        for q, y in zip(p, self.labels):
+            q = min(max(q, eps), 1 - eps)
+            total -= y * math.log(q) + (1 - y) * math.log(1 - q)
+        return total / self.count
+
+    def gradient(self, weights):
+        '''
+        Return the gradient of "loss" with respect to weight vector
+        <weights>, as a list.
+        '''
+        p = self.predictions(weights)
+        if np is not None:
+            errors = (p - self.labels) / (SCALE * self.count)
+            return list(errors @ self.features)
+        gradient = [0.0] * len(weights)
+        for q, y, row in zip(p, self.labels, self.features):
+            error = (q - y) / (SCALE * self.count)
+            for j, f in enumerate(row):
+                gradient[j] += error * f
+        return gradient
+
+
+def fit(dataset, weights=None, iterations=500, rate=5.0, fixed=()):
+    '''
+    Return (weights, loss before, loss after): the weights fitted to
+    Dataset <dataset> by <iterations> steps of Adam with step size <rate>
+    (in score points), starting from the weights <weights> (WEIGHTS if
+    None). The weights named in <fixed> are not changed. The fitted weights
+    are rounded to integers, like WEIGHTS, and the loss after is of the
+    rounded weights.
+    '''
+    vector = [float(w) for w in weight_vector(weights)]
+    free = [name not in fixed for name in WEIGHT_NAMES]
+    first = [0.0] * len(vector)
+    second = [0.0] * len(vector)
+    beta1 = 0.9
+    beta2 = 0.999
+    before = dataset.loss(vector)
+    for step in range(1, iterations + 1):
+        gradient = dataset.gradient(vector)
+        for j, g in enumerate(gradient):
+            if not free[j]:
+                continue
+            first[j] = beta1 * first[j] + (1 - beta1) * g
+            second[j] = beta2 * second[j] + (1 - beta2) * g * g
+            m = first[j] / (1 - beta1 ** step)
+            v = second[j] / (1 - beta2 ** step)
+            vector[j] -= rate * m / (math.sqrt(v) + 1e-12)
+    fitted = dict(zip(WEIGHT_NAMES, (int(round(w)) for w in vector)))
+    return fitted, before, dataset.loss(weight_vector(fitted))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    extract = commands.add_parser("extract",
+                                  help="precompute the feature vectors")
+    extract.add_argument("sources", nargs="+",
+                         help="game archives or JSON lines files")
+    extract.add_argument("-o", "--output", required=True,
+                         help="features file to write")
+    fitting = commands.add_parser("fit", help="fit the weights")
+    fitting.add_argument("features", help="features file of extract")
+    fitting.add_argument("-o", "--output", help="weights JSON file to write")
+    fitting.add_argument("--start", help="weights JSON file to start from")
+    fitting.add_argument("--iterations", type=int, default=500)
+    fitting.add_argument("--rate", type=float, default=5.0,
+                         help="step size in score points")
+    fitting.add_argument("--fixed", default="",
+                         help="comma-separated weights to keep")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "extract":
+            items = (item for path in args.sources
+                     for item in read_source(path))
+            rows, count = pack_features(items)
+            save_features(args.output, rows, count)
+            print("%d positions written to %s" % (count, args.output))
+        elif args.command == "fit":
+            fixed = [name for name in args.fixed.split(",") if name]
+            for name in fixed:
+                if name not in WEIGHT_NAMES:
+                    parser.error("unknown weight %r" % name)
+            start = load_weights(args.start) if args.start else None
+            rows, count = load_features(args.features)
+            if count == 0:
+                parser.error("%s has no positions" % args.features)
+            weights, before, after = fit(Dataset(rows, count), start,
+                                         args.iterations, args.rate, fixed)
+            print("%d positions, log loss %.5f -> %.5f" % (count, before,
+                                                            after))
+            for name in WEIGHT_NAMES:
+                print("%-20s %10d" % (name, weights[name]))
+            if args.output:
+                save_weights(weights, args.output)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+#===============================================================
+if __name__ == "__main__":
+
+    main()
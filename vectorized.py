@@ -0,0 +1,181 @@
+'''
+NumPy version of "search_max": scores every free square at once.
+Placing a black stone at a square only changes the sequences through it, so
+the score after the move is the score of the current counts plus a change
+that depends on the stones next to the square in each direction. The runs
+of stones before and after every square are found with shifted copies of
+the board, and the changes of all squares are summed into count maps with
+one bincount. Falls back to the pure Python "search_max" when NumPy is not
+installed.
+'''
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from evaluator import LineEvaluator, DIRECTIONS, MAX_LENGTH, MAX_SCORE, \
+    weight_vector
+from gomoku import search_max
+from movegen import candidate_moves
+
+EMPTY = 0
+BLACK = 1
+WHITE = 2
+EDGE = 3
+#Runs are counted up to CAP stones; a run of CAP or more is never counted
+CAP = MAX_LENGTH + 1
+PAD = CAP + 1
+#Count maps are indexed by [colour, length, bounded]
+COLOURS = ("b", "w")
+NO_SCORE = -10 * MAX_SCORE
+
+
+def board_array(board):
+    '''
+    Return board <board> as a 2D int8 array of EMPTY, BLACK and WHITE.
+    '''
+    codes = {" ": EMPTY, "b": BLACK, "w": WHITE}
+    return np.array([[codes[cell] for cell in row] for row in board],
+                    dtype=np.int8)
+
+
+def _neighbours(padded, height, width, sign):
+    '''
+    Return list of arrays of shape (4, height, width), where element k - 1
+    holds for each of DIRECTIONS the cell k steps away from each cell
+    (backwards if <sign> is -1), for k from 1 to CAP + 1.
+    '''
+    neighbours = []
+    for k in range(1, CAP + 2):
+        views = []
+        for d_y, d_x in DIRECTIONS:
+            y0 = PAD + sign * k * d_y
+            x0 = PAD + sign * k * d_x
+            views.append(padded[y0:y0 + height, x0:x0 + width])
+        neighbours.append(np.stack(views))
+    return neighbours
+
+
+def _run(neighbours, code):
+    '''
+    Return (length, beyond) arrays: the number of stones <code> in a row
+    starting next to each cell, capped at CAP, and the contents of the cell
+    just after that run, from the output of "_neighbours".
+    '''
+    length = np.zeros(neighbours[0].shape, dtype=np.int64)
+    beyond = neighbours[0]
+    alive = np.ones(neighbours[0].shape, dtype=bool)
+    for k in range(CAP):
+        alive &= neighbours[k] == code
+        length += alive
+        beyond = np.where(alive, neighbours[k + 1], beyond)
+    return length, beyond
+
+
+def count_changes(board):
+    '''
+    Return int array of shape (2, CAP + 1, 3, height, width) holding, for
+    each square, the change in the number of sequences of each (colour,
+    length, bounded) if a black stone were placed there. Only meaningful on
+    free squares.
+    '''
+    height = len(board)
+    width = len(board[0])
+    size = height * width
+    padded = np.full((height + 2 * PAD, width + 2 * PAD), EDGE, dtype=np.int8)
+    padded[PAD:PAD + height, PAD:PAD + width] = board_array(board)
+    #All four directions are handled at once, on arrays of shape
+    #(4, height, width)
+    cells = np.broadcast_to(np.arange(size).reshape(height, width),
+                            (len(DIRECTIONS), height, width))
+
+    indices = []
+    signs = []
+
+    def add(mask, col, length, bounded, sign):
+        #Feature index of each cell, flattened with the cell index
+        mask = mask & (length >= 1) & (length <= MAX_LENGTH)
+        feature = (col * (CAP + 1) + length) * 3 + bounded
+        indices.append((feature * size + cells)[mask])
+        signs.append(np.full(int(mask.sum()), sign, dtype=np.int64))
+
+    before = _neighbours(padded, height, width, -1)
+    after = _neighbours(padded, height, width, 1)
+    black_before, black_start = _run(before, BLACK)
+    black_after, black_end = _run(after, BLACK)
+    white_before, white_start = _run(before, WHITE)
+    white_after, white_end = _run(after, WHITE)
+    start_bounded = (black_start != EMPTY).astype(np.int64)
+    end_bounded = (black_end != EMPTY).astype(np.int64)
+    #Black runs next to the square merge into one through it
+    add(black_before > 0, 0, black_before, start_bounded, -1)
+    add(black_after > 0, 0, black_after, end_bounded, -1)
+    everywhere = np.ones(black_before.shape, dtype=bool)
+    add(everywhere, 0, black_before + 1 + black_after,
+        start_bounded + end_bounded, 1)
+    #White runs next to the square get one more bounded end
+    bounded = (white_start != EMPTY).astype(np.int64)
+    add(white_before > 0, 1, white_before, bounded, -1)
+    add(white_before > 0, 1, white_before, bounded + 1, 1)
+    bounded = (white_end != EMPTY).astype(np.int64)
+    add(white_after > 0, 1, white_after, bounded, -1)
+    add(white_after > 0, 1, white_after, bounded + 1, 1)
+
+    changes = np.bincount(np.concatenate(indices),
+                          weights=np.concatenate(signs),
+                          minlength=2 * (CAP + 1) * 3 * size)
+    return changes.astype(np.int64).reshape(2, CAP + 1, 3, height, width)
+
+
+def score_map(board, weights=None):
+    '''
+    Return 2D array holding score(board) after a black stone is placed on
+    each free square of board <board>, and NO_SCORE on occupied squares.
+    Scores use the weights <weights> (see "score_counts").
+    '''
+    counts = count_changes(board)
+    totals = LineEvaluator(board).totals
+    for c, col in enumerate(COLOURS):
+        for length in range(1, MAX_LENGTH + 1):
+            for bounded in range(3):
+                counts[c, length, bounded] += totals[col][length][bounded]
+    open_b = counts[0, :, 0]
+    semi_open_b = counts[0, :, 1]
+    open_w = counts[1, :, 0]
+    semi_open_w = counts[1, :, 1]
+    #Same order as evaluator.feature_vector
+    features = (open_w[4] + semi_open_w[4],
+                open_b[4],
+                semi_open_b[4],
+                open_w[3],
+                semi_open_w[3],
+                open_b[3],
+                semi_open_b[3],
+                open_b[2] + semi_open_b[2],
+                open_w[2] + semi_open_w[2])
+    scores = sum(weight * feature
+                 for weight, feature in zip(weight_vector(weights), features))
+    scores = np.where(open_w[5] + semi_open_w[5] >= 1, -MAX_SCORE, scores)
+    scores = np.where(open_b[5] + semi_open_b[5] >= 1, MAX_SCORE, scores)
+    return np.where(board_array(board) == EMPTY, scores, NO_SCORE)
+
+
+def search_max_batch(board, radius=2, weights=None):
+    '''
+    Return (y, x) coordinates of board to maximize score for black (CPU),
+    the same square as search_max(board, radius, weights=weights), scoring
+    all candidate squares in one batch. Uses "search_max" if NumPy is not
+    available.
+    '''
+    if np is None:
+        return search_max(board, radius, weights=weights)
+    moves = candidate_moves(board, radius)
+    if not moves:
+        return 0
+    scores = score_map(board, weights)
+    #Last candidate in row-major order with the highest score
+    best = max(scores[y, x] for y, x in moves)
+    for y, x in reversed(moves):
+        if scores[y, x] == best:
+            return (y, x)
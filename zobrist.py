@@ -0,0 +1,57 @@
+'''
+Zobrist hashing of Gomoku positions.
+Every (cell, colour) pair gets a random 64-bit key and a position hashes to
+the XOR of the keys of its stones, so placing or removing a stone updates
+the hash with a single XOR.
+See: https://en.wikipedia.org/wiki/Zobrist_hashing
+'''
+
+import random
+
+_tables = {}
+
+
+class Zobrist:
+    '''
+    Random keys for a board of size (height x width).
+    '''
+
+    def __init__(self, height, width, seed=0):
+        rand = random.Random("zobrist-%d-%d-%d" % (height, width, seed))
+        self.height = height
+        self.width = width
+        self.keys = {}
+        for col in ("b", "w"):
+            self.keys[col] = [[rand.getrandbits(64) for x in range(width)]
+                              for y in range(height)]
+        #XORed in when white is to move
+        self.white_to_move = rand.getrandbits(64)
+
+    def key(self, y, x, col):
+        '''
+        Return key to XOR into the hash when a stone of colour <col> is
+        placed at or removed from (x, y).
+        '''
+        return self.keys[col][y][x]
+
+    def hash_board(self, board):
+        '''
+        Return hash of the stones on board <board>.
+        '''
+        h = 0
+        for y in range(self.height):
+            row = board[y]
+            for x in range(self.width):
+                if row[x] != ' ':
+                    h ^= self.keys[row[x]][y][x]
+        return h
+
+
+def get_zobrist(height, width):
+    '''
+    Return the shared Zobrist keys for boards of size (height x width), so
+    that hashes agree across searches and games.
+    '''
+    if (height, width) not in _tables:
+        _tables[(height, width)] = Zobrist(height, width)
+    return _tables[(height, width)]